@@ -0,0 +1,158 @@
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from utils.evaluator import RESULT_MARKER
+
+COMMENTARY = [
+    "Your answer covers the main idea ",
+    "and uses the right terminology, ",
+    "but it would be stronger with a concrete example ",
+    "and a note on the trade-offs involved.\n",
+]
+
+
+class FakeLLMServer:
+    """Local stand-in for the OpenAI chat completions API.
+
+    Streams a fixed review in the evaluator's format after ``latency``
+    seconds, one chunk every ``token_delay`` seconds, and fails a random
+    ``error_rate`` share of requests with a 500 and ``rate_limit_rate`` with
+    a 429. Point the app at it with OPENAI_BASE_URL=<url>.
+    """
+
+    def __init__(self, latency: float = 0.5, token_delay: float = 0.05, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, host: str = "127.0.0.1", port: int = 0, seed: int = 0):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.requests = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeLLMServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def _outcome(self) -> Optional[int]:
+        with self._lock:
+            self.requests += 1
+            roll = self._random.random()
+            if roll < self.error_rate:
+                self.errors += 1
+                return 500
+            if roll < self.error_rate + self.rate_limit_rate:
+                self.rate_limited += 1
+                return 429
+            return None
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _json(self, status: int, body: dict, headers: Optional[dict] = None):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+                if not self.path.endswith("/chat/completions"):
+                    self._json(404, {"error": {"message": f"no route {self.path}"}})
+                    return
+                time.sleep(server.latency)
+                status = server._outcome()
+                if status == 429:
+                    self._json(429, {"error": {"message": "rate limited", "type": "rate_limit"}},
+                               {"retry-after": "0.5"})
+                    return
+                if status is not None:
+                    self._json(status, {"error": {"message": "injected failure", "type": "server_error"}})
+                    return
+                self._stream(request.get("model", "fake"))
+
+            def _stream(self, model: str):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                score = server._random.randint(4, 9)
+                result = {"score": score, "strengths": ["Clear definition"],
+                          "missing_points": ["Add a practical example"], "technical_accuracy": "Mostly correct"}
+                pieces = COMMENTARY + [f"{RESULT_MARKER}\n{json.dumps(result)}"]
+                for number, piece in enumerate(pieces):
+                    if number:
+                        time.sleep(server.token_delay)
+                    self._event({"choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]},
+                                model)
+                self._event({"choices": [], "usage": {"prompt_tokens": 400, "completion_tokens": 60,
+                                                      "total_tokens": 460}}, model)
+                self._chunk(b"data: [DONE]\n\n")
+                self._chunk(b"")
+
+            def _event(self, body: dict, model: str):
+                body = dict(body, id="chatcmpl-fake", object="chat.completion.chunk", created=int(time.time()),
+                            model=model)
+                self._chunk(f"data: {json.dumps(body)}\n\n".encode("utf-8"))
+
+            def _chunk(self, data: bytes):
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.fake_llm",
+                                     description="Serve a fake OpenAI-compatible chat completions API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.05, help="seconds between streamed chunks")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests failing with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of requests failing with a 429")
+    args = parser.parse_args()
+    server = FakeLLMServer(args.latency, args.token_delay, args.error_rate, args.rate_limit_rate,
+                           host=args.host, port=args.port)
+    print(f"fake LLM at {server.url} (OPENAI_BASE_URL={server.url})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, Any, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.fake_llm import FakeLLMServer  # noqa: E402
+from benchmarks.synthetic import make_answer, make_bank, write_bank  # noqa: E402
+
+APP_PATH = os.path.join(ROOT, "app.py")
+STEPS = ["load", "select", "type", "submit", "refresh", "feedback", "next"]
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of ``values`` (0 when empty)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))]
+
+
+def memory_mb(pid: int) -> Tuple[float, float]:
+    """Current and peak resident set size of process ``pid`` (Linux)."""
+    fields = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            fields[name] = value.split()
+    return int(fields["VmRSS"][0]) / 1024, int(fields["VmHWM"][0]) / 1024
+
+
+class Session:
+    """One simulated candidate talking to the server over Streamlit's
+    websocket protocol, the way the browser does.
+
+    Each flow picks a question from the sidebar, types an answer, submits
+    it, asks for AI feedback and moves on, pausing ``think`` seconds
+    (randomised) between actions. Every rerun is timed, from sending the
+    widget states to the script finishing, under its step name.
+    """
+
+    def __init__(self, url: str, number: int, bank: Dict[int, Dict[str, Any]], flows: int, think: float,
+                 words: int, timeout: float):
+        self.url = url
+        self.number = number
+        self.bank = bank
+        self.flows = flows
+        self.think = think
+        self.words = words
+        self.timeout = timeout
+        self.random = random.Random(number)
+        self.timings: Dict[str, List[float]] = defaultdict(list)
+        self.errors: List[str] = []
+        self.fallbacks = 0
+        self.websocket = None
+        # Widgets of the last full run by key (or label): (id, element, fragment id)
+        self.widgets: Dict[str, Tuple[str, Any, str]] = {}
+        self.values: Dict[str, Any] = {}
+        self.texts: List[str] = []
+
+    async def _pause(self):
+        if self.think:
+            await asyncio.sleep(self.random.uniform(0.5, 1.5) * self.think)
+
+    async def _rerun(self, step: str, trigger: Optional[str] = None, fragment_id: str = ""):
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+        message = BackMsg()
+        message.rerun_script.query_string = f"user=load-{self.number}"
+        message.rerun_script.fragment_id = fragment_id
+        for widget_id, value in self.values.items():
+            state = message.rerun_script.widget_states.widgets.add(id=widget_id)
+            state.string_value = value
+        if trigger is not None:
+            message.rerun_script.widget_states.widgets.add(id=trigger, trigger_value=True)
+
+        started = time.perf_counter()
+        await self.websocket.send(message.SerializeToString())
+        widgets, texts = {}, []
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(await asyncio.wait_for(self.websocket.recv(), self.timeout))
+            kind = forward.WhichOneof("type")
+            if kind == "delta" and forward.delta.WhichOneof("type") == "new_element":
+                element = forward.delta.new_element
+                element_type = element.WhichOneof("type")
+                value = getattr(element, element_type)
+                if element_type == "exception":
+                    raise RuntimeError(f"{step}: {value.type}: {value.message}")
+                if getattr(value, "id", ""):
+                    key = value.id.rsplit("-", 1)[-1]
+                    widgets[value.label if key == "None" else key] = (value.id, value, forward.delta.fragment_id)
+                elif element_type in ("markdown", "alert"):
+                    texts.append(value.body)
+            elif kind == "script_finished":
+                if forward.script_finished == ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    # st.rerun(): the next run follows on its own and redraws the page
+                    widgets, texts = {}, []
+                    continue
+                break
+        self.timings[step].append(time.perf_counter() - started)
+        if not fragment_id:
+            self.widgets, self.texts = widgets, texts
+            # The browser only sends values of widgets still on the page
+            live = {widget_id for widget_id, _, _ in widgets.values()}
+            self.values = {widget_id: value for widget_id, value in self.values.items() if widget_id in live}
+
+    def _widget(self, name: str) -> Tuple[str, Any, str]:
+        if name not in self.widgets:
+            raise RuntimeError(f"no widget {name!r} on the page")
+        return self.widgets[name]
+
+    def _button(self, label: str) -> str:
+        return next(widget_id for name, (widget_id, _, _) in self.widgets.items() if label in name)
+
+    async def _flow(self):
+        await self._pause()
+        choice = self.random.choice([name for name in self.widgets if name.startswith("select_")])
+        question = self.bank[int(choice.split("_")[1])]
+        await self._rerun("select", trigger=self._widget(choice)[0])
+
+        await self._pause()
+        name = next(name for name in self.widgets if name.startswith("answer_"))
+        widget_id, _, fragment_id = self._widget(name)
+        self.values[widget_id] = make_answer(question, self.words, self.random)
+        await self._rerun("type", fragment_id=fragment_id)
+        await self._rerun("submit", trigger=self._button("Submit Answer"))
+        # The feedback button is enabled from the next full rerun on
+        await self._rerun("refresh")
+
+        await self._pause()
+        widget_id, button, _ = next(self.widgets[name] for name in self.widgets if "Get AI Feedback" in name)
+        if button.disabled:
+            raise RuntimeError("feedback button still disabled after submitting")
+        await self._rerun("feedback", trigger=widget_id)
+        if any("showing rubric-based feedback instead" in text for text in self.texts):
+            self.fallbacks += 1
+
+        await self._pause()
+        await self._rerun("next", trigger=self._button("Next Question"))
+
+    async def run(self):
+        import websockets
+        try:
+            async with websockets.connect(self.url, subprotocols=["streamlit"], max_size=None,
+                                          open_timeout=self.timeout) as self.websocket:
+                await self._rerun("load")
+                for _ in range(self.flows):
+                    await self._flow()
+        except Exception as e:
+            self.errors.append(f"session {self.number}: {type(e).__name__}: {e}")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workdir: str, env: Dict[str, str], timeout: float) -> Tuple[subprocess.Popen, str, str]:
+    """Start ``streamlit run app.py`` on a free port; returns the process,
+    the websocket URL and the log path."""
+    port = _free_port()
+    log_path = os.path.join(workdir, "server.log")
+    with open(log_path, "wb") as log:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "streamlit", "run", APP_PATH, "--server.headless", "true",
+             "--server.port", str(port), "--server.address", "127.0.0.1", "--server.fileWatcherType", "none",
+             "--browser.gatherUsageStats", "false"],
+            cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT,
+        )
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            break
+        except OSError:
+            if process.poll() is not None or time.monotonic() > deadline:
+                process.kill()
+                with open(log_path, encoding="utf-8", errors="replace") as f:
+                    raise RuntimeError(f"streamlit did not start:\n{f.read()[-2000:]}")
+            time.sleep(0.2)
+    return process, f"ws://127.0.0.1:{port}/_stcore/stream", log_path
+
+
+async def run_load(url: str, pid: Optional[int], bank: Dict[int, Dict[str, Any]], sessions: int, flows: int,
+                   think: float, words: int, timeout: float, ramp: float,
+                   llm: Optional[FakeLLMServer] = None) -> Dict[str, Any]:
+    # One untimed flow first, so every resource (including the ones only
+    # grading needs) is built before anything is timed
+    warmup = Session(url, -1, bank, 1, 0, words, max(timeout, 600))
+    await warmup.run()
+    if warmup.errors:
+        raise RuntimeError(warmup.errors[0])
+    if llm is not None:
+        llm.requests = llm.errors = llm.rate_limited = 0
+    rss_before = memory_mb(pid)[0] if pid else None
+
+    drivers = [Session(url, number, bank, flows, think, words, timeout) for number in range(sessions)]
+    tasks = []
+    started = time.perf_counter()
+    for driver in drivers:
+        tasks.append(asyncio.create_task(driver.run()))
+        if ramp:
+            await asyncio.sleep(ramp / sessions)
+    # Sessions stay connected until all are done, like open tabs
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    rss_after, rss_peak = memory_mb(pid) if pid else (None, None)
+
+    timings: Dict[str, List[float]] = defaultdict(list)
+    for driver in drivers:
+        for step, values in driver.timings.items():
+            timings[step].extend(values)
+    reruns = [value for values in timings.values() for value in values]
+    result = {
+        "sessions": sessions,
+        "flows_per_session": flows,
+        "seconds": elapsed,
+        "reruns": len(reruns),
+        "reruns_per_second": len(reruns) / elapsed,
+        "answers_per_second": len(timings["feedback"]) / elapsed,
+        "latency": {
+            step: {"count": len(values), "p50": percentile(values, 50), "p95": percentile(values, 95),
+                   "p99": percentile(values, 99), "max": max(values)}
+            for step, values in [("all", reruns)] + [(step, timings[step]) for step in STEPS] if values
+        },
+        "errors": [error for driver in drivers for error in driver.errors],
+        "llm_fallbacks": sum(driver.fallbacks for driver in drivers),
+    }
+    if pid:
+        result["memory"] = {"rss_before_mb": rss_before, "rss_after_mb": rss_after, "peak_rss_mb": rss_peak,
+                            "per_session_mb": (rss_after - rss_before) / sessions}
+    return result
+
+
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1e3:.1f}ms"
+
+
+def report(result: Dict[str, Any], llm: Optional[FakeLLMServer]):
+    print(f"{result['sessions']} sessions x {result['flows_per_session']} flows in {result['seconds']:.1f}s: "
+          f"{result['reruns_per_second']:.1f} reruns/s, {result['answers_per_second']:.2f} answers graded/s")
+    print(f"{'step':<10}{'count':>7}{'p50':>11}{'p95':>11}{'p99':>11}{'max':>11}")
+    for step, stats in result["latency"].items():
+        print(f"{step:<10}{stats['count']:>7}{_ms(stats['p50']):>11}{_ms(stats['p95']):>11}"
+              f"{_ms(stats['p99']):>11}{_ms(stats['max']):>11}")
+    memory = result.get("memory")
+    if memory:
+        print(f"server memory: {memory['rss_before_mb']:.0f} MB after warmup, {memory['rss_after_mb']:.0f} MB "
+              f"with all sessions open (peak {memory['peak_rss_mb']:.0f} MB), "
+              f"{memory['per_session_mb']:.2f} MB per session")
+    if llm is not None:
+        print(f"fake LLM: {llm.requests} requests, {llm.errors} failed, {llm.rate_limited} rate limited; "
+              f"{result['llm_fallbacks']} answers fell back to rubric feedback")
+    for error in result["errors"]:
+        print(error, file=sys.stderr)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.load",
+                                     description="Drive concurrent simulated sessions through one app.py server "
+                                                 "backed by a local fake LLM, and report rerun latency, "
+                                                 "throughput and memory.")
+    parser.add_argument("-n", "--sessions", type=int, default=10)
+    parser.add_argument("--flows", type=int, default=3, help="questions answered per session")
+    parser.add_argument("--think", type=float, default=1.0, help="mean seconds between a session's actions")
+    parser.add_argument("--ramp", type=float, default=2.0, help="seconds over which sessions are started")
+    parser.add_argument("--words", type=int, default=80, help="words per answer")
+    parser.add_argument("--bank-size", type=int, default=10000)
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds a rerun may take before failing")
+    parser.add_argument("--latency", type=float, default=1.0, help="fake LLM seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.05, help="fake LLM seconds between chunks")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of LLM requests failing with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0,
+                        help="share of LLM requests failing with a 429")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    # Like the benchmarks, the server runs in a scratch directory with its
+    # own databases, so it never touches ./data or the OpenAI API
+    workdir = tempfile.mkdtemp(prefix="coach-load-")
+    llm = FakeLLMServer(args.latency, args.token_delay, args.error_rate, args.rate_limit_rate).start()
+    bank = make_bank(args.bank_size)
+    env = dict(os.environ, **{
+        "OPENAI_API_KEY": "load-test-key",
+        "OPENAI_BASE_URL": llm.url,
+        "QUESTIONS_PATH": write_bank(os.path.join(workdir, "bank.jsonl"), args.bank_size),
+        "PROGRESS_DB_PATH": os.path.join(workdir, "progress.db"),
+        "VECTOR_DB_PATH": os.path.join(workdir, "vector_store"),
+        "BANK_BUILD_DIR": os.path.join(workdir, "build"),
+        "EVAL_CACHE_DB": "",
+        "PYTHONPATH": ROOT,
+    })
+    process = None
+    try:
+        process, url, _ = start_server(workdir, env, args.timeout)
+        result = asyncio.run(run_load(url, process.pid, {q["id"]: q for q in bank}, args.sessions, args.flows,
+                                      args.think, args.words, args.timeout, args.ramp, llm))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(30)
+        llm.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report(result, llm)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+            f.write("\n")
+    return 1 if result["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
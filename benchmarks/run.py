@@ -0,0 +1,282 @@
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.synthetic import CATEGORIES, make_answers, make_bank, write_bank  # noqa: E402
+
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+APP_PATH = os.path.join(ROOT, "app.py")
+
+# A benchmark is a setup function that returns (operation, items): the
+# operation is timed, setup is not, and results are reported per item
+BENCHMARKS: List[Tuple[str, Callable[[str], Tuple[Callable[[], object], int]]]] = []
+
+
+def benchmark(name: str):
+    def register(setup):
+        BENCHMARKS.append((name, setup))
+        return setup
+    return register
+
+
+_banks: Dict[int, str] = {}
+
+
+def bank_path(workdir: str, size: int) -> str:
+    if size not in _banks:
+        _banks[size] = write_bank(os.path.join(workdir, f"bank_{size}.jsonl"), size)
+    return _banks[size]
+
+
+# Scoring throughput vs answer length
+def _heuristic_scoring(words: int):
+    def setup(workdir):
+        from utils.rubric import compile_rubrics
+        bank = make_bank(10)
+        rubrics = compile_rubrics(bank)
+        answers = make_answers(bank, 200, words)
+        return (lambda: [rubrics[qid].score(answer) for qid, answer in answers]), len(answers)
+    return setup
+
+
+def _semantic_scoring(words: int):
+    def setup(workdir):
+        from utils.grading import Grader
+        from utils.question_store import QuestionStore
+        grader = Grader(QuestionStore(bank_path(workdir, 10)))
+        answers = make_answers(make_bank(10), 200, words)
+        return (lambda: grader.grade_many(answers)), len(answers)
+    return setup
+
+
+def _live_hints(words: int):
+    def setup(workdir):
+        from utils.rubric import LiveHints, compile_rubrics
+        bank = make_bank(10)
+        hints = LiveHints(compile_rubrics(bank)[1], min_interval=0)
+        answer = make_answers(bank[:1], 1, words)[0][1]
+        # One keystroke-sized edit per update, alternating in the middle of the answer
+        edits = [answer[:len(answer) // 2] + suffix + answer[len(answer) // 2:] for suffix in ("x", "")] * 100
+        hints.update(answer)
+        return (lambda: [hints.update(text) for text in edits]), len(edits)
+    return setup
+
+
+for _words in (25, 100, 400, 1600):
+    benchmark(f"score.heuristic.words_{_words}")(_heuristic_scoring(_words))
+    benchmark(f"score.live_hints.words_{_words}")(_live_hints(_words))
+for _words in (100, 400):
+    benchmark(f"score.semantic.words_{_words}")(_semantic_scoring(_words))
+
+
+# Question bank load and sidebar filtering vs bank size
+def _bank_load(size: int):
+    def setup(workdir):
+        from utils.question_store import QuestionStore
+        path = bank_path(workdir, size)
+        return (lambda: QuestionStore(path)), 1
+    return setup
+
+
+def _bank_filter(size: int):
+    def setup(workdir):
+        from utils.question_store import QuestionStore
+        store = QuestionStore(bank_path(workdir, size))
+        queries = [
+            dict(category=CATEGORIES[0]),
+            dict(category=CATEGORIES[1], difficulty="hard"),
+            dict(text="clock"),
+            dict(category=CATEGORIES[2], text="voltage"),
+        ]
+        return (lambda: [store.search(offset=0, limit=10, **q) for q in queries]), len(queries)
+    return setup
+
+
+def _bank_facets(size: int):
+    def setup(workdir):
+        from utils.question_store import QuestionStore
+        store = QuestionStore(bank_path(workdir, size))
+        # The sidebar's option counts: each facet under the other's selection
+        queries = [
+            ("category", dict(difficulty=None)),
+            ("category", dict(difficulty="hard")),
+            ("difficulty", dict(category=CATEGORIES[0])),
+        ]
+        return (lambda: [store.facet_counts(facet, **q) for facet, q in queries]), len(queries)
+    return setup
+
+
+def _bank_search(size: int):
+    def setup(workdir):
+        from utils.question_store import QuestionStore
+        store = QuestionStore(bank_path(workdir, size))
+        store.search_index
+        # Ranked full-text queries: exact words, a prefix, and one combined with a filter
+        queries = [
+            dict(text="metastability"),
+            dict(text="setup hold time"),
+            dict(text="volt"),
+            dict(category=CATEGORIES[0], text="clock"),
+        ]
+        return (lambda: [store.search(offset=0, limit=10, **q) for q in queries]), len(queries)
+    return setup
+
+
+for _size in (1000, 10000, 50000):
+    benchmark(f"bank.load.{_size}")(_bank_load(_size))
+    benchmark(f"bank.filter.{_size}")(_bank_filter(_size))
+    benchmark(f"bank.facets.{_size}")(_bank_facets(_size))
+    benchmark(f"bank.search.{_size}")(_bank_search(_size))
+
+
+# Vector search latency (brute force below BRUTE_FORCE_THRESHOLD, IVF above)
+def _vector_search(count: int):
+    def setup(workdir):
+        import numpy as np
+        from utils.vector_store import VectorStore
+        rng = np.random.default_rng(0)
+        store = VectorStore(os.path.join(workdir, f"vectors_{count}"), dim=256)
+        vectors = rng.standard_normal((count, 256)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        categories = [CATEGORIES[i % len(CATEGORIES)] for i in range(count)]
+        store.add([str(i) for i in range(count)], vectors, categories)
+        store.rebuild_index()
+        queries = vectors[rng.integers(0, count, 100)]
+        return (lambda: [store.search(q, k=5) for q in queries]), len(queries)
+    return setup
+
+
+for _count in (10000, 100000):
+    benchmark(f"vector.search.{_count}")(_vector_search(_count))
+
+
+# Full script reruns through AppTest
+def _app(size: int, grade: bool):
+    def setup(workdir):
+        from streamlit.testing.v1 import AppTest
+        from utils import resources
+        os.environ["QUESTIONS_PATH"] = bank_path(workdir, size)
+        # Build everything up front so the app's background warmup is not
+        # still running (and competing for the GIL) while reruns are timed
+        resources.registry.reset()
+        resources.warmup()
+        at = AppTest.from_file(APP_PATH, default_timeout=120).run()
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+        if not grade:
+            return (lambda: at.run()), 1
+        # Submit once so the feedback button is enabled; the timed rerun is
+        # the one that grades the answer and renders the feedback
+        answer = make_answers(make_bank(1), 1, 120)[0][1]
+        at.text_area[0].input(answer).run()
+        at.button[0].click().run()
+        at.run()
+
+        def grade_answer():
+            at.button[1].click().run()
+            if at.exception or not at.metric:
+                raise RuntimeError("grading rerun did not render feedback")
+        return grade_answer, 1
+    return setup
+
+
+benchmark("app.rerun.10000")(_app(10000, grade=False))
+benchmark("app.grade.10000")(_app(10000, grade=True))
+
+
+def measure(operation: Callable[[], object], items: int, repeat: int) -> float:
+    """Median seconds per item over ``repeat`` timed runs (after one warmup)."""
+    operation()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        operation()
+        timings.append((time.perf_counter() - started) / items)
+    return statistics.median(timings)
+
+
+def _format(seconds: float) -> str:
+    if seconds >= 1:
+        return f"{seconds:.2f}s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.2f}ms"
+    return f"{seconds * 1e6:.1f}µs"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run",
+                                     description="Run the benchmark suite and compare with stored baselines.")
+    parser.add_argument("-k", "--filter", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=1.5,
+                        help="fail when slower than baseline by more than this factor")
+    parser.add_argument("--update", action="store_true", help="write the results as the new baselines")
+    parser.add_argument("--baselines", default=BASELINES_PATH)
+    args = parser.parse_args(argv)
+
+    baselines: Dict[str, float] = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines, encoding="utf-8") as f:
+            baselines = json.load(f)
+
+    # Benchmarks run in a scratch directory with their own databases so they
+    # never touch ./data or call the OpenAI API
+    workdir = tempfile.mkdtemp(prefix="coach-bench-")
+    os.chdir(workdir)
+    os.environ.update({
+        "OPENAI_API_KEY": "dummy-key",
+        "PROGRESS_DB_PATH": os.path.join(workdir, "progress.db"),
+        "VECTOR_DB_PATH": os.path.join(workdir, "vector_store"),
+        "BANK_BUILD_DIR": os.path.join(workdir, "build"),
+        "EVAL_CACHE_DB": "",
+    })
+
+    results: Dict[str, float] = {}
+    regressions = []
+    print(f"{'benchmark':<32}{'per item':>12}{'baseline':>12}{'ratio':>8}")
+    try:
+        for name, setup in BENCHMARKS:
+            if args.filter not in name:
+                continue
+            operation, items = setup(workdir)
+            seconds = measure(operation, items, args.repeat)
+            results[name] = seconds
+            baseline = baselines.get(name)
+            ratio = seconds / baseline if baseline else None
+            flag = ""
+            if ratio is not None and ratio > args.tolerance:
+                regressions.append(name)
+                flag = "  REGRESSION"
+            print(f"{name:<32}{_format(seconds):>12}"
+                  f"{_format(baseline) if baseline else '-':>12}"
+                  f"{f'{ratio:.2f}x' if ratio else '-':>8}{flag}", flush=True)
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.update:
+        baselines.update(results)
+        with open(args.baselines, "w", encoding="utf-8") as f:
+            json.dump(dict(sorted(baselines.items())), f, indent=2)
+            f.write("\n")
+        print(f"updated {len(results)} baselines in {args.baselines}")
+        return 0
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) regressed beyond {args.tolerance}x: {', '.join(regressions)}",
+              file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+import json
+import random
+from typing import Dict, Any, List
+
+from utils.question_store import DEFAULT_QUESTIONS_PATH
+
+CATEGORIES = [
+    "digital_electronics", "analog_circuits", "embedded_systems", "power_electronics",
+    "signal_processing", "communication_systems", "vlsi_design", "control_systems",
+]
+DIFFICULTIES = ["easy", "medium", "hard"]
+
+
+def _seed_questions() -> List[Dict[str, Any]]:
+    with open(DEFAULT_QUESTIONS_PATH, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def make_bank(size: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """A bank of ``size`` questions built from the real ones, so rubrics,
+    answers and text searches behave like production data."""
+    rng = random.Random(seed)
+    seeds = _seed_questions()
+    bank = []
+    for question_id in range(1, size + 1):
+        base = seeds[(question_id - 1) % len(seeds)]
+        question = dict(base)
+        question["id"] = question_id
+        question["category"] = rng.choice(CATEGORIES)
+        question["difficulty"] = rng.choice(DIFFICULTIES)
+        question["question"] = f"{base['question']} (variant {question_id})"
+        bank.append(question)
+    return bank
+
+
+def write_bank(path: str, size: int, seed: int = 0) -> str:
+    with open(path, "w", encoding="utf-8") as f:
+        for question in make_bank(size, seed):
+            f.write(json.dumps(question) + "\n")
+    return path
+
+
+def make_answer(question: Dict[str, Any], words: int, rng: random.Random) -> str:
+    # Model-answer vocabulary mixed with filler, so keyword hits and length
+    # both grow with the answer
+    vocabulary = question["model_answer"].split()
+    filler = ["the", "circuit", "signal", "because", "then", "value", "so", "we", "it", "is"]
+    return " ".join(
+        rng.choice(vocabulary) if rng.random() < 0.6 else rng.choice(filler) for _ in range(words)
+    )
+
+
+def make_answers(bank: List[Dict[str, Any]], count: int, words: int, seed: int = 0) -> List[tuple]:
+    rng = random.Random(seed)
+    answers = []
+    for _ in range(count):
+        question = rng.choice(bank)
+        answers.append((question["id"], make_answer(question, words, rng)))
+    return answers
@@ -0,0 +1,68 @@
+import json
+
+from utils.analytics import Analytics
+from utils.progress_store import ProgressStore
+from utils.question_store import DEFAULT_QUESTIONS_PATH, QuestionStore
+from utils.tenant_store import TenantStore
+
+
+def _question(question_id, difficulty):
+    return {"id": question_id, "category": "Digital", "difficulty": difficulty}
+
+
+def test_tenant_override_is_tracked_apart_from_the_shared_question():
+    analytics = Analytics()
+    for question_id in range(2, 8):
+        for score in (6, 7, 8):
+            analytics.record(_question(question_id, "easy"), score)
+    for score in (2, 3, 2, 3, 2):
+        analytics.record(_question(1, "easy"), score)
+    # The cohort's copy of question 1 is rated hard; it must not move the
+    # shared question to the hard level
+    for score in (9, 9, 9, 9, 9):
+        analytics.record(_question(1, "hard"), score, tenant="cohort")
+
+    assert analytics.question(1)["mean"] == 2.4
+    assert analytics.question(1, "cohort")["mean"] == 9
+    shared = analytics.calibration(1)
+    assert shared["difficulty"] == "easy" and shared["flagged"]
+    assert shared["expected"] == 7
+    assert analytics.calibration(1, "cohort") is None
+    assert [entry["question_id"] for entry in analytics.miscalibrated()] == [1]
+    assert analytics.miscalibrated(tenant="cohort") == []
+
+
+def test_history_is_rebuilt_through_each_tenants_view(tmp_path):
+    base = QuestionStore(DEFAULT_QUESTIONS_PATH)
+    overlay = tmp_path / "cohort.jsonl"
+    overlay.write_text(json.dumps({"id": 1001, "category": "Digital", "difficulty": "hard",
+                                   "question": "What does a watchdog timer do?"}) + "\n")
+    tenants = {"cohort": TenantStore(base, str(overlay), "cohort")}
+
+    progress = ProgressStore(str(tmp_path / "progress.db"))
+    progress.record_attempt("u1", 1, 6)
+    progress.record_attempt("u2", 1001, 8, tenant="cohort")
+    progress.record_attempt("u3", 1001, 4, tenant="gone")
+    analytics = Analytics.from_history(base, progress.graded_attempts(), tenants=tenants.get)
+    progress.close()
+
+    assert analytics.question(1)["attempts"] == 1
+    assert analytics.question(1001, "cohort")["mean"] == 8
+    assert analytics.question(1001, "gone") is None
+    assert analytics.attempts == 2
+
+
+def test_miscalibrated_questions_are_tracked_as_they_are_recorded():
+    history = [(1, score, [], 0, None, "") for score in (2, 3, 2, 3, 2)]
+    history += [(question_id, score, [], 0, None, "") for question_id in (2, 3, 4) for score in (6, 7, 8)]
+    store = {question_id: _question(question_id, "easy") for question_id in range(1, 5)}
+    analytics = Analytics.from_history(store, history)
+    # Question 1 was last attempted before its level had enough attempts
+    assert [entry["question_id"] for entry in analytics.miscalibrated()] == [1]
+
+    for _ in range(40):
+        analytics.record(_question(1, "easy"), 7)
+    assert analytics.miscalibrated() == []
+    for _ in range(6):
+        analytics.record(_question(4, "easy"), 1)
+    assert [entry["question_id"] for entry in analytics.miscalibrated()] == [4]
@@ -0,0 +1,93 @@
+import json
+import shutil
+
+import numpy as np
+import pytest
+
+from utils import build_bank
+from utils.embeddings import EmbeddingCache, HashingEmbedder
+from utils.question_store import DEFAULT_QUESTIONS_PATH
+
+
+class CountingEmbedder(HashingEmbedder):
+    def __init__(self):
+        super().__init__(dim=64)
+        self.encoded = 0
+
+    def encode(self, texts, batch_size=1024):
+        self.encoded += len(texts)
+        return super().encode(texts, batch_size)
+
+
+def _edit(path, question_id, **changes):
+    # Rewrites one question's line; every other line stays byte-identical
+    with open(path, encoding="utf-8") as f:
+        lines = f.readlines()
+    with open(path, "w", encoding="utf-8") as f:
+        for line in lines:
+            question = json.loads(line)
+            if question["id"] == question_id:
+                line = json.dumps(dict(question, **changes)) + "\n"
+            f.write(line)
+
+
+def _build(source, directory, embedder, tmp_path):
+    return build_bank.build(str(source), str(directory), embedder=embedder,
+                            cache=EmbeddingCache(embedder, str(tmp_path / "embedding_cache")))
+
+
+def test_rebuild_recomputes_only_edited_questions(tmp_path):
+    source = tmp_path / "questions.jsonl"
+    shutil.copy(DEFAULT_QUESTIONS_PATH, source)
+    embedder = CountingEmbedder()
+    first = _build(source, tmp_path / "build", embedder, tmp_path)
+    assert first["rebuilt"] == first["questions"] and first["reused"] == 0
+
+    embedder.encoded = 0
+    again = _build(source, tmp_path / "build", embedder, tmp_path)
+    assert again["rebuilt"] == 0 and again["files_written"] == 0
+    assert again["version"] == first["version"] and embedder.encoded == 0
+
+    _edit(source, 4, model_answer="A shorter model answer about the same circuit.")
+    edited = _build(source, tmp_path / "build", embedder, tmp_path)
+    assert edited["rebuilt"] == 1 and edited["reused"] == first["questions"] - 1
+    assert 0 < embedder.encoded < first["questions"]
+
+    # Reusing the previous build gives exactly what a clean build would
+    clean = _build(source, tmp_path / "clean", CountingEmbedder(), tmp_path)
+    assert clean["version"] == edited["version"]
+    incremental = build_bank.load(str(source), str(tmp_path / "build"))
+    store = incremental.store(str(source))
+    position = store.position(4)
+    assert store.get_model_answer(4) == "A shorter model answer about the same circuit."
+    scratch = build_bank.load(str(source), str(tmp_path / "clean"))
+    assert incremental.rubric_bytes(position) == scratch.rubric_bytes(position)
+    assert np.array_equal(incremental.semantic_rows(position), scratch.semantic_rows(position))
+
+
+def test_stale_or_damaged_builds_are_ignored(tmp_path):
+    source = tmp_path / "questions.jsonl"
+    shutil.copy(DEFAULT_QUESTIONS_PATH, source)
+    directory = tmp_path / "build"
+    _build(source, directory, CountingEmbedder(), tmp_path)
+    assert build_bank.load(str(source), str(directory)) is not None
+
+    manifest = json.loads((directory / build_bank.MANIFEST).read_text())
+    (directory / manifest["files"]["search"]["file"]).write_bytes(b"damaged")
+    with pytest.warns(UserWarning, match="missing or corrupt"):
+        assert build_bank.load(str(source), str(directory)) is None
+
+    _build(source, directory, CountingEmbedder(), tmp_path)
+    _edit(source, 2, question="An edited question?")
+    with pytest.warns(UserWarning, match="different version"):
+        assert build_bank.load(str(source), str(directory)) is None
+
+
+def test_invalid_banks_are_rejected_with_every_problem(tmp_path):
+    source = tmp_path / "questions.jsonl"
+    shutil.copy(DEFAULT_QUESTIONS_PATH, source)
+    _edit(source, 3, key_points=[], id=2)
+    with pytest.raises(build_bank.ValidationError) as error:
+        _build(source, tmp_path / "build", CountingEmbedder(), tmp_path)
+    assert len(error.value.errors) == 2
+    assert any("duplicate id 2" in problem for problem in error.value.errors)
@@ -0,0 +1,98 @@
+import random
+
+import numpy as np
+
+from utils.dedup import DuplicateIndex, shingles
+from utils.eval_cache import EvaluationCache
+from utils.evaluator import AnswerEvaluator
+from utils.grading import Grader
+from utils.question_store import DEFAULT_QUESTIONS_PATH
+from utils.speculation import prepare_feedback
+
+WORDS = ("clock data edge setup hold time flip flop stable sample window violation metastable "
+         "output input delay path skew margin register latch").split()
+
+
+def _answer(rng, length=60):
+    return " ".join(rng.choice(WORDS) for _ in range(length))
+
+
+def _jaccard(first, second):
+    first, second = set(shingles(first)), set(shingles(second))
+    return len(first & second) / len(first | second)
+
+
+def test_signature_agreement_estimates_shingle_jaccard():
+    rng = random.Random(3)
+    index = DuplicateIndex()
+    for _ in range(30):
+        text = _answer(rng)
+        words = text.split()
+        for position in rng.sample(range(len(words)), rng.randint(1, 25)):
+            words[position] = rng.choice(WORDS)
+        edited = " ".join(words)
+        estimate = np.mean(index.signature(text) == index.signature(edited))
+        assert abs(estimate - _jaccard(text, edited)) < 0.15
+
+
+def test_near_copies_are_found_within_their_scope_only():
+    rng = random.Random(4)
+    index = DuplicateIndex()
+    original = _answer(rng, 80)
+    key = index.add(("", 1), original, {"kind": "submission", "score": 7})
+    words = original.split()
+    words[40] = "transistor"
+    near_copy = " ".join(words)
+
+    match = index.find(("", 1), near_copy)
+    assert match.key == key and match.payload["score"] == 7 and match.similarity >= index.threshold
+    assert index.find(("", 1), original.upper() + ".").similarity == 1.0
+    assert index.find(("cohort", 1), near_copy) is None
+    assert index.find(("", 2), near_copy) is None
+    assert index.find(("", 1), _answer(rng, 80)) is None
+    assert index.find(("", 1), " .. ") is None and index.add(("", 1), "", {}) is None
+
+
+def test_model_answer_is_seeded_once_wins_ties_and_is_never_evicted():
+    rng = random.Random(5)
+    model_answer = _answer(rng)
+    calls = []
+    index = DuplicateIndex(max_entries=2)
+    for _ in range(2):
+        index.seed(("", 1), lambda: calls.append(1) or model_answer)
+    assert calls == [1]
+    index.add(("", 1), model_answer, {"kind": "submission"})
+    assert index.find(("", 1), model_answer).payload["kind"] == "model_answer"
+
+    first, second, third = (_answer(rng) for _ in range(3))
+    index.add(("", 1), first, {"kind": "submission"})
+    index.add(("", 1), second, {"kind": "submission"})
+    # Matching refreshes an entry, so the least recently matched goes first
+    assert index.find(("", 1), first) is not None
+    index.add(("", 1), third, {"kind": "submission"})
+    assert index.submissions == 2 and len(index) == 3
+    assert index.find(("", 1), second) is None
+    assert index.find(("", 1), first) is not None
+    assert index.find(("", 1), model_answer).payload["kind"] == "model_answer"
+
+
+def test_copied_and_repeated_answers_skip_the_llm_call():
+    grader = Grader.from_path(DEFAULT_QUESTIONS_PATH, semantic=False)
+    store = grader.questions
+    question = store.get(1)
+    # The client is never reached: a duplicate returns before any LLM call
+    evaluator = AnswerEvaluator(client=object(), cache=EvaluationCache())
+    index = DuplicateIndex()
+
+    def prepare(answer):
+        return prepare_feedback(grader, evaluator, store, grader.rubrics, question, answer, index, ("", 1))
+
+    copied, stream = prepare(store.get_model_answer(1))
+    assert stream is None and copied["duplicate_of"] == "model_answer" and copied["source"] == "copied"
+
+    answer = "Setup time is the minimum time data must be stable before the clock edge, and hold " \
+             "time is the minimum time it must stay unchanged after the edge, or the flop goes metastable."
+    index.add(("", 1), answer, {"kind": "submission", "feedback": {"score": 8, "source": "llm"}})
+    reused, stream = prepare(answer.replace("flop", "flip-flop") + " ")
+    assert stream is None and reused["duplicate_of"] == "submission"
+    assert reused["score"] == 8 and reused["word_count"] == len(answer.replace("flop", "flip-flop").split())
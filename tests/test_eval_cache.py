@@ -0,0 +1,80 @@
+import json
+import time
+
+from utils.eval_cache import EvaluationCache, cache_key
+from utils.question_store import DEFAULT_QUESTIONS_PATH, QuestionStore
+from utils.rubric import CompiledRubric
+
+RESULT = {"score": 8, "source": "llm"}
+
+
+def _version(store, question_id):
+    # As the app computes it (utils.speculation)
+    question = store.get(question_id)
+    return f"{store.content_hash(question_id)}:{CompiledRubric(question).version}"
+
+
+def test_entries_expire_after_the_ttl():
+    cache = EvaluationCache(ttl=0.05)
+    cache.put("k", RESULT)
+    assert cache.get("k") == RESULT
+    time.sleep(0.1)
+    assert cache.get("k") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = EvaluationCache(max_entries=2)
+    cache.put("a", {"score": 1})
+    cache.put("b", {"score": 2})
+    assert cache.get("a") == {"score": 1}
+    cache.put("c", {"score": 3})
+    assert cache.get("b") is None
+    assert cache.get("a") == {"score": 1}
+    assert cache.get("c") == {"score": 3}
+
+
+def test_sqlite_tier_survives_a_new_instance(tmp_path):
+    path = str(tmp_path / "eval_cache.db")
+    EvaluationCache(db_path=path).put("k", RESULT)
+    cache = EvaluationCache(db_path=path)
+    assert cache.get("k") == RESULT
+    assert cache.stats()["disk_hits"] == 1
+    # Promoted to memory, so the next lookup does not touch the disk
+    assert cache.get("k") == RESULT
+    assert cache.stats()["disk_hits"] == 1
+
+
+def test_expired_sqlite_entries_are_not_served(tmp_path):
+    path = str(tmp_path / "eval_cache.db")
+    EvaluationCache(db_path=path, ttl=0.05).put("k", RESULT)
+    time.sleep(0.1)
+    assert EvaluationCache(db_path=path).get("k") is None
+
+
+def test_equivalent_answers_share_a_key():
+    version = "v1"
+    assert cache_key(1, "Setup time is  the window.", "gpt", version) == \
+        cache_key(1, "setup time is the window", "gpt", version)
+    assert cache_key(1, "setup time", "gpt", version) != cache_key(1, "setup time", "gpt-4o", version)
+
+
+def test_editing_the_model_answer_or_rubric_invalidates_entries(tmp_path):
+    with open(DEFAULT_QUESTIONS_PATH, encoding="utf-8") as source:
+        question = json.loads(source.readline())
+    answer = "Setup time is the window before the clock edge."
+    cache = EvaluationCache()
+
+    def bank(name, **changes):
+        path = tmp_path / name
+        path.write_text(json.dumps(dict(question, **changes)) + "\n", encoding="utf-8")
+        return QuestionStore(str(path))
+
+    original = bank("original.jsonl")
+    cache.put(cache_key(question["id"], answer, "gpt", _version(original, question["id"])), RESULT)
+    assert cache.get(cache_key(question["id"], answer, "gpt", _version(original, question["id"]))) == RESULT
+
+    edited_answer = bank("answer.jsonl", model_answer=question["model_answer"] + " Both are set by the flop.")
+    edited_rubric = bank("rubric.jsonl", key_points=question["key_points"] + ["metastability"])
+    for store in (edited_answer, edited_rubric):
+        assert cache.get(cache_key(question["id"], answer, "gpt", _version(store, question["id"]))) is None
@@ -0,0 +1,101 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from utils.eval_cache import EvaluationCache
+from utils.evaluator import RESULT_MARKER, AnswerEvaluator
+
+FALLBACK = {"score": 4, "title": "Needs work", "strengths": ["Mentions the clock"],
+            "improvements": ["Define the window"], "source": "heuristic"}
+VERDICT = json.dumps({"score": 8, "strengths": ["Correct definition"], "missing_points": ["Units"]})
+
+
+def _chunk(content):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))], usage=None)
+
+
+class FakeStreamClient:
+    """The slice of AsyncOpenAI streaming chat uses: each request streams
+    ``chunks`` after ``first_delay`` seconds, then ``delay`` between chunks."""
+
+    def __init__(self, chunks, first_delay=0.0, delay=0.0):
+        self.chunks = chunks
+        self.first_delay = first_delay
+        self.delay = delay
+        self.requests = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, **kwargs):
+        self.requests += 1
+        return self._stream()
+
+    async def _stream(self):
+        await asyncio.sleep(self.first_delay)
+        for number, content in enumerate(self.chunks):
+            if number:
+                await asyncio.sleep(self.delay)
+            yield _chunk(content)
+
+
+def _evaluator(client, **kwargs):
+    return AnswerEvaluator(client=client, cache=EvaluationCache(), **kwargs)
+
+
+def _stream(evaluator, answer="Setup time is the window before the edge."):
+    return evaluator.stream_feedback("What is setup time?", "The time data must be stable before the edge.",
+                                     answer, "Digital", "easy", FALLBACK)
+
+
+def test_streamed_feedback_is_shown_and_parsed():
+    client = FakeStreamClient(["Good ", "definition.", f"\n{RESULT_MARKER}\n", VERDICT])
+    stream = _stream(_evaluator(client))
+    shown = "".join(stream)
+    assert shown.strip() == "Good definition."
+    assert stream.result["source"] == "llm"
+    assert stream.result["score"] == 8
+    assert stream.result["improvements"] == ["Units"]
+    assert stream.result["commentary"] == "Good definition."
+    assert stream.first_token_latency is not None
+
+
+def test_marker_split_across_chunks_is_never_shown():
+    marker = f"\n{RESULT_MARKER}\n"
+    pieces = ["Close, but ", "check the hold window."] + list(marker) + [VERDICT]
+    stream = _stream(_evaluator(FakeStreamClient(pieces)))
+    yielded = list(stream)
+    assert all("#" not in piece for piece in yielded)
+    assert "".join(yielded).strip() == "Close, but check the hold window."
+    assert stream.result["score"] == 8
+
+
+def test_no_first_token_falls_back_to_rubric_feedback():
+    client = FakeStreamClient(["Too late"], first_delay=1.0)
+    stream = _stream(_evaluator(client, timeout=5.0, first_token_timeout=0.1))
+    assert list(stream) == []
+    assert stream.result["source"] == "heuristic"
+    assert stream.result["score"] == FALLBACK["score"]
+    assert "timed out" in stream.result["notice"]
+
+
+def test_stream_past_the_overall_deadline_falls_back():
+    chunks = ["Slow ", "feedback ", "keeps ", "coming ", "in."]
+    client = FakeStreamClient(chunks, delay=0.1)
+    stream = _stream(_evaluator(client, timeout=0.25, first_token_timeout=0.2))
+    list(stream)
+    assert stream.result["source"] == "heuristic"
+    assert "timed out" in stream.result["notice"]
+
+
+def test_malformed_result_keeps_the_commentary_and_the_rubric_score():
+    client = FakeStreamClient(["Decent answer.", f"\n{RESULT_MARKER}\n", "{score: eight"])
+    evaluator = _evaluator(client)
+    result = evaluator.evaluate_answer("What is setup time?", "Stable before the edge.", "It is a delay.",
+                                       "Digital", "easy", FALLBACK, question_id=1, version="v1")
+    assert result["source"] == "heuristic"
+    assert result["score"] == FALLBACK["score"]
+    assert "could not be parsed" in result["notice"]
+    assert result["commentary"] == "Decent answer."
+    # Unparsed feedback is not cached, so the next request asks again
+    evaluator.evaluate_answer("What is setup time?", "Stable before the edge.", "It is a delay.",
+                              "Digital", "easy", FALLBACK, question_id=1, version="v1")
+    assert client.requests == 2
@@ -0,0 +1,48 @@
+import io
+import json
+
+from utils.grading import Grader, grade_stream
+from utils.question_store import DEFAULT_QUESTIONS_PATH
+
+
+def _grade(records, workers):
+    out = io.StringIO()
+    stats = grade_stream([json.dumps(record) + "\n" for record in records], out,
+                         questions_path=DEFAULT_QUESTIONS_PATH, workers=workers, semantic=False)
+    return stats, [json.loads(line) for line in out.getvalue().splitlines()]
+
+
+def test_bad_answers_become_error_lines_and_the_rest_are_graded():
+    records = [
+        {"question_id": 1, "answer": "Setup time is how long data must be stable before the clock edge."},
+        {"question_id": 2, "answer": 5},
+        {"question_id": 3},
+        {"question_id": 4, "answer": None},
+        {"question_id": 5, "answer": "Clock skew is the difference in clock arrival times between flip-flops."},
+    ]
+    for workers in (1, 2):
+        stats, results = _grade(records, workers)
+        assert stats["graded"] == 2 and stats["errors"] == 3
+        assert [result["question_id"] for result in (results[0], results[4])] == [1, 5]
+        assert all("score" in results[i] for i in (0, 4))
+        assert results[1]["error"].startswith("TypeError") and "int" in results[1]["error"]
+        assert results[2]["error"].startswith("KeyError")
+        assert results[3]["error"].startswith("TypeError")
+
+
+def test_off_topic_answers_gain_nothing_from_semantic_scoring():
+    grader = Grader.from_path(DEFAULT_QUESTIONS_PATH)
+    off_topic = [
+        "I really like pizza and going to the beach on sunny days with my friends and family.",
+        "This is an important concept in electronics engineering and it is widely used in many "
+        "different circuits and systems.",
+    ]
+    for question_id in grader.questions.ids:
+        for answer in off_topic:
+            graded = grader.grade(question_id, answer)
+            graded.pop("semantic_similarity")
+            rubric_only = grader.rubrics[question_id].score(answer)
+            rubric_only.pop("semantic_similarity")
+            assert graded == rubric_only
+        # The model answer itself still matches on every key point
+        assert grader.grade(question_id, grader.questions.get_model_answer(question_id))["score"] == 10
@@ -0,0 +1,136 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from utils.llm_client import RequestScheduler
+
+MESSAGES = [{"role": "user", "content": "What is setup time?"}]
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+    def __init__(self, retry_after=None):
+        super().__init__("rate limited")
+        headers = {"retry-after": retry_after} if retry_after else {}
+        self.response = SimpleNamespace(headers=headers)
+
+
+def _chunk(content):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))], usage=None)
+
+
+class FakeChatClient:
+    """Streaming chat completions that yield ``tokens`` ``delay`` seconds
+    apart; the first ``rate_limited`` requests are refused with a 429."""
+
+    def __init__(self, tokens=("a", "b", "c"), delay=0.0, rate_limited=0, retry_after=None):
+        self.tokens = tokens
+        self.delay = delay
+        self.rate_limited = rate_limited
+        self.retry_after = retry_after
+        self.calls = []
+        self.cancelled = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, **kwargs):
+        self.calls.append(time.monotonic())
+        if self.rate_limited:
+            self.rate_limited -= 1
+            raise RateLimited(self.retry_after)
+        return self._stream()
+
+    async def _stream(self):
+        try:
+            for token in self.tokens:
+                await asyncio.sleep(self.delay)
+                yield _chunk(token)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+
+
+async def _collect(scheduler, messages=MESSAGES):
+    return [token async for token in scheduler.stream_chat(messages, "gpt-test")]
+
+
+def test_identical_requests_in_flight_share_one_upstream_call():
+    client = FakeChatClient(delay=0.01)
+    scheduler = RequestScheduler(client)
+
+    async def run():
+        return await asyncio.gather(_collect(scheduler), _collect(scheduler),
+                                    _collect(scheduler, [{"role": "user", "content": "Hold time?"}]))
+
+    first, second, other = asyncio.run(run())
+    assert first == second == other == ["a", "b", "c"]
+    assert len(client.calls) == 2
+    assert scheduler.stats()["coalesced"] == 1
+    assert scheduler.stats()["completed"] == 2
+
+
+def test_upstream_call_is_cancelled_when_the_last_caller_leaves():
+    client = FakeChatClient(tokens=["t"] * 50, delay=0.01)
+    scheduler = RequestScheduler(client)
+
+    async def run():
+        first = scheduler.stream_chat(MESSAGES, "gpt-test")
+        second = scheduler.stream_chat(MESSAGES, "gpt-test")
+        assert await first.__anext__() == "t"
+        assert await second.__anext__() == "t"
+        await first.aclose()
+        # One caller is still reading, so the upstream keeps going
+        assert await second.__anext__() == "t"
+        assert client.cancelled == 0
+        await second.aclose()
+        await asyncio.sleep(0.05)
+
+    asyncio.run(run())
+    assert client.cancelled == 1
+    assert len(client.calls) == 1
+    assert scheduler.stats()["completed"] == 0
+    assert not scheduler._in_flight
+
+
+def test_token_bucket_spaces_requests_past_the_burst():
+    client = FakeChatClient()
+    # 10 requests/s with a burst of 2 (twice the concurrency limit)
+    scheduler = RequestScheduler(client, max_concurrency=1, requests_per_minute=600)
+
+    async def run():
+        await asyncio.gather(*(
+            _collect(scheduler, [{"role": "user", "content": f"question {n}"}]) for n in range(4)
+        ))
+
+    asyncio.run(run())
+    assert len(client.calls) == 4
+    assert client.calls[1] - client.calls[0] < 0.05
+    # The third and fourth wait for the bucket to refill at 0.1s per token
+    assert client.calls[3] - client.calls[0] >= 0.15
+
+
+def test_rate_limited_requests_wait_for_retry_after_then_succeed():
+    client = FakeChatClient(rate_limited=1, retry_after="0.2")
+    scheduler = RequestScheduler(client)
+    assert asyncio.run(_collect(scheduler)) == ["a", "b", "c"]
+    assert len(client.calls) == 2
+    assert client.calls[1] - client.calls[0] >= 0.2
+    assert scheduler.stats()["rate_limited"] == 1
+
+
+def test_rate_limit_backoff_is_exponential_without_retry_after():
+    scheduler = RequestScheduler(FakeChatClient())
+    assert [scheduler._backoff(RateLimited(), attempt) for attempt in range(3)] == [0.5, 1.0, 2.0]
+    assert scheduler._backoff(RateLimited(retry_after="7"), 0) == 7.0
+    assert scheduler._backoff(RateLimited(), 10) == 30.0
+
+
+def test_rate_limit_error_surfaces_once_retries_run_out():
+    client = FakeChatClient(rate_limited=3, retry_after="0.01")
+    scheduler = RequestScheduler(client, max_retries=1)
+    with pytest.raises(RateLimited):
+        asyncio.run(_collect(scheduler))
+    assert len(client.calls) == 2
+    assert scheduler.stats()["failed"] == 1
@@ -0,0 +1,73 @@
+import sqlite3
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+from conftest import ROOT
+from utils.progress_store import ProgressStore
+
+
+def test_attempts_recorded_just_before_exit_are_committed(tmp_path):
+    path = tmp_path / "progress.db"
+    script = textwrap.dedent(f"""
+        import sys
+        sys.path.insert(0, {ROOT!r})
+        from utils.progress_store import ProgressStore
+        store = ProgressStore({str(path)!r}, flush_interval=60)
+        store.record_attempt("u1", 1, 7, word_count=40)
+        store.record_attempt("u1", 2, 4, word_count=12)
+    """)
+    subprocess.run([sys.executable, "-c", script], check=True, timeout=60)
+    with sqlite3.connect(path) as conn:
+        assert conn.execute("SELECT question_id, score FROM attempts ORDER BY id").fetchall() == [(1, 7), (2, 4)]
+        assert conn.execute("SELECT COUNT(*) FROM user_progress").fetchone() == (2,)
+
+
+def test_tenant_and_shared_questions_with_the_same_id_keep_separate_progress(tmp_path):
+    store = ProgressStore(str(tmp_path / "progress.db"))
+    store.record_attempt("u1", 1001, 3)
+    store.record_attempt("u1", 1001, 9, tenant="cohort")
+    store.record_attempt("u1", 1001, 5)
+    assert store.question_progress("u1")[1001]["attempts"] == 2
+    store.flush()
+    shared = store.question_progress("u1")[1001]
+    tenant = store.question_progress("u1", "cohort")[1001]
+    store.close()
+    assert (shared["attempts"], shared["best_score"], shared["last_score"]) == (2, 5, 5)
+    assert (tenant["attempts"], tenant["best_score"], tenant["last_score"]) == (1, 9, 9)
+    assert [row[:2] for row in store.attempt_history("u1", "cohort")] == [(1001, 9)]
+
+
+def test_progress_from_before_tenants_is_rebuilt_from_the_attempts(tmp_path):
+    path = str(tmp_path / "progress.db")
+    with sqlite3.connect(path) as conn:
+        conn.executescript("""
+            CREATE TABLE attempts (id INTEGER PRIMARY KEY, user_id TEXT NOT NULL, question_id INTEGER NOT NULL,
+                score INTEGER NOT NULL, word_count INTEGER NOT NULL, source TEXT NOT NULL, created_at REAL NOT NULL);
+            CREATE TABLE user_progress (user_id TEXT NOT NULL, question_id INTEGER NOT NULL,
+                attempts INTEGER NOT NULL, best_score INTEGER NOT NULL, last_score INTEGER NOT NULL,
+                last_at REAL NOT NULL, PRIMARY KEY (user_id, question_id));
+            INSERT INTO attempts (user_id, question_id, score, word_count, source, created_at) VALUES
+                ('u1', 1, 7, 40, 'heuristic', 1.0), ('u1', 1, 4, 40, 'heuristic', 2.0),
+                ('u2', 3, 6, 40, 'llm', 3.0);
+            INSERT INTO user_progress VALUES ('u1', 1, 2, 7, 4, 2.0), ('u2', 3, 1, 6, 6, 3.0);
+        """)
+    store = ProgressStore(path)
+    store.record_attempt("u1", 1, 8)
+    store.flush()
+    progress = store.question_progress("u1")
+    store.close()
+    assert progress == {1: {"attempts": 3, "best_score": 8, "last_score": 8, "last_at": progress[1]["last_at"]}}
+    assert store.summary("u2")["average_score"] == 6
+
+
+def test_recording_after_close_raises_instead_of_dropping_the_attempt(tmp_path):
+    store = ProgressStore(str(tmp_path / "progress.db"))
+    store.record_attempt("u1", 1, 7)
+    store.close()
+    with pytest.raises(RuntimeError):
+        store.record_attempt("u1", 2, 5)
+    store.close()
+    assert store.question_progress("u1")[1]["attempts"] == 1
@@ -0,0 +1,65 @@
+import itertools
+import json
+import random
+
+from utils.question_store import QuestionStore, bit_positions
+
+CATEGORIES = ["digital_design", "analog_circuits", "power"]
+DIFFICULTIES = ["hard", "easy", "medium"]
+TAGS = ["timing", "cmos", "filters", "interview"]
+
+
+def _bank(tmp_path, count=70):
+    rng = random.Random(1)
+    path = tmp_path / "bank.jsonl"
+    with open(path, "w", encoding="utf-8") as bank:
+        for question_id in range(1, count + 1):
+            bank.write(json.dumps({
+                "id": question_id,
+                "category": rng.choice(CATEGORIES),
+                "difficulty": rng.choice(DIFFICULTIES),
+                "tags": rng.sample(TAGS, rng.randint(0, 2)),
+                "question": f"Question {question_id}?",
+                "model_answer": "Answer.",
+                "key_points": [],
+            }) + "\n")
+    return QuestionStore(str(path))
+
+
+def _matches(question, selected):
+    for facet, value in selected.items():
+        values = question.get(facet) or []
+        if value and value not in (values if isinstance(values, list) else [values]):
+            return False
+    return True
+
+
+def test_bit_positions_lists_set_bits_lowest_first():
+    assert list(bit_positions(0)) == []
+    assert list(bit_positions(0b1011)) == [0, 1, 3]
+    assert list(bit_positions(1 << 200 | 1 << 64)) == [64, 200]
+
+
+def test_facet_bitsets_agree_with_a_scan_of_the_bank(tmp_path):
+    store = _bank(tmp_path)
+    questions = [dict(question) for question in store.questions]
+    for category, difficulty, tag in itertools.product([None] + CATEGORIES, [None] + DIFFICULTIES, [None] + TAGS):
+        selected = {"category": category, "difficulty": difficulty, "tags": tag}
+        expected = [question["id"] for question in questions if _matches(question, selected)]
+        assert [question["id"] for question in store.filter(**selected)] == expected
+        total, page = store.search(offset=2, limit=3, **selected)
+        assert total == len(expected) and [question["id"] for question in page] == expected[2:5]
+        for facet in ("category", "difficulty", "tags"):
+            others = dict(selected, **{facet: None})
+            counts = store.facet_counts(facet, **selected)
+            assert counts == {
+                value: sum(_matches(question, dict(others, **{facet: value})) for question in questions)
+                for value in store.facet_values(facet)
+            }
+
+
+def test_facet_values_are_in_display_order(tmp_path):
+    store = _bank(tmp_path)
+    assert store.facet_values("difficulty") == ["easy", "medium", "hard"]
+    assert sorted(store.facet_values("tags")) == sorted(TAGS)
+    assert store.facet_counts("category", category="power") == store.facet_counts("category")
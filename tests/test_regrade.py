@@ -0,0 +1,77 @@
+import io
+import json
+from types import SimpleNamespace
+
+from utils.eval_cache import EvaluationCache
+from utils.evaluator import RESULT_MARKER, AnswerEvaluator
+from utils.grading import Grader
+from utils.question_store import DEFAULT_QUESTIONS_PATH
+from utils.regrade import collect, submit
+
+
+class FakeBatchClient:
+    """The slice of AsyncOpenAI the Batch API path uses. The batch runs on
+    the first status check after ``polls_until_done`` earlier ones."""
+
+    def __init__(self, polls_until_done: int = 1):
+        self.polls_until_done = polls_until_done
+        self.uploads = {}
+        self.files = SimpleNamespace(create=self._upload, content=self._content)
+        self.batches = SimpleNamespace(create=self._create, retrieve=self._retrieve)
+
+    async def _upload(self, file, purpose):
+        file_id = f"file-{len(self.uploads)}"
+        self.uploads[file_id] = file[1].decode("utf-8")
+        return SimpleNamespace(id=file_id)
+
+    async def _content(self, file_id):
+        return SimpleNamespace(text=self.uploads[file_id])
+
+    async def _create(self, input_file_id, endpoint, completion_window):
+        self.input_file_id = input_file_id
+        return SimpleNamespace(id="batch-1", status="validating")
+
+    async def _retrieve(self, batch_id):
+        if self.polls_until_done:
+            self.polls_until_done -= 1
+            return SimpleNamespace(status="in_progress")
+        output = []
+        for line in self.uploads[self.input_file_id].splitlines():
+            request = json.loads(line)
+            if request["custom_id"] == "0":
+                content = f"Good start.\n{RESULT_MARKER}\n" + json.dumps({"score": 9, "strengths": ["Precise"]})
+                response = {"status_code": 200, "body": {"choices": [{"message": {"content": content}}]}}
+            else:
+                response = {"status_code": 500, "body": {"error": {"message": "server error"}}}
+            output.append(json.dumps({"custom_id": request["custom_id"], "response": response}))
+        self.uploads["file-out"] = "\n".join(output)
+        return SimpleNamespace(status="completed", output_file_id="file-out", error_file_id=None)
+
+
+def test_batch_regrade_overlays_llm_reviews_on_rubric_grades():
+    client = FakeBatchClient()
+    evaluator = AnswerEvaluator(client=client, cache=EvaluationCache())
+    grader = Grader.from_path(DEFAULT_QUESTIONS_PATH, semantic=False)
+    lines = [json.dumps(record) + "\n" for record in (
+        {"question_id": 1, "answer": "Setup time is how long data must be stable before the clock edge.",
+         "candidate": "a"},
+        {"question_id": 2, "answer": 5},
+        {"question_id": "3", "answer": "Hold time is how long data must stay stable after the clock edge."},
+    )]
+
+    batch, skipped = submit(lines, grader, evaluator)
+    assert skipped == 1
+    requests = [json.loads(line) for line in client.uploads["file-0"].splitlines()]
+    assert [request["custom_id"] for request in requests] == ["0", "2"]
+    assert "Setup time is how long" in requests[0]["body"]["messages"][1]["content"]
+
+    assert evaluator.batch_results(batch.id) is None
+    results = evaluator.batch_results(batch.id)
+    out = io.StringIO()
+    stats = collect(lines, out, results, grader, evaluator)
+    assert stats == {"graded": 2, "llm": 1, "errors": 1}
+    first, error, last = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert (first["score"], first["source"], first["candidate"], first["strengths"]) == (9, "llm", "a", ["Precise"])
+    assert "covered" in first and "answer" not in first
+    assert "TypeError" in error["error"]
+    assert last["source"] == "heuristic" and last["question_id"] == 3
@@ -0,0 +1,81 @@
+import random
+
+from utils.question_store import DEFAULT_QUESTIONS_PATH, QuestionStore
+from utils.rubric import CompiledRubric, LiveHints
+
+STORE = QuestionStore(DEFAULT_QUESTIONS_PATH)
+
+
+def _rubric(question_id) -> CompiledRubric:
+    return CompiledRubric(STORE.get(question_id))
+
+
+def test_live_hints_incremental_rescans_match_a_full_rescan():
+    rng = random.Random(0)
+    for question_id in STORE.ids:
+        rubric = _rubric(question_id)
+        pieces = STORE.get_model_answer(question_id).split() + [".", "!", "\n", "e.g.", "setup", "hold", "  "]
+        hints = LiveHints(rubric)
+        text = ""
+        for _ in range(60):
+            start = rng.randint(0, len(text))
+            end = min(len(text), start + rng.choice([0, 0, 1, 5, 40]))
+            insert = " ".join(rng.choice(pieces) for _ in range(rng.randint(0, 6)))
+            text = text[:start] + insert + text[end:]
+            assert hints.update(text) == LiveHints(rubric).update(text)
+        full = rubric.score(text)
+        result = hints.update(text)
+        assert result["covered"] == full["covered"]
+        assert result["word_count"] == full["word_count"]
+
+
+def test_live_hints_debounce_defers_and_flushes():
+    rubric = _rubric(1)
+    hints = LiveHints(rubric, min_interval=0.25)
+    hints.update("Setup time is when data is stable", now=10.0)
+    deferred = hints.update("Setup time is when data is stable before the clock edge. Metastability", now=10.1)
+    assert deferred["pending"] and "metastability" not in deferred["covered"]
+    flushed = hints.flush()
+    assert not flushed["pending"] and "metastability" in flushed["covered"]
+    assert flushed == LiveHints(rubric).update(hints.text)
+
+
+def test_rubric_terms_match_synonyms_prefixes_and_whole_phrases():
+    rubric = CompiledRubric({
+        "id": "skew",
+        "key_points": ["clock skew", "jitter", "mitigation"],
+        "rubric": {"key_points": {
+            "clock skew": {"terms": ["skew", "arrival time*"], "weight": 3},
+            "jitter": ["jitter", "cycle to cycle"],
+        }},
+    })
+    skew = rubric.score("Skew is the difference in arrival times.")
+    assert skew["covered"] == ["clock skew"] and skew["keywords_found"] == ["skew", "arrival time"]
+    # Brief answer (-2) plus 3 of the 5 concept points for 3/5 of the weight
+    assert skew["score"] == 6
+    jitter = rubric.score("Cycle-to-cycle variation is jitter.")
+    assert jitter["covered"] == ["jitter"] and jitter["score"] == 4
+    # A key point without synonyms matches its own wording
+    assert rubric.score("Mitigation with balanced trees.")["covered"] == ["mitigation"]
+    # Half a phrase is not a hit, and an answer with no key point loses points
+    missed = rubric.score("The arrival of the clock")
+    assert missed["covered"] == [] and missed["score"] == 1
+
+
+def test_reversed_setup_and_hold_is_flagged_as_a_misconception():
+    rubric = _rubric(1)
+    reversed_answer = rubric.score(
+        "Setup time is the time after the clock edge. Hold time is the time before the clock edge."
+    )
+    assert reversed_answer["misconception"] and reversed_answer["score"] == 2
+    assert reversed_answer["improvements"][0].endswith("You reversed setup and hold time!")
+    assert "✓ Setup time is BEFORE clock edge" in reversed_answer["improvements"]
+    for answer in (
+        "Setup time is the time before the clock edge. Hold time is the time after the clock edge.",
+        # Only one of the two subjects bound the wrong way is not a reversal
+        "Setup time is the time after the clock edge. Hold time is the time after the clock edge.",
+        # Relations only bind to a subject in the same sentence
+        "Setup is after, and hold. Before the edge.",
+    ):
+        result = rubric.score(answer)
+        assert not result["misconception"] and result["score"] == 5
@@ -0,0 +1,31 @@
+from utils.scheduler import DAY, QuestionOrder, SpacedRepetitionScheduler
+
+QUESTIONS = [
+    {"id": 1, "category": "Analog", "difficulty": "hard"},
+    {"id": 2, "category": "Analog", "difficulty": "easy"},
+    {"id": 3, "category": "Digital", "difficulty": "easy"},
+    {"id": 4, "category": "Analog", "difficulty": "easy"},
+    {"id": 5, "category": "Digital", "difficulty": "medium"},
+]
+
+
+def test_sessions_share_the_unseen_order_and_only_track_their_history():
+    order = QuestionOrder(QUESTIONS)
+    first = SpacedRepetitionScheduler(order, [(2, 9, 0.0)])
+    second = SpacedRepetitionScheduler(order)
+    assert set(first.cards) == {2}
+    assert second.cards == {}
+
+    # Unseen questions come easiest first, then in bank order
+    assert second.next_question(now=0.0) == 2
+    assert first.next_question(now=0.0) == 3
+    assert first.next_question(category="Analog", now=0.0) == 4
+    assert first.next_question(category="Analog", exclude=4, now=0.0) == 1
+
+    # A skipped unseen question goes behind the others; a failed one comes back when due
+    second.skip(2, now=0.0)
+    assert second.next_question(category="Analog", difficulty="easy", now=0.0) == 4
+    second.review(4, 2, now=0.0)
+    assert second.next_question(category="Analog", difficulty="easy", now=DAY) == 4
+    assert set(second.cards) == {2, 4}
+    assert set(first.cards) == {2}
@@ -0,0 +1,88 @@
+import io
+import math
+
+import numpy as np
+
+from utils.search import B, FIELD_WEIGHTS, K1, PREFIX_WEIGHT, SearchIndex, analyze, ranked, tokenize
+
+DOCUMENTS = [
+    {"question": "Explain metastability in flip flops", "key_points": "synchronizer\nMTBF",
+     "model_answer": "A flip flop sampling a changing input can go metastable."},
+    {"question": "What is clock skew?", "key_points": "skew\narrival",
+     "model_answer": "Skew is the difference in clock arrival times between flip flops."},
+    {"question": "Design an op amp integrator", "key_points": "capacitor\nfeedback",
+     "model_answer": "Put a capacitor in the feedback path of an inverting op amp."},
+    {"question": "Why do synchronizers use two flip flops?", "key_points": "metastability",
+     "model_answer": "The second flop gives a metastable first flop time to resolve."},
+    {"question": "Clock gating", "key_points": "power",
+     "model_answer": "Gating the clock saves dynamic power; the clock enable must be glitch free."},
+]
+
+
+def _reference_scores(text):
+    # BM25F straight from the definition
+    fields = list(FIELD_WEIGHTS)
+    tokens = [{field: tokenize(document[field]) for field in fields} for document in DOCUMENTS]
+    averages = [max(1.0, sum(len(doc[field]) for doc in tokens) / len(tokens)) for field in fields]
+    vocabulary = {term for doc in tokens for field in fields for term in doc[field]}
+
+    def impact(term, doc):
+        weighted = sum(FIELD_WEIGHTS[field] * doc[field].count(term) / (1 - B + B * len(doc[field]) / average)
+                       for field, average in zip(fields, averages))
+        frequency = sum(any(term in other[field] for field in fields) for other in tokens)
+        idf = math.log1p((len(tokens) - frequency + 0.5) / (frequency + 0.5))
+        return idf * weighted * (K1 + 1) / (K1 + weighted)
+
+    scores = []
+    for doc in tokens:
+        total = 0.0
+        for word in dict.fromkeys(tokenize(text)):
+            word_score = sum((1.0 if term == word else PREFIX_WEIGHT) * impact(term, doc)
+                             for term in vocabulary
+                             if term == word or (len(word) >= 3 and term.startswith(word)))
+            if not word_score:
+                total = 0.0
+                break
+            total += word_score
+        scores.append(total)
+    return scores
+
+
+def test_scores_match_bm25f_with_prefixes_and_every_word_required():
+    index = SearchIndex.build(DOCUMENTS)
+    for text in ("flip flops", "metastab", "clock", "clock power", "op amp capacitor", "skew op", "fl"):
+        scores = index.scores(text)
+        assert np.allclose(scores, _reference_scores(text), rtol=1e-5)
+        # A document outside the index scores as it would inside it
+        for position, document in enumerate(DOCUMENTS):
+            assert math.isclose(index.score(analyze(document), text), scores[position], rel_tol=1e-5)
+    assert index.scores("  ,. ") is None
+    assert not index.scores("flip transistor").any()
+
+
+def test_question_words_outrank_the_same_word_in_the_model_answer():
+    index = SearchIndex.build([
+        {"question": "Explain the op amp", "model_answer": "It amplifies the difference of two inputs."},
+        {"question": "Explain the inverter", "model_answer": "It is made with an op amp in some designs."},
+    ])
+    total, positions, _ = ranked(index.scores("op amp"), 0b11, 10)
+    assert total == 2 and positions == [0, 1]
+    # Prefix hits count for less than exact ones
+    index = SearchIndex.build([{"question": "metastability"}, {"question": "metast"}])
+    assert list(np.argsort(-index.scores("metast"))) == [1, 0]
+
+
+def test_ranked_pages_are_limited_to_the_filter_and_break_ties_in_bank_order():
+    scores = np.array([0.0, 2.0, 1.0, 2.0, 3.0, 1.0])
+    assert ranked(scores, 0b111111, 3) == (5, [4, 1, 3], [3.0, 2.0, 2.0])
+    assert ranked(scores, 0b100101, 10) == (2, [2, 5], [1.0, 1.0])
+
+
+def test_saved_index_loads_with_the_same_scores():
+    index = SearchIndex.build(DOCUMENTS)
+    buffer = io.BytesIO()
+    index.save(buffer)
+    buffer.seek(0)
+    loaded = SearchIndex.load(buffer)
+    assert loaded.term_count == index.term_count
+    assert np.array_equal(loaded.scores("flip metast"), index.scores("flip metast"))
@@ -0,0 +1,93 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+from utils.eval_cache import EvaluationCache
+from utils.evaluator import AnswerEvaluator
+from utils.grading import Grader
+from utils.question_store import DEFAULT_QUESTIONS_PATH
+from utils.speculation import FeedbackPrefetcher
+
+ANSWER = "Setup time is how long data must be stable before the clock edge; hold time is after it."
+
+
+class GatedGrader:
+    """Grader that waits for ``release`` before grading, recording each call."""
+
+    def __init__(self):
+        self.grader = Grader.from_path(DEFAULT_QUESTIONS_PATH, semantic=False)
+        self.questions = self.grader.questions
+        self.grading = threading.Event()
+        self.release = threading.Event()
+        self.graded = []
+
+    def grade(self, question_id, answer):
+        self.grading.set()
+        self.release.wait(5)
+        self.graded.append(answer)
+        return self.grader.grade(question_id, answer)
+
+
+class EndlessClient:
+    """Streaming chat that keeps sending tokens until it is cancelled."""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.cancelled = threading.Event()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, **kwargs):
+        return self._stream()
+
+    async def _stream(self):
+        self.started.set()
+        try:
+            while True:
+                await asyncio.sleep(0.01)
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content="more "))], usage=None)
+        except asyncio.CancelledError:
+            self.cancelled.set()
+            raise
+
+
+def _submit(prefetcher, grader, evaluator, answer=ANSWER):
+    question = grader.questions.get(1)
+    return prefetcher.submit(grader, evaluator, grader.questions, grader.grader.rubrics, question, answer)
+
+
+def test_speculation_cancelled_before_it_runs_never_grades():
+    grader = GatedGrader()
+    evaluator = AnswerEvaluator(client=EndlessClient(), cache=EvaluationCache())
+    prefetcher = FeedbackPrefetcher(max_workers=1)
+    running = _submit(prefetcher, grader, evaluator)
+    queued = _submit(prefetcher, grader, evaluator, answer=ANSWER + " Edited.")
+    assert queued.matches(1, ANSWER + " Edited.") and not queued.matches(1, ANSWER)
+    queued.cancel()
+    grader.release.set()
+    feedback, stream = running.result(5)
+    stream.cancel()
+    assert queued.future.cancelled()
+    assert grader.graded == [ANSWER] and feedback["score"] >= 1
+
+
+def test_cancelling_a_started_speculation_stops_its_llm_call():
+    client = EndlessClient()
+    grader = GatedGrader()
+    evaluator = AnswerEvaluator(client=client, cache=EvaluationCache())
+    prefetcher = FeedbackPrefetcher(max_workers=1)
+    # Cancelled while grading: the stream it goes on to start is cancelled
+    grading = _submit(prefetcher, grader, evaluator)
+    assert grader.grading.wait(5)
+    grading.cancel()
+    grader.release.set()
+    assert client.started.wait(5) and client.cancelled.wait(5)
+
+    # Cancelled once the LLM call is streaming
+    client = EndlessClient()
+    evaluator = AnswerEvaluator(client=client, cache=EvaluationCache())
+    streaming = _submit(prefetcher, grader, evaluator)
+    assert client.started.wait(5)
+    assert not client.cancelled.is_set()
+    streaming.cancel()
+    assert client.cancelled.wait(5)
+    assert prefetcher.pending == 0
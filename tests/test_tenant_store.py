@@ -0,0 +1,98 @@
+import itertools
+import json
+import random
+
+from utils.question_store import QuestionStore
+from utils.tenant_store import TenantStore
+
+CATEGORIES = ["digital_design", "analog_circuits", "power"]
+DIFFICULTIES = ["easy", "medium", "hard"]
+TAGS = ["timing", "cmos", "filters"]
+WORDS = ["clock", "skew", "latch", "buffer", "op", "amp", "filter", "gain", "noise", "setup", "hold", "timer"]
+
+
+def _questions(count=40):
+    rng = random.Random(2)
+    return [{
+        "id": question_id,
+        "category": rng.choice(CATEGORIES),
+        "difficulty": rng.choice(DIFFICULTIES),
+        "tags": rng.sample(TAGS, rng.randint(0, 2)),
+        "question": " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 8))) + "?",
+        "model_answer": " ".join(rng.choice(WORDS) for _ in range(20)),
+        "key_points": [],
+    } for question_id in range(1, count + 1)]
+
+
+DELTAS = [
+    {"id": 3, "category": "power", "difficulty": "hard"},
+    {"id": 5, "question": "What does a watchdog timer reset?", "tags": ["timing"],
+     "model_answer": "A watchdog timer resets a hung controller."},
+    {"id": 8, "tags": []},
+    {"id": 101, "category": "power", "difficulty": "easy", "question": "Why is a watchdog timer independent?",
+     "tags": ["cmos"], "key_points": []},
+    {"id": 102, "category": "analog_circuits", "difficulty": "medium", "question": "What limits op amp gain?",
+     "model_answer": "Open loop gain and noise.", "key_points": []},
+]
+
+
+def _write(path, questions):
+    path.write_text("".join(json.dumps(question) + "\n" for question in questions), encoding="utf-8")
+    return str(path)
+
+
+def _stores(tmp_path):
+    base_questions = _questions()
+    base = QuestionStore(_write(tmp_path / "bank.jsonl", base_questions))
+    tenant = TenantStore(base, _write(tmp_path / "cohort.jsonl", DELTAS), "cohort")
+    # The same bank with the overlay applied, as one plain store
+    deltas = {delta["id"]: delta for delta in DELTAS}
+    merged = [dict(question, **deltas.pop(question["id"], {})) for question in base_questions]
+    merged += [dict(delta, model_answer=delta.get("model_answer", "")) for delta in deltas.values()]
+    return tenant, QuestionStore(_write(tmp_path / "merged.jsonl", merged))
+
+
+def _ids(questions):
+    return [question["id"] for question in questions]
+
+
+def test_overlay_filtering_and_facet_counts_match_the_merged_bank(tmp_path):
+    tenant, merged = _stores(tmp_path)
+    assert len(tenant) == len(merged)
+    for category, difficulty, tag in itertools.product([None] + CATEGORIES, [None] + DIFFICULTIES, [None] + TAGS):
+        selected = {"category": category, "difficulty": difficulty, "tags": tag}
+        assert _ids(tenant.filter(**selected)) == _ids(merged.filter(**selected))
+        for offset in (0, 7, 30):
+            total, page = tenant.search(offset=offset, limit=8, **selected)
+            expected_total, expected = merged.search(offset=offset, limit=8, **selected)
+            assert total == expected_total and _ids(page) == _ids(expected)
+        for facet in ("category", "difficulty", "tags"):
+            assert tenant.facet_counts(facet, **selected) == merged.facet_counts(facet, **selected)
+
+
+def test_overlay_text_search_finds_overrides_and_additions(tmp_path):
+    tenant, merged = _stores(tmp_path)
+    for text, selected in (("watchdog", {}), ("watchdog timer", {"category": "power"}),
+                           ("gain", {}), ("cloc", {"difficulty": "hard"}), ("noise op", {})):
+        total, everything = tenant.search(text=text, limit=len(tenant), **selected)
+        expected_total, expected = merged.search(text=text, limit=len(merged), **selected)
+        # Ranking uses the shared bank's term statistics, so only the
+        # matches (not their order) are the same as a merged bank's
+        assert total == expected_total and sorted(_ids(everything)) == sorted(_ids(expected))
+        pages = [question for offset in range(0, total, 3)
+                 for question in tenant.search(text=text, offset=offset, limit=3, **selected)[1]]
+        assert _ids(pages) == _ids(everything)
+        assert tenant.facet_counts("category", text, **selected) == merged.facet_counts("category", text, **selected)
+    assert set(_ids(tenant.search(text="watchdog")[1])) == {5, 101}
+
+
+def test_overlay_reads_through_to_the_shared_bank(tmp_path):
+    tenant, _ = _stores(tmp_path)
+    assert tenant.get(3)["category"] == "power"
+    assert tenant.get(3)["question"] == tenant.base.get(3)["question"]
+    assert tenant.get_model_answer(3) == tenant.base.get_model_answer(3)
+    assert tenant.get_model_answer(5) == "A watchdog timer resets a hung controller."
+    assert tenant.get_model_answer(101) == ""
+    assert tenant.content_hash(4) == tenant.base.content_hash(4)
+    assert tenant.content_hash(3) != tenant.base.content_hash(3)
+    assert sorted(tenant.delta_ids) == [3, 5, 8, 101, 102]
@@ -0,0 +1,76 @@
+import numpy as np
+
+from utils import vector_store
+from utils.embeddings import HashingEmbedder
+from utils.vector_store import QuestionIndex, VectorStore
+
+
+class Bank:
+    """Just enough of the QuestionStore interface for QuestionIndex."""
+
+    def __init__(self, count: int):
+        self.records = {}
+        for question_id in range(count):
+            self.put(question_id, f"question {question_id} about topic {question_id % 7}")
+
+    def put(self, question_id, text: str):
+        self.records[question_id] = {"id": question_id, "category": f"c{question_id % 3}", "question": text,
+                                     "model_answer": f"answer {question_id}"}
+
+    @property
+    def questions(self):
+        return list(self.records.values())
+
+    def get(self, question_id):
+        return self.records[question_id]
+
+    def content_hash(self, question_id) -> str:
+        return str(hash(self.records[question_id]["question"]))
+
+    def iter_model_answers(self):
+        return ((question_id, record["model_answer"]) for question_id, record in self.records.items())
+
+
+def test_sync_updates_the_index_in_place_and_retrains_only_on_drift(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_store, "BRUTE_FORCE_THRESHOLD", 100)
+    rebuilds = []
+    rebuild_index = VectorStore.rebuild_index
+    monkeypatch.setattr(VectorStore, "rebuild_index",
+                        lambda self, nlist=None: rebuilds.append(len(self)) or rebuild_index(self, nlist))
+    bank = Bank(80)
+    index = QuestionIndex(VectorStore(str(tmp_path), dim=64), bank, HashingEmbedder(dim=64))
+    index.sync()
+    assert rebuilds == []
+
+    # Crossing the threshold trains the index once
+    for question_id in range(80, 120):
+        bank.put(question_id, f"question {question_id} about topic {question_id % 7}")
+    index.sync()
+    assert rebuilds == [120]
+
+    # An edit is re-embedded and assigned to its nearest centroid
+    bank.put(5, "how does a phase locked loop lock onto its reference")
+    index.sync()
+    assert rebuilds == [120]
+    assert index.find_similar_questions(bank.get(5)["question"], k=1)["ids"] == [5]
+
+    # Enough churn retrains, and the drift count survives a reload
+    for question_id in range(120, 130):
+        bank.put(question_id, f"question {question_id} about topic {question_id % 7}")
+    index.sync()
+    reloaded = QuestionIndex(VectorStore(str(tmp_path), dim=64), bank, HashingEmbedder(dim=64))
+    for question_id in range(130, 150):
+        bank.put(question_id, f"question {question_id} about topic {question_id % 7}")
+    reloaded.sync()
+    assert rebuilds == [120, 150]
+
+
+def test_single_row_adds_grow_capacity_geometrically(tmp_path):
+    store = VectorStore(str(tmp_path), dim=8)
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((3000, 8)).astype(np.float32)
+    for row, vector in enumerate(vectors):
+        store.add([str(row)], vector[None], ["c"])
+    assert len(store) == 3000
+    assert len(store._alive) < 2 * 3000
+    assert store.search(vectors[1234], k=1)[0]["key"] == "1234"
@@ -0,0 +1,311 @@
+import math
+import threading
+from collections import Counter
+from typing import Callable, Dict, Any, Iterable, List, Optional, Sequence, Set, Tuple
+
+# Questions need this many graded attempts before they are compared with
+# their difficulty level
+MIN_ATTEMPTS = 5
+# A question is flagged as miscalibrated when its mean score is both this
+# many standard errors and this many points away from the other questions
+# of its difficulty level
+MISCALIBRATION_Z = 2.0
+MISCALIBRATION_GAP = 1.5
+
+
+class RunningStats:
+    """Count, mean and variance in one pass (Welford's algorithm)."""
+
+    __slots__ = ("count", "mean", "_m2")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+    @property
+    def variance(self) -> float:
+        """Sample variance (0 below two values)."""
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def stddev(self) -> float:
+        return math.sqrt(self.variance)
+
+    def without(self, part: "RunningStats") -> "RunningStats":
+        """Statistics of these values minus ``part``, a subset of them
+        (Chan et al.'s pairwise update, run backwards)."""
+        rest = RunningStats()
+        rest.count = self.count - part.count
+        if rest.count > 0:
+            rest.mean = (self.count * self.mean - part.count * part.mean) / rest.count
+            delta = part.mean - rest.mean
+            rest._m2 = max(0.0, self._m2 - part._m2 - delta * delta * part.count * rest.count / self.count)
+        return rest
+
+
+class TDigest:
+    """Streaming quantile sketch (merging t-digest).
+
+    Values are buffered and periodically merged into at most about
+    ``compression`` centroids, sized by the arcsine scale function so
+    centroids near the tails stay small and extreme quantiles stay accurate.
+    """
+
+    __slots__ = ("compression", "count", "minimum", "maximum", "_means", "_weights", "_buffer")
+
+    def __init__(self, compression: int = 100):
+        self.compression = compression
+        self.count = 0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self._means: List[float] = []
+        self._weights: List[float] = []
+        self._buffer: List[float] = []
+
+    def add(self, value: float):
+        self.count += 1
+        self.minimum = min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+        self._buffer.append(value)
+        if len(self._buffer) >= 5 * self.compression:
+            self._merge()
+
+    def _scale(self, q: float) -> float:
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def _scale_inverse(self, k: float) -> float:
+        return (math.sin(k * 2 * math.pi / self.compression) + 1) / 2
+
+    def _merge(self):
+        if not self._buffer:
+            return
+        points = sorted(list(zip(self._means, self._weights)) + [(value, 1.0) for value in self._buffer])
+        self._buffer = []
+        means, weights = [], []
+        mean, weight = points[0]
+        merged = 0.0
+        limit = self._scale_inverse(self._scale(0.0) + 1)
+        for point_mean, point_weight in points[1:]:
+            if (merged + weight + point_weight) / self.count <= limit:
+                weight += point_weight
+                mean += (point_mean - mean) * point_weight / weight
+                continue
+            means.append(mean)
+            weights.append(weight)
+            merged += weight
+            limit = self._scale_inverse(self._scale(min(1.0, merged / self.count)) + 1)
+            mean, weight = point_mean, point_weight
+        means.append(mean)
+        weights.append(weight)
+        self._means, self._weights = means, weights
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimated ``q`` quantile, or None before the first value."""
+        if not self.count:
+            return None
+        self._merge()
+        means, weights = self._means, self._weights
+        if len(means) == 1:
+            return means[0]
+        target = q * self.count
+        # Each centroid's weight is centred on its mean
+        centre = weights[0] / 2
+        if target < centre:
+            return self.minimum + (means[0] - self.minimum) * target / centre
+        for index in range(1, len(means)):
+            next_centre = centre + (weights[index - 1] + weights[index]) / 2
+            if target < next_centre:
+                fraction = (target - centre) / (next_centre - centre)
+                return means[index - 1] + (means[index] - means[index - 1]) * fraction
+            centre = next_centre
+        remaining = self.count - centre
+        if remaining <= 0:
+            return self.maximum
+        return means[-1] + (self.maximum - means[-1]) * min(1.0, (target - centre) / remaining)
+
+
+class Aggregate:
+    """Running statistics of the graded attempts at one question, category
+    or difficulty level."""
+
+    __slots__ = ("scores", "histogram", "missed", "key_points", "judged", "answer_seconds")
+
+    def __init__(self):
+        self.scores = RunningStats()
+        self.histogram = [0] * 11
+        self.missed: Counter = Counter()
+        self.key_points = 0
+        # Attempts with key point results (older history has none)
+        self.judged = 0
+        self.answer_seconds = TDigest()
+
+    def add(self, score: int, missing: Sequence[str], key_points: int, answer_seconds: Optional[float]):
+        self.scores.add(score)
+        self.histogram[max(0, min(10, int(score)))] += 1
+        self.missed.update(missing)
+        self.key_points += key_points
+        self.judged += key_points > 0
+        if answer_seconds is not None:
+            self.answer_seconds.add(answer_seconds)
+
+    @property
+    def attempts(self) -> int:
+        return self.scores.count
+
+    def summary(self, top: int = 3) -> Dict[str, Any]:
+        missed = sum(self.missed.values())
+        return {
+            "attempts": self.attempts,
+            "mean": self.scores.mean,
+            "stddev": self.scores.stddev,
+            "histogram": self.histogram[1:],
+            "miss_rate": missed / self.key_points if self.key_points else 0.0,
+            "most_missed": [(name, count / self.judged) for name, count in self.missed.most_common(top)],
+            "answer_seconds": {q: self.answer_seconds.quantile(q) for q in (0.5, 0.9)},
+        }
+
+
+class Analytics:
+    """Score statistics across all users, per question, category and
+    difficulty, updated as each attempt is graded.
+
+    Every aggregate is kept up to date by ``record()``, so reading one is a
+    dictionary lookup rather than a scan of the attempt history (which is
+    read once, by ``from_history``, when the process starts). Questions are
+    keyed by (tenant, id), as a tenant may override a shared question; the
+    shared bank is tenant "".
+    """
+
+    def __init__(self, min_attempts: int = MIN_ATTEMPTS, z: float = MISCALIBRATION_Z,
+                 gap: float = MISCALIBRATION_GAP):
+        self.min_attempts = min_attempts
+        self.z = z
+        self.gap = gap
+        self.questions: Dict[Tuple[str, Any], Aggregate] = {}
+        self.categories: Dict[str, Aggregate] = {}
+        self.difficulties: Dict[str, Aggregate] = {}
+        # Difficulty of each (tenant, id), for the miscalibration check
+        self._levels: Dict[Tuple[str, Any], str] = {}
+        self._by_level: Dict[str, Set[Tuple[str, Any]]] = {}
+        # (tenant, id) of questions flagged when last checked, so listing
+        # them does not check every question
+        self._flagged: Set[Tuple[str, Any]] = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_history(cls, store, attempts: Iterable[tuple],
+                     tenants: Optional[Callable[[str], Any]] = None, **kwargs) -> "Analytics":
+        """Aggregate (question_id, score, missing, key_points, answer_seconds,
+        tenant) rows. Tenant attempts are resolved through the store
+        ``tenants(name)`` returns; attempts at questions (or tenants) that no
+        longer exist are skipped."""
+        analytics = cls(**kwargs)
+        stores = {"": store}
+        for question_id, score, missing, key_points, answer_seconds, tenant in attempts:
+            if tenant not in stores:
+                stores[tenant] = tenants(tenant) if tenants is not None else None
+            if stores[tenant] is None:
+                continue
+            try:
+                question = stores[tenant].get(question_id)
+            except KeyError:
+                continue
+            analytics.record(question, score, missing, key_points, answer_seconds, tenant)
+        for key in analytics.questions:
+            analytics._check(key)
+        return analytics
+
+    def record(self, question: Dict[str, Any], score: int, missing: Sequence[str] = (), key_points: int = 0,
+               answer_seconds: Optional[float] = None, tenant: str = ""):
+        with self._lock:
+            for aggregates, key in ((self.questions, (tenant, question["id"])),
+                                    (self.categories, question["category"]),
+                                    (self.difficulties, question["difficulty"])):
+                aggregate = aggregates.get(key)
+                if aggregate is None:
+                    aggregate = aggregates[key] = Aggregate()
+                aggregate.add(score, missing, key_points, answer_seconds)
+            key = (tenant, question["id"])
+            level = self._levels[key] = question["difficulty"]
+            self._by_level.setdefault(level, set()).add(key)
+            # The other questions of the level are measured against a mean
+            # that moves with every attempt: check them all again whenever
+            # the level's attempts double (amortized O(1) per attempt)
+            count = self.difficulties[level].attempts
+            for checked in self._by_level[level] if count & (count - 1) == 0 else (key,):
+                self._check(checked)
+
+    def _check(self, key: Tuple[str, Any]):
+        calibration = self._calibration(key)
+        if calibration is not None and calibration["flagged"]:
+            self._flagged.add(key)
+        else:
+            self._flagged.discard(key)
+
+    @property
+    def attempts(self) -> int:
+        return sum(aggregate.attempts for aggregate in self.difficulties.values())
+
+    def _summary(self, aggregates: Dict[Any, Aggregate], key) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            aggregate = aggregates.get(key)
+            return aggregate.summary() if aggregate is not None else None
+
+    def question(self, question_id, tenant: str = "") -> Optional[Dict[str, Any]]:
+        return self._summary(self.questions, (tenant, question_id))
+
+    def category(self, category: str) -> Optional[Dict[str, Any]]:
+        return self._summary(self.categories, category)
+
+    def difficulty(self, difficulty: str) -> Optional[Dict[str, Any]]:
+        return self._summary(self.difficulties, difficulty)
+
+    def calibration(self, question_id, tenant: str = "") -> Optional[Dict[str, Any]]:
+        """How the question's mean score compares with the other questions
+        of its difficulty level: the gap in points, its z score, and whether
+        both are large enough to call it miscalibrated. None until both
+        sides have enough attempts."""
+        with self._lock:
+            return self._calibration((tenant, question_id))
+
+    def _calibration(self, key: Tuple[str, Any]) -> Optional[Dict[str, Any]]:
+        aggregate = self.questions.get(key)
+        if aggregate is None or aggregate.attempts < self.min_attempts:
+            return None
+        level = self._levels[key]
+        others = self.difficulties[level].scores.without(aggregate.scores)
+        if others.count < self.min_attempts or not others.stddev:
+            return None
+        gap = aggregate.scores.mean - others.mean
+        z = gap / (others.stddev / math.sqrt(aggregate.attempts))
+        return {"question_id": key[1], "tenant": key[0], "difficulty": level,
+                "mean": aggregate.scores.mean, "expected": others.mean, "attempts": aggregate.attempts,
+                "gap": gap, "z": z, "flagged": abs(z) >= self.z and abs(gap) >= self.gap}
+
+    def miscalibrated(self, limit: int = 10, tenant: str = "") -> List[Dict[str, Any]]:
+        """Flagged questions of ``tenant``, furthest from their difficulty
+        level first.
+
+        Questions are checked as they are recorded (and their whole level as
+        its attempts double); the ones flagged then are checked again here
+        against the current level.
+        """
+        flagged = []
+        with self._lock:
+            for key in list(self._flagged):
+                if key[0] != tenant:
+                    continue
+                entry = self._calibration(key)
+                if entry is not None and entry["flagged"]:
+                    flagged.append(entry)
+                else:
+                    self._flagged.discard(key)
+        flagged.sort(key=lambda entry: -abs(entry["gap"]))
+        return flagged[:limit]
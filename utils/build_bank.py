@@ -0,0 +1,381 @@
+import argparse
+import hashlib
+import io
+import json
+import mmap
+import os
+import pickle
+import sys
+import time
+import warnings
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+from utils.question_store import QuestionStore, DEFAULT_QUESTIONS_PATH
+
+DEFAULT_BUILD_DIR = os.path.join(os.path.dirname(DEFAULT_QUESTIONS_PATH), "build")
+MANIFEST = "manifest.json"
+FORMAT_VERSION = 1
+
+# Questions per rubric/vector shard; an edit rewrites only its own shard
+SHARD_SIZE = 2048
+
+TEXT_FIELDS = ("category", "difficulty", "question", "model_answer", "follow_up")
+
+# Artifacts also depend on the code that derives them; a change here makes
+# every previous build stale instead of silently mixing old and new output
+CODE_MODULES = ("question_store.py", "rubric.py", "search.py", "semantic.py")
+
+
+class ValidationError(ValueError):
+    def __init__(self, errors: List[str]):
+        super().__init__(f"{len(errors)} problem(s) in the question bank:\n" + "\n".join(errors))
+        self.errors = errors
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def code_version() -> str:
+    digest = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in CODE_MODULES:
+        with open(os.path.join(directory, name), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+def validate(path: str) -> List[str]:
+    """Every problem in the bank file, as "path:line: message" strings."""
+    errors = []
+    seen: Dict[Any, int] = {}
+    with open(path, "rb") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            where = f"{path}:{line_number}"
+            try:
+                question = json.loads(line)
+            except ValueError as e:
+                errors.append(f"{where}: invalid JSON ({e})")
+                continue
+            if not isinstance(question, dict):
+                errors.append(f"{where}: expected a JSON object")
+                continue
+            question_id = question.get("id")
+            if not isinstance(question_id, (int, str)) or isinstance(question_id, bool):
+                errors.append(f"{where}: missing or invalid id")
+            elif question_id in seen:
+                errors.append(f"{where}: duplicate id {question_id} (first on line {seen[question_id]})")
+            else:
+                seen[question_id] = line_number
+            for field in TEXT_FIELDS:
+                value = question.get(field)
+                if not isinstance(value, str) or not value.strip():
+                    errors.append(f"{where}: question {question_id}: missing {field}")
+            key_points = question.get("key_points")
+            if (not isinstance(key_points, list) or not key_points
+                    or not all(isinstance(k, str) and k.strip() for k in key_points)):
+                errors.append(f"{where}: question {question_id}: key_points must be a non-empty list of strings")
+            if not isinstance(question.get("rubric", {}), dict):
+                errors.append(f"{where}: question {question_id}: rubric must be an object")
+    return errors
+
+
+class BankArtifacts:
+    """A verified build of one question bank.
+
+    Rubrics and vectors are stored in shards of SHARD_SIZE questions and
+    memory-mapped, so processes serving the same bank share one copy.
+    """
+
+    def __init__(self, directory: str, manifest: Dict[str, Any]):
+        self.directory = directory
+        self.manifest = manifest
+        self.version = manifest["version"]
+        self.shard_size = manifest["shard_size"]
+        self._rubric_offsets = np.load(self.path("rubric_offsets"))
+        self._bounds = np.load(self.path("semantic_blocks"))
+        self._rubric_shards: Dict[int, mmap.mmap] = {}
+        self._semantic_shards: Dict[int, np.ndarray] = {}
+
+    def path(self, name: str, shard: Optional[int] = None) -> str:
+        entry = self.manifest["files"][name] if shard is None else self.manifest["shards"][shard][name]
+        return os.path.join(self.directory, entry["file"])
+
+    def store(self, source_path: str) -> QuestionStore:
+        return QuestionStore.from_index(self.path("store"), source_path)
+
+    def search_index(self):
+        from utils.search import SearchIndex
+        return SearchIndex.load(self.path("search"))
+
+    def rubric_bytes(self, position: int) -> bytes:
+        shard = position // self.shard_size
+        blob = self._rubric_shards.get(shard)
+        if blob is None:
+            with open(self.path("rubrics", shard), "rb") as f:
+                blob = self._rubric_shards[shard] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        base = self._rubric_offsets[shard * self.shard_size]
+        return blob[self._rubric_offsets[position] - base:self._rubric_offsets[position + 1] - base]
+
+    def rubric(self, position: int):
+        """The compiled rubric of the question at ``position``."""
+        return pickle.loads(self.rubric_bytes(position))
+
+    def semantic_shard(self, shard: int) -> np.ndarray:
+        matrix = self._semantic_shards.get(shard)
+        if matrix is None:
+            matrix = self._semantic_shards[shard] = np.load(self.path("semantic", shard), mmap_mode="r")
+        return matrix
+
+    def semantic_rows(self, position: int) -> np.ndarray:
+        shard = position // self.shard_size
+        base = self._bounds[shard * self.shard_size]
+        return self.semantic_shard(shard)[self._bounds[position] - base:self._bounds[position + 1] - base]
+
+    def semantic_scorer(self, store: QuestionStore, embedder=None):
+        """Scorer over the prebuilt vectors, or None if they were built with
+        a different embedding provider."""
+        from utils.embeddings import get_embedder
+        from utils.semantic import SemanticScorer
+        embedder = embedder or get_embedder()
+        if self.manifest["embedder"] != embedder.name:
+            return None
+        bounds = self._bounds.tolist()
+        blocks = {}
+        for position, question_id in enumerate(store.ids):
+            shard = position // self.shard_size
+            base = bounds[shard * self.shard_size]
+            blocks[question_id] = (shard, bounds[position] - base, bounds[position + 1] - base)
+        matrices = [self.semantic_shard(shard) for shard in range(len(self.manifest["shards"]))]
+        return SemanticScorer.from_matrices(matrices, blocks, embedder)
+
+
+def _read_manifest(directory: str) -> Optional[Dict[str, Any]]:
+    path = os.path.join(directory, MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != FORMAT_VERSION or manifest.get("code") != code_version():
+        return None
+    return manifest
+
+
+def _verify(directory: str, manifest: Dict[str, Any]):
+    entries = list(manifest["files"].values()) + [entry for shard in manifest["shards"] for entry in shard.values()]
+    for entry in entries:
+        path = os.path.join(directory, entry["file"])
+        if not os.path.exists(path) or file_sha256(path) != entry["sha256"]:
+            raise ValueError(f"bank artifact {entry['file']} is missing or corrupt")
+
+
+def load(source_path: str = DEFAULT_QUESTIONS_PATH, directory: Optional[str] = None,
+         verify: bool = True) -> Optional[BankArtifacts]:
+    """The build of ``source_path`` in ``directory`` (BANK_BUILD_DIR), or None
+    if there is none, or it is stale or damaged; callers then derive
+    everything at runtime."""
+    directory = directory or os.environ.get("BANK_BUILD_DIR", DEFAULT_BUILD_DIR)
+    if not os.path.exists(os.path.join(directory, MANIFEST)):
+        return None
+    problem = None
+    manifest = _read_manifest(directory)
+    if manifest is None:
+        problem = "built by a different version of the code"
+    elif manifest["source"]["sha256"] != file_sha256(source_path):
+        problem = f"built from a different version of {source_path}"
+    elif verify:
+        try:
+            _verify(directory, manifest)
+        except ValueError as e:
+            problem = str(e)
+    if problem:
+        warnings.warn(f"ignoring bank build in {directory}: {problem}; "
+                      f"rebuild with `python -m utils.build_bank`")
+        return None
+    return BankArtifacts(directory, manifest)
+
+
+def _write(directory: str, stem: str, suffix: str, write) -> Dict[str, str]:
+    # Content-addressed file names: a new build never overwrites a file that
+    # a running process may have mapped, and a shard whose content did not
+    # change is already on disk and is not written again
+    buffer = io.BytesIO()
+    write(buffer)
+    data = buffer.getbuffer()
+    digest = hashlib.sha256(data).hexdigest()
+    name = f"{stem}.{digest[:12]}{suffix}"
+    path = os.path.join(directory, name)
+    if not os.path.exists(path):
+        tmp_path = os.path.join(directory, f".{stem}.tmp{suffix}")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    return {"file": name, "sha256": digest}
+
+
+def build(source_path: str = DEFAULT_QUESTIONS_PATH, directory: Optional[str] = None,
+          embedder=None, cache=None) -> Dict[str, Any]:
+    """Validate the bank and write its artifacts: the store index, compiled
+    rubrics, the full-text index and the semantic vectors. Questions whose source line is
+    unchanged since the previous build are copied over, not recomputed."""
+    from utils.embeddings import EmbeddingCache, get_embedder
+    from utils.rubric import CompiledRubric
+    from utils.search import SearchIndex
+    from utils.semantic import question_block
+
+    directory = directory or os.environ.get("BANK_BUILD_DIR", DEFAULT_BUILD_DIR)
+    errors = validate(source_path)
+    if errors:
+        raise ValidationError(errors)
+    started = time.perf_counter()
+    os.makedirs(directory, exist_ok=True)
+    embedder = embedder or get_embedder()
+    store = QuestionStore(source_path)
+
+    previous = None
+    manifest = _read_manifest(directory)
+    if manifest is not None and manifest["embedder"] == embedder.name:
+        try:
+            _verify(directory, manifest)
+            previous = BankArtifacts(directory, manifest)
+            # Only ids and content hashes of the previous store are used
+            previous_store = QuestionStore.from_index(previous.path("store"), source_path)
+        except (ValueError, OSError, KeyError):
+            previous = None
+
+    # Per question: the rubric bytes and either its position in the previous
+    # build or the number of new rows still to embed
+    rubrics: List[bytes] = []
+    sources: List[Any] = []
+    keys: List[str] = []
+    texts: List[str] = []
+    for question_id in store.ids:
+        content_hash = store.content_hash(question_id)
+        if (previous is not None and question_id in previous_store
+                and previous_store.content_hash(question_id) == content_hash):
+            old = previous_store.position(question_id)
+            rubrics.append(previous.rubric_bytes(old))
+            sources.append(("previous", old))
+            continue
+        rubric = CompiledRubric(store.get(question_id))
+        rubrics.append(pickle.dumps(rubric, protocol=pickle.HIGHEST_PROTOCOL))
+        block = question_block(rubric, store.get_model_answer(question_id))
+        version = f"{content_hash}:{rubric.version}"
+        sources.append(("new", len(block)))
+        keys.extend(f"{version}:{i}" for i in range(len(block)))
+        texts.extend(block)
+    if not texts:
+        embedded = np.zeros((0, embedder.dim), np.float32)
+    elif previous is not None:
+        # The previous build already holds every unchanged vector
+        embedded = embedder.encode(texts)
+    else:
+        # A first build reuses whatever the app has embedded so far
+        embedded = (cache or EmbeddingCache(embedder)).encode(keys, texts)
+    rebuilt = sum(1 for kind, _ in sources if kind == "new")
+
+    bounds = np.zeros(len(sources) + 1, dtype=np.int64)
+    for position, (kind, value) in enumerate(sources):
+        rows = value if kind == "new" else len(previous.semantic_rows(value))
+        bounds[position + 1] = bounds[position] + rows
+    rubric_offsets = np.zeros(len(rubrics) + 1, dtype=np.int64)
+    np.cumsum([len(r) for r in rubrics], out=rubric_offsets[1:])
+
+    existing = set(os.listdir(directory))
+    shards = []
+    next_new = 0
+    for first in range(0, len(store), SHARD_SIZE):
+        last = min(first + SHARD_SIZE, len(store))
+        matrix = np.empty((int(bounds[last] - bounds[first]), embedder.dim), dtype=np.float32)
+        for position in range(first, last):
+            kind, value = sources[position]
+            start, end = bounds[position] - bounds[first], bounds[position + 1] - bounds[first]
+            if kind == "new":
+                matrix[start:end] = embedded[next_new:next_new + value]
+                next_new += value
+            else:
+                matrix[start:end] = previous.semantic_rows(value)
+        shards.append({
+            "rubrics": _write(directory, "rubrics", ".bin", lambda f: f.writelines(rubrics[first:last])),
+            "semantic": _write(directory, "semantic", ".npy", lambda f: np.save(f, matrix)),
+        })
+    # Term statistics are bank-wide, so the search index is always rebuilt
+    search_index = SearchIndex.from_store(store)
+    files = {
+        "store": _write(directory, "store", ".pkl", store.save_index),
+        "search": _write(directory, "search", ".npz", search_index.save),
+        "rubric_offsets": _write(directory, "rubric_offsets", ".npy", lambda f: np.save(f, rubric_offsets)),
+        "semantic_blocks": _write(directory, "semantic_blocks", ".npy", lambda f: np.save(f, bounds)),
+    }
+    entries = list(files.values()) + [entry for shard in shards for entry in shard.values()]
+    manifest = {
+        "format": FORMAT_VERSION,
+        "version": hashlib.sha256("".join(entry["sha256"] for entry in entries).encode("ascii")).hexdigest()[:12],
+        "code": code_version(),
+        "built_at": time.time(),
+        "source": {"path": os.path.abspath(source_path), "sha256": file_sha256(source_path),
+                   "questions": len(store)},
+        "embedder": embedder.name,
+        "shard_size": SHARD_SIZE,
+        "files": files,
+        "shards": shards,
+    }
+    tmp_path = os.path.join(directory, f".{MANIFEST}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(directory, MANIFEST))
+
+    # Files of earlier builds stay readable by processes that mapped them
+    current = {entry["file"] for entry in entries} | {MANIFEST}
+    for name in os.listdir(directory):
+        if name not in current and not name.startswith("."):
+            os.remove(os.path.join(directory, name))
+    return {
+        "version": manifest["version"],
+        "questions": len(store),
+        "rebuilt": rebuilt,
+        "reused": len(store) - rebuilt,
+        "files_written": len({entry["file"] for entry in entries} - existing),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m utils.build_bank",
+        description="Validate the question bank and precompute the artifacts the app loads at startup.",
+    )
+    parser.add_argument("--questions", default=os.environ.get("QUESTIONS_PATH", DEFAULT_QUESTIONS_PATH))
+    parser.add_argument("--out", default=None, help="build directory (default: BANK_BUILD_DIR or data/build)")
+    parser.add_argument("--check", action="store_true", help="only validate the bank")
+    args = parser.parse_args(argv)
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    if args.check:
+        errors = validate(args.questions)
+        for error in errors:
+            print(error, file=sys.stderr)
+        return 1 if errors else 0
+    try:
+        stats = build(args.questions, args.out)
+    except ValidationError as e:
+        for error in e.errors:
+            print(error, file=sys.stderr)
+        return 1
+    print(f"built {stats['version']}: {stats['questions']} questions "
+          f"({stats['rebuilt']} rebuilt, {stats['reused']} reused, {stats['files_written']} files written) "
+          f"in {stats['seconds']}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
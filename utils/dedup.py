@@ -0,0 +1,155 @@
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Callable, Dict, Any, Hashable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from utils.eval_cache import normalize_answer
+
+# MinHash over word 3-shingles, banded for LSH: 16 bands of 8 rows put the
+# 50% candidate point near a Jaccard similarity of 0.7, and candidates are
+# then checked against THRESHOLD on the full signature
+NUM_PERM = 128
+BANDS = 16
+SHINGLE_WORDS = 3
+THRESHOLD = 0.8
+
+_PRIME = (1 << 61) - 1
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+
+
+def _permutations(num_perm: int, seed: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+    # a * h + b stays below 2**64 for 32-bit shingle hashes
+    rng = np.random.default_rng(seed)
+    return (rng.integers(1, 1 << 32, num_perm, dtype=np.uint64),
+            rng.integers(0, 1 << 32, num_perm, dtype=np.uint64))
+
+
+def shingles(text: str) -> List[int]:
+    words = normalize_answer(text).split()
+    if len(words) < SHINGLE_WORDS:
+        return [zlib.crc32(" ".join(words).encode("utf-8"))] if words else []
+    return list({zlib.crc32(" ".join(words[i:i + SHINGLE_WORDS]).encode("utf-8"))
+                 for i in range(len(words) - SHINGLE_WORDS + 1)})
+
+
+class Match(NamedTuple):
+    key: Hashable
+    similarity: float
+    payload: Dict[str, Any]
+
+
+class DuplicateIndex:
+    """Near-duplicate lookup over model answers and submitted answers.
+
+    Each text is reduced to a MinHash signature of NUM_PERM 32-bit values
+    and filed under BANDS bucket keys, all scoped (e.g. per question), so a
+    lookup hashes the answer once and only compares signatures that share a
+    bucket. Submissions are kept in LRU order, up to ``max_entries``; model
+    answers are added on first use of their scope and never evicted.
+    """
+
+    def __init__(self, threshold: float = THRESHOLD, max_entries: int = 50000,
+                 num_perm: int = NUM_PERM, bands: int = BANDS):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.bands = bands
+        self._rows = num_perm // bands
+        self._a, self._b = _permutations(num_perm)
+        self._buckets: Dict[Tuple[Hashable, int, bytes], List[Hashable]] = {}
+        self._entries: Dict[Hashable, Tuple[Hashable, np.ndarray, Dict[str, Any]]] = {}
+        # Submission keys, least recently matched first; model answers stay
+        self._recent: "OrderedDict[Hashable, None]" = OrderedDict()
+        self._seeded: set = set()
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def submissions(self) -> int:
+        return len(self._recent)
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """MinHash signature of ``text``, or None if it has no words."""
+        hashes = shingles(text)
+        if not hashes:
+            return None
+        values = (np.array(hashes, dtype=np.uint64)[:, None] * self._a + self._b) % _PRIME
+        return (values & _MAX_HASH).min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, scope: Hashable, signature: np.ndarray):
+        data = signature.tobytes()
+        width = self._rows * 4
+        return [(scope, band, data[band * width:(band + 1) * width]) for band in range(self.bands)]
+
+    def add(self, scope: Hashable, text: str, payload: Dict[str, Any],
+            signature: Optional[np.ndarray] = None) -> Optional[int]:
+        """File a submitted ``text`` under ``scope``; returns its key (None
+        if it has no words)."""
+        if signature is None:
+            signature = self.signature(text)
+        if signature is None:
+            return None
+        with self._lock:
+            key = self._next_id
+            self._next_id += 1
+            self._insert(key, scope, signature, payload)
+            self._recent[key] = None
+            while len(self._recent) > self.max_entries:
+                self._remove(self._recent.popitem(last=False)[0])
+        return key
+
+    def _insert(self, key: Hashable, scope: Hashable, signature: np.ndarray, payload: Dict[str, Any]):
+        self._entries[key] = (scope, signature, payload)
+        for band_key in self._band_keys(scope, signature):
+            self._buckets.setdefault(band_key, []).append(key)
+
+    def _remove(self, key: Hashable):
+        scope, signature, _ = self._entries.pop(key)
+        for band_key in self._band_keys(scope, signature):
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.remove(key)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def seed(self, scope: Hashable, model_answer: Callable[[], str]):
+        """Add the model answer of ``scope`` the first time the scope is seen."""
+        if scope in self._seeded:
+            return
+        signature = self.signature(model_answer())
+        with self._lock:
+            if scope in self._seeded:
+                return
+            self._seeded.add(scope)
+            if signature is not None:
+                self._insert(("model_answer", scope), scope, signature, {"kind": "model_answer"})
+
+    def find(self, scope: Hashable, text: str,
+             signature: Optional[np.ndarray] = None) -> Optional[Match]:
+        """Most similar entry in ``scope`` at or above the threshold; a copy
+        of the model answer wins ties."""
+        if signature is None:
+            signature = self.signature(text)
+        if signature is None:
+            return None
+        with self._lock:
+            candidates = dict.fromkeys(key for band_key in self._band_keys(scope, signature)
+                                       for key in self._buckets.get(band_key, ()))
+            best = None
+            for key in candidates:
+                _, other, payload = self._entries[key]
+                similarity = float(np.count_nonzero(other == signature)) / len(signature)
+                rank = (similarity, payload.get("kind") == "model_answer")
+                if similarity >= self.threshold and (best is None or rank > best[0]):
+                    best = (rank, Match(key, similarity, payload))
+            if best is None:
+                return None
+            if best[1].key in self._recent:
+                self._recent.move_to_end(best[1].key)
+            return best[1]
@@ -0,0 +1,174 @@
+import os
+import threading
+import zlib
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+DEFAULT_DIM = 256
+DEFAULT_CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "embedding_cache"
+)
+
+# Multiplier for the rolling n-gram hash (odd, so it is invertible mod 2**32)
+_HASH_BASE = np.uint32(0x01000193)
+
+
+class EmbeddingProvider:
+    """Turns a batch of texts into an (n, dim) float32 matrix of unit vectors."""
+
+    name = "base"
+    dim = DEFAULT_DIM
+
+    def encode(self, texts: Sequence[str], batch_size: int = 1024) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.concatenate([
+            self._encode_batch(list(texts[start:start + batch_size]))
+            for start in range(0, len(texts), batch_size)
+        ])
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        raise NotImplementedError
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
+
+
+class HashingEmbedder(EmbeddingProvider):
+    """Offline embedder: hashed character n-grams with sublinear TF and
+    optional IDF weights.
+
+    A whole batch is concatenated into one byte array and every n-gram hash
+    is computed with vectorised uint32 arithmetic, so there is no per-token
+    Python work.
+    """
+
+    def __init__(self, dim: int = DEFAULT_DIM, ngram_sizes: Sequence[int] = (3, 4, 5)):
+        self.dim = dim
+        self.ngram_sizes = tuple(ngram_sizes)
+        self.idf = np.ones(dim, dtype=np.float32)
+        self.name = f"hashing-{dim}-{'-'.join(map(str, self.ngram_sizes))}"
+
+    def _counts(self, texts: List[str]) -> np.ndarray:
+        # Lower-case, map every non-alphanumeric byte to a single space and
+        # pad each text with spaces so word edges become n-gram features
+        encoded = [f" {text.lower()} ".encode("utf-8") for text in texts]
+        data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        is_alnum = ((data >= 48) & (data <= 57)) | ((data >= 97) & (data <= 122)) | (data >= 128)
+        data = np.where(is_alnum, data, 32).astype(np.uint32)
+        lengths = np.fromiter((len(e) for e in encoded), dtype=np.int64, count=len(encoded))
+        rows = np.repeat(np.arange(len(texts), dtype=np.int64), lengths)
+
+        counts = np.zeros(len(texts) * self.dim, dtype=np.float32)
+        for n in self.ngram_sizes:
+            if len(data) < n:
+                continue
+            span = len(data) - n + 1
+            h = np.zeros(span, dtype=np.uint32)
+            for offset in range(n):
+                h = h * _HASH_BASE + data[offset:offset + span] + np.uint32(offset + 1)
+            h ^= h >> np.uint32(15)
+            h *= np.uint32(0x2C1B3C6D)
+            h ^= h >> np.uint32(12)
+            # Drop n-grams that straddle two texts or are pure whitespace
+            valid = rows[:span] == rows[n - 1:n - 1 + span]
+            blank = np.ones(span, dtype=bool)
+            for offset in range(n):
+                blank &= data[offset:offset + span] == 32
+            valid &= ~blank
+            h = h[valid]
+            sign = np.where(h & np.uint32(0x80000000), 1.0, -1.0).astype(np.float32)
+            index = rows[:span][valid] * self.dim + (h % np.uint32(self.dim)).astype(np.int64)
+            counts += np.bincount(index, weights=sign, minlength=len(counts)).astype(np.float32)
+        return counts.reshape(len(texts), self.dim)
+
+    def fit(self, corpus: Sequence[str]) -> "HashingEmbedder":
+        """Learn IDF weights for the hash buckets from a reference corpus."""
+        df = np.zeros(self.dim, dtype=np.float64)
+        for start in range(0, len(corpus), 1024):
+            df += (self._counts(list(corpus[start:start + 1024])) != 0).sum(axis=0)
+        self.idf = np.log((1 + len(corpus)) / (1 + df)).astype(np.float32) + 1.0
+        # Fitted weights change every vector, so they are part of the identity
+        # used by on-disk caches
+        self.name = f"{self.name.split('-idf')[0]}-idf{zlib.crc32(self.idf.tobytes()):08x}"
+        return self
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        counts = self._counts(texts)
+        tf = np.sign(counts) * np.log1p(np.abs(counts))
+        return _normalize(tf * self.idf)
+
+
+class OpenAIEmbedder(EmbeddingProvider):
+    """Embeddings API backend; one request per batch rather than per text."""
+
+    def __init__(self, model: str = "text-embedding-3-small", dim: int = 512, client=None):
+        self.model = model
+        self.dim = dim
+        self.name = f"openai-{model}-{dim}"
+        self._client = client
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        if self._client is None:
+            from openai import OpenAI
+            self._client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+        response = self._client.embeddings.create(model=self.model, input=texts, dimensions=self.dim)
+        return _normalize(np.array([item.embedding for item in response.data], dtype=np.float32))
+
+
+class EmbeddingCache:
+    """On-disk cache of embeddings keyed by caller-supplied content keys."""
+
+    def __init__(self, provider: EmbeddingProvider, cache_dir: str = DEFAULT_CACHE_DIR):
+        self.provider = provider
+        self.path = os.path.join(cache_dir, f"{provider.name}.npz")
+        self._lock = threading.Lock()
+        self._rows: Dict[str, int] = {}
+        self._matrix = np.zeros((0, provider.dim), dtype=np.float32)
+        if os.path.exists(self.path):
+            saved = np.load(self.path)
+            self._matrix = saved["matrix"]
+            self._rows = {key: row for row, key in enumerate(saved["keys"].tolist())}
+
+    def encode(self, keys: Sequence[str], texts: Sequence[str]) -> np.ndarray:
+        with self._lock:
+            missing = [i for i, key in enumerate(keys) if key not in self._rows]
+            if missing:
+                vectors = self.provider.encode([texts[i] for i in missing])
+                start = len(self._matrix)
+                self._matrix = np.concatenate([self._matrix, vectors])
+                for offset, i in enumerate(missing):
+                    self._rows[keys[i]] = start + offset
+                self._save()
+            return self._matrix[[self._rows[key] for key in keys]]
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        keys = sorted(self._rows, key=self._rows.get)
+        tmp_path = self.path + ".tmp.npz"
+        np.savez(tmp_path, matrix=self._matrix, keys=np.array(keys))
+        os.replace(tmp_path, self.path)
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def get_embedder() -> EmbeddingProvider:
+    """Process-wide embedding provider selected by EMBEDDING_PROVIDER."""
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            kind = os.environ.get("EMBEDDING_PROVIDER", "hashing")
+            dim = int(os.environ.get("EMBEDDING_DIM", str(DEFAULT_DIM)))
+            if kind == "openai":
+                _provider = OpenAIEmbedder(
+                    model=os.environ.get("EMBEDDING_MODEL", "text-embedding-3-small"), dim=dim
+                )
+            else:
+                _provider = HashingEmbedder(dim=dim)
+    return _provider
@@ -0,0 +1,122 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_TRAILING_PUNCT_RE = re.compile(r"[\s.!?;,]+$")
+
+
+def normalize_answer(answer: str) -> str:
+    # Case, whitespace and trailing punctuation differences should not cause
+    # a second evaluation of the same answer
+    answer = _WHITESPACE_RE.sub(" ", answer.strip().lower())
+    return _TRAILING_PUNCT_RE.sub("", answer)
+
+
+def cache_key(question_id, answer: str, model: str, version: str) -> str:
+    """Content address for an evaluation.
+
+    ``version`` should change whenever anything that affects grading
+    changes (model answer, rubric), which invalidates old entries.
+    """
+    payload = json.dumps([question_id, version, model, normalize_answer(answer)])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class EvaluationCache:
+    """In-process LRU of evaluation results with an optional SQLite tier."""
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600.0,
+                 db_path: Optional[str] = None, max_disk_entries: int = 100000):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_writes = 0
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS eval_cache "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires_at FROM eval_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and row[1] > now:
+                    value = json.loads(row[0])
+                    self._remember(key, row[1], value)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return value
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: Dict[str, Any]):
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, expires_at, value)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO eval_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), expires_at),
+                )
+                self._db_writes += 1
+                if self._db_writes % 100 == 0:
+                    self._prune_disk()
+                self._db.commit()
+
+    def _remember(self, key: str, expires_at: float, value: Dict[str, Any]):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _prune_disk(self):
+        self._db.execute("DELETE FROM eval_cache WHERE expires_at <= ?", (time.time(),))
+        self._db.execute(
+            "DELETE FROM eval_cache WHERE key IN (SELECT key FROM eval_cache "
+            "ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,),
+        )
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM eval_cache")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "size": len(self._entries),
+            }
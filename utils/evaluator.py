@@ -1,20 +1,283 @@
-import os 
-from openai import OpenAI 
-from typing import Dict, Any 
-import json 
- 
-class AnswerEvaluator: 
-    def __init__(self): 
-        self.client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY", "dummy-key")) 
-        self.model = "gpt-3.5-turbo" 
- 
-    def evaluate_answer(self, question: str, model_answer: str, user_answer: str, 
-                       category: str, difficulty: str) -> Dict[str, Any]: 
-        # Simple return for testing 
-        return { 
-            "score": "8/10", 
-            "strengths": ["Good answer"], 
-            "technical_accuracy": "Accurate", 
-            "missing_points": ["None"], 
-            "improved_answer": "Good as is" 
-        } 
+import os
+import asyncio
+import json
+import queue
+import re
+import time
+from typing import Dict, Any, List, Optional, AsyncIterator, Iterator
+
+from utils import metrics
+from utils.rubric import feedback_title
+from utils.eval_cache import EvaluationCache, cache_key
+from utils.llm_client import RequestScheduler, get_client, get_event_loop, get_scheduler
+
+RESULT_MARKER = "### RESULT"
+
+SYSTEM_PROMPT = (
+    "You are an electronics engineering interview coach. Give the candidate "
+    "short, constructive feedback in markdown, then finish with a line "
+    f"containing only '{RESULT_MARKER}' followed by a JSON object."
+)
+
+PROMPT_TEMPLATE = """QUESTION: {question}
+CATEGORY: {category}
+DIFFICULTY: {difficulty}
+
+MODEL ANSWER (for reference): {model_answer}
+
+USER'S ANSWER: {user_answer}
+
+Write 3-6 sentences of feedback addressed to the candidate. Then output a line
+with only {marker} and a JSON object with the keys:
+"score" (integer 1-10), "strengths" (list of strings),
+"missing_points" (list of strings), "technical_accuracy" (string).
+"""
+
+_DONE = object()
+
+
+def _default_cache() -> EvaluationCache:
+    return EvaluationCache(
+        max_entries=int(os.environ.get("EVAL_CACHE_SIZE", "1024")),
+        ttl=float(os.environ.get("EVAL_CACHE_TTL", "3600")),
+        db_path=os.environ.get("EVAL_CACHE_DB") or None,
+    )
+
+
+def parse_score(value) -> Optional[int]:
+    if isinstance(value, (int, float)):
+        return max(1, min(10, int(round(value))))
+    match = re.search(r"\d+", str(value or ""))
+    if match:
+        return max(1, min(10, int(match.group())))
+    return None
+
+
+class FeedbackStream:
+    """Iterator over the candidate-facing feedback text as it is generated.
+
+    Iterating drives the LLM call on the shared event loop; once exhausted,
+    ``result`` holds the parsed evaluation (or the fallback result if the
+    call failed or timed out).
+    """
+
+    def __init__(self, evaluator: "AnswerEvaluator", prompt: str, fallback: Dict[str, Any],
+                 key: Optional[str] = None):
+        self.evaluator = evaluator
+        self.prompt = prompt
+        self.fallback = fallback
+        self.key = key
+        self.result: Optional[Dict[str, Any]] = None
+        self.first_token_latency: Optional[float] = None
+        self._started = False
+        self._chunks: Optional["queue.Queue"] = None
+        self._future = None
+        self._started_at = 0.0
+
+    def start(self) -> "FeedbackStream":
+        """Begin the LLM call without consuming it; tokens are buffered until
+        the stream is iterated. Called again (or by iterating) it is a no-op."""
+        if self._started:
+            return self
+        self._started = True
+        if self.evaluator.client is None:
+            self.result = self.evaluator.fallback_result(self.fallback, "AI feedback is not configured")
+            return self
+        if self.key is not None:
+            cached = self.evaluator.cache.get(self.key)
+            metrics.inc("eval_cache_requests_total", result="miss" if cached is None else "hit")
+            if cached is not None:
+                self.result = dict(cached, cached=True)
+                return self
+        self._chunks = queue.Queue()
+        self._future = asyncio.run_coroutine_threadsafe(
+            self.evaluator._pump(self.prompt, self._chunks.put), get_event_loop()
+        )
+        self._started_at = time.monotonic()
+        return self
+
+    def cancel(self):
+        """Abandon the LLM call, e.g. because the answer changed."""
+        if self._future is not None:
+            self._future.cancel()
+
+    def __iter__(self) -> Iterator[str]:
+        self.start()
+        if self._future is None:
+            return
+        chunks = self._chunks
+        future = self._future
+        started = self._started_at
+        deadline = started + self.evaluator.timeout
+        wait = self.evaluator.first_token_timeout
+        text = []
+        shown = 0
+        error = None
+        while True:
+            remaining = min(wait, deadline - time.monotonic())
+            try:
+                item = chunks.get(timeout=max(0.0, remaining))
+            except queue.Empty:
+                error = "AI feedback timed out"
+                break
+            if item is _DONE:
+                break
+            if isinstance(item, BaseException):
+                error = f"AI feedback failed ({type(item).__name__})"
+                break
+            if self.first_token_latency is None:
+                self.first_token_latency = time.monotonic() - started
+                metrics.observe("llm_first_token_seconds", self.first_token_latency)
+                wait = self.evaluator.timeout
+            text.append(item)
+            # Only stream the prose; hold back enough characters that a
+            # marker split across chunks is never shown
+            full = "".join(text)
+            visible_end = full.find(RESULT_MARKER)
+            if visible_end < 0:
+                visible_end = max(shown, len(full) - len(RESULT_MARKER))
+            if visible_end > shown:
+                yield full[shown:visible_end]
+                shown = visible_end
+        future.cancel()
+
+        if error:
+            metrics.observe("llm_feedback_seconds", time.monotonic() - started,
+                            outcome="timeout" if "timed out" in error else "error")
+            self.result = self.evaluator.fallback_result(self.fallback, error)
+            return
+        full = "".join(text)
+        if RESULT_MARKER not in full and len(full) > shown:
+            yield full[shown:]
+        self.result = self.evaluator.parse_response(full, self.fallback)
+        metrics.observe("llm_feedback_seconds", time.monotonic() - started,
+                        outcome="ok" if self.result["source"] == "llm" else "unparsed")
+        if self.key is not None and self.result["source"] == "llm":
+            self.evaluator.cache.put(self.key, self.result)
+
+
+class AnswerEvaluator:
+    def __init__(self, client=None, model: Optional[str] = None,
+                 timeout: Optional[float] = None, first_token_timeout: Optional[float] = None,
+                 cache: Optional[EvaluationCache] = None):
+        # client: any object exposing an async ``chat.completions.create``
+        # (AsyncOpenAI or a local fake). By default every evaluator shares the
+        # process-wide pooled client and scheduler; None disables the LLM path
+        if client is None:
+            self.client = get_client()
+            self.scheduler = get_scheduler()
+        else:
+            self.client = client
+            self.scheduler = RequestScheduler(client)
+        self.cache = cache if cache is not None else _default_cache()
+        self.model = model or os.environ.get("OPENAI_MODEL", "gpt-3.5-turbo")
+        self.timeout = timeout or float(os.environ.get("EVALUATION_TIMEOUT", "20"))
+        self.first_token_timeout = first_token_timeout or float(
+            os.environ.get("EVALUATION_FIRST_TOKEN_TIMEOUT", "5")
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.client is not None
+
+    def build_prompt(self, question: str, model_answer: str, user_answer: str,
+                     category: str, difficulty: str) -> str:
+        return PROMPT_TEMPLATE.format(
+            question=question, model_answer=model_answer, user_answer=user_answer,
+            category=category, difficulty=difficulty, marker=RESULT_MARKER,
+        )
+
+    async def _pump(self, prompt: str, push):
+        try:
+            async for token in self.stream_tokens(prompt):
+                push(token)
+            push(_DONE)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            push(e)
+
+    @staticmethod
+    def _messages(prompt: str) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt},
+        ]
+
+    async def stream_tokens(self, prompt: str) -> AsyncIterator[str]:
+        async for token in self.scheduler.stream_chat(self._messages(prompt), self.model, temperature=0.3):
+            yield token
+
+    def parse_response(self, content: str, fallback: Dict[str, Any]) -> Dict[str, Any]:
+        commentary, _, payload = content.partition(RESULT_MARKER)
+        try:
+            start = payload.find("{")
+            end = payload.rfind("}") + 1
+            feedback_json = json.loads(payload[start:end])
+        except ValueError:
+            result = self.fallback_result(fallback, "AI feedback could not be parsed")
+            result["commentary"] = commentary.strip()
+            return result
+
+        score = parse_score(feedback_json.get("score"))
+        if score is None:
+            score = fallback["score"]
+        result = dict(fallback)
+        result.update({
+            "score": score,
+            "title": feedback_title(score),
+            "strengths": list(feedback_json.get("strengths") or fallback["strengths"]),
+            "improvements": list(feedback_json.get("missing_points") or fallback["improvements"]),
+            "technical_accuracy": feedback_json.get("technical_accuracy", ""),
+            "commentary": commentary.strip(),
+            "source": "llm",
+        })
+        return result
+
+    @staticmethod
+    def fallback_result(fallback: Dict[str, Any], reason: str) -> Dict[str, Any]:
+        result = dict(fallback)
+        result["source"] = "heuristic"
+        result["notice"] = f"{reason}; showing rubric-based feedback instead."
+        return result
+
+    def cache_key(self, question_id, user_answer: str, version: str) -> Optional[str]:
+        if question_id is None:
+            return None
+        return cache_key(question_id, user_answer, self.model, version)
+
+    def stream_feedback(self, question: str, model_answer: str, user_answer: str,
+                        category: str, difficulty: str, fallback: Dict[str, Any],
+                        question_id=None, version: str = "") -> FeedbackStream:
+        prompt = self.build_prompt(question, model_answer, user_answer, category, difficulty)
+        key = self.cache_key(question_id, user_answer, version)
+        return FeedbackStream(self, prompt, fallback, key)
+
+    def submit_batch(self, prompts: Dict[str, str]):
+        """Send prompts keyed by custom id through the Batch API, for
+        feedback nobody is waiting on (see utils.regrade); returns the batch."""
+        if self.client is None:
+            raise RuntimeError("AI feedback is not configured (no OPENAI_API_KEY)")
+        requests = [{"custom_id": custom_id, "messages": self._messages(prompt)}
+                    for custom_id, prompt in prompts.items()]
+        return self._run(self.scheduler.submit_batch(requests, self.model))
+
+    def batch_results(self, batch_id: str) -> Optional[Dict[str, Optional[str]]]:
+        """Response text by custom id, or None while the batch is running."""
+        if self.client is None:
+            raise RuntimeError("AI feedback is not configured (no OPENAI_API_KEY)")
+        return self._run(self.scheduler.batch_results(batch_id))
+
+    @staticmethod
+    def _run(coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, get_event_loop()).result()
+
+    def evaluate_answer(self, question: str, model_answer: str, user_answer: str,
+                        category: str, difficulty: str,
+                        fallback: Dict[str, Any], question_id=None,
+                        version: str = "") -> Dict[str, Any]:
+        stream = self.stream_feedback(question, model_answer, user_answer, category, difficulty,
+                                      fallback, question_id=question_id, version=version)
+        for _ in stream:
+            pass
+        return stream.result
@@ -0,0 +1,226 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from typing import Dict, Any, IO, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from utils import metrics
+from utils.question_store import QuestionStore, DEFAULT_QUESTIONS_PATH
+from utils.rubric import CompiledRubric, LazyRubrics
+
+# Input lines sent to a worker per task; large enough that pickling and
+# batched embedding amortise well, small enough to keep all cores busy
+DEFAULT_CHUNK_SIZE = 512
+
+
+class Grader:
+    """Scores answers against a question bank exactly as the app does before
+    any LLM feedback: rubric coverage plus semantic similarity."""
+
+    def __init__(self, questions: QuestionStore, rubrics: Optional[Mapping[Any, CompiledRubric]] = None,
+                 semantic_scorer=None, semantic: bool = True):
+        self.questions = questions
+        self.rubrics = rubrics if rubrics is not None else LazyRubrics(questions)
+        if semantic and semantic_scorer is None:
+            from utils.semantic import SemanticScorer
+            semantic_scorer = SemanticScorer(questions, self.rubrics)
+        self.semantic_scorer = semantic_scorer if semantic else None
+
+    @classmethod
+    def from_path(cls, path: str = DEFAULT_QUESTIONS_PATH, semantic: bool = True,
+                  tenant: Optional[str] = None) -> "Grader":
+        from utils.build_bank import load
+        artifacts = load(path)
+        store = artifacts.store(path) if artifacts else QuestionStore(path)
+        rubrics = LazyRubrics(store, compiled=artifacts.rubric if artifacts else None)
+        scorer = None
+        if semantic:
+            from utils.semantic import SemanticScorer
+            scorer = (artifacts.semantic_scorer(store) if artifacts else None) or SemanticScorer(store, rubrics)
+        if not tenant:
+            return cls(store, rubrics, scorer, semantic=semantic)
+        from utils.tenant_store import Tenant, tenant_path
+        overlay = tenant_path(tenant)
+        if overlay is None:
+            raise ValueError(f"unknown tenant {tenant!r}")
+        return Tenant(tenant, store, rubrics, scorer, overlay).grader
+
+    def resolve(self, question_id):
+        # JSONL producers do not always agree on "3" vs 3
+        if question_id in self.rubrics:
+            return question_id
+        try:
+            if int(question_id) in self.rubrics:
+                return int(question_id)
+        except (TypeError, ValueError):
+            pass
+        raise KeyError(f"unknown question_id {question_id!r}")
+
+    def grade(self, question_id, answer: str) -> Dict[str, Any]:
+        return self.grade_many([(question_id, answer)])[0]
+
+    def grade_many(self, pairs: Sequence[Tuple[Any, str]]) -> List[Dict[str, Any]]:
+        """Grade (question_id, answer) pairs; unknown questions raise
+        KeyError and answers that are not strings (or None) TypeError."""
+        question_ids = [self.resolve(question_id) for question_id, _ in pairs]
+        answers = [_check_answer(answer) if answer is not None else "" for _, answer in pairs]
+        if self.semantic_scorer is not None:
+            with metrics.span("grade_seconds", stage="semantic"):
+                semantic = self.semantic_scorer.similarity_many(question_ids, answers)
+        else:
+            semantic = [None] * len(pairs)
+        with metrics.span("grade_seconds", stage="rubric"):
+            return [
+                self.rubrics[question_id].score(answer, semantic=similarity)
+                for question_id, answer, similarity in zip(question_ids, answers, semantic)
+            ]
+
+
+def _check_answer(answer) -> str:
+    if not isinstance(answer, str):
+        raise TypeError(f"answer must be a string, not {type(answer).__name__}")
+    return answer
+
+
+_default_grader: Optional[Grader] = None
+
+
+def get_grader() -> Grader:
+    global _default_grader
+    if _default_grader is None:
+        _default_grader = Grader.from_path(os.environ.get("QUESTIONS_PATH", DEFAULT_QUESTIONS_PATH))
+    return _default_grader
+
+
+def grade(question_id, answer: str, grader: Optional[Grader] = None) -> Dict[str, Any]:
+    """Grade a single answer with the default (QUESTIONS_PATH) bank."""
+    return (grader or get_grader()).grade(question_id, answer)
+
+
+# Set in the parent before the pool starts so forked workers inherit the
+# loaded bank and vectors instead of rebuilding them
+_worker_grader: Optional[Grader] = None
+
+
+def _init_worker(questions_path: str, semantic: bool, tenant: Optional[str]):
+    global _worker_grader
+    if _worker_grader is None:
+        _worker_grader = Grader.from_path(questions_path, semantic=semantic, tenant=tenant)
+
+
+def _grade_lines(lines: List[str]) -> Tuple[List[str], int]:
+    # Parse, grade and serialise in the worker so the parent only moves bytes
+    records: List[Optional[Dict[str, Any]]] = []
+    output: List[Optional[str]] = []
+    pairs = []
+    for line in lines:
+        try:
+            record = json.loads(line)
+            _worker_grader.resolve(record["question_id"])
+            pairs.append((record["question_id"], _check_answer(record["answer"])))
+            records.append(record)
+            output.append(None)
+        except (ValueError, KeyError, TypeError) as e:
+            records.append(None)
+            output.append(json.dumps({"error": f"{type(e).__name__}: {e}", "input": line.rstrip("\n")}))
+    errors = len(lines) - len(pairs)
+    results = iter(_worker_grader.grade_many(pairs))
+    for i, record in enumerate(records):
+        if record is None:
+            continue
+        result = next(results)
+        passthrough = {key: value for key, value in record.items() if key != "answer"}
+        output[i] = json.dumps(dict(passthrough, **result), ensure_ascii=False)
+    return output, errors
+
+
+def _chunks(lines: Iterable[str], size: int) -> Iterator[List[str]]:
+    chunk = []
+    for line in lines:
+        if not line.strip():
+            continue
+        chunk.append(line)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def grade_stream(lines: Iterable[str], out: IO[str], questions_path: str = DEFAULT_QUESTIONS_PATH,
+                 workers: Optional[int] = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 semantic: bool = True, tenant: Optional[str] = None) -> Dict[str, Any]:
+    """Grade JSONL answer records from ``lines`` and write JSONL results to
+    ``out`` in input order as soon as each chunk is done.
+
+    Each input record needs ``question_id`` and a string ``answer``; every
+    other field is copied to the output. Records that are unparseable, name
+    an unknown question or lack a string answer produce ``{"error": ...}``
+    and the rest are still graded.
+    """
+    global _worker_grader
+    started = time.monotonic()
+    workers = workers or os.cpu_count() or 1
+    # Loading the bank here also fills the on-disk embedding cache once, so
+    # workers that cannot fork from this process start from a warm cache
+    _worker_grader = Grader.from_path(questions_path, semantic=semantic, tenant=tenant)
+    graded = 0
+    errors = 0
+
+    def write(chunk: Tuple[List[str], int]):
+        nonlocal graded, errors
+        results, chunk_errors = chunk
+        out.write("".join(line + "\n" for line in results))
+        graded += len(results) - chunk_errors
+        errors += chunk_errors
+
+    try:
+        if workers == 1:
+            for chunk in _chunks(lines, chunk_size):
+                write(_grade_lines(chunk))
+        else:
+            with multiprocessing.Pool(workers, initializer=_init_worker,
+                                      initargs=(questions_path, semantic, tenant)) as pool:
+                for chunk in pool.imap(_grade_lines, _chunks(lines, chunk_size)):
+                    write(chunk)
+    finally:
+        _worker_grader = None
+    out.flush()
+    return {"graded": graded, "errors": errors, "seconds": round(time.monotonic() - started, 3)}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m utils.grading",
+        description="Grade a JSONL file of {question_id, answer} records.",
+    )
+    parser.add_argument("input", help="answers JSONL file ('-' for stdin)")
+    parser.add_argument("-o", "--output", default="-", help="results JSONL file (default: stdout)")
+    parser.add_argument("--questions", default=os.environ.get("QUESTIONS_PATH", DEFAULT_QUESTIONS_PATH),
+                        help="question bank JSONL")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--tenant", default=None, help="grade against this tenant's overlay bank")
+    parser.add_argument("--no-semantic", action="store_true", help="rubric keywords only, no embeddings")
+    args = parser.parse_args(argv)
+
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    target = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        stats = grade_stream(source, target, questions_path=args.questions, workers=args.workers,
+                             chunk_size=args.chunk_size, semantic=not args.no_semantic,
+                             tenant=args.tenant)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if target is not sys.stdout:
+            target.close()
+    print(f"graded {stats['graded']} answers ({stats['errors']} errors) in {stats['seconds']}s",
+          file=sys.stderr)
+    return 1 if stats["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
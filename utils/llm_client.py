@@ -0,0 +1,336 @@
+import asyncio
+import hashlib
+import inspect
+import json
+import os
+import threading
+import time
+from typing import Dict, Any, List, Optional, AsyncIterator
+
+from utils import metrics
+
+# Batch API states before results can be read
+BATCH_RUNNING = ("validating", "in_progress", "finalizing", "cancelling")
+
+_loop = None
+_client = None
+_scheduler = None
+_lock = threading.Lock()
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """Process-wide event loop running on a daemon thread.
+
+    LLM calls are scheduled here so the Streamlit script thread only ever
+    waits on a queue with a timeout and is never blocked by a slow upstream.
+    """
+    global _loop
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="llm-loop", daemon=True).start()
+    return _loop
+
+
+def get_client():
+    """Shared AsyncOpenAI client (one connection pool per process), or None
+    when no API key is configured."""
+    global _client
+    with _lock:
+        if _client is None:
+            api_key = os.environ.get("OPENAI_API_KEY", "")
+            if not api_key or api_key in ("dummy-key", "your_api_key_here"):
+                return None
+            from openai import AsyncOpenAI
+            _client = AsyncOpenAI(api_key=api_key, max_retries=0)
+    return _client
+
+
+def get_scheduler() -> Optional["RequestScheduler"]:
+    global _scheduler
+    client = get_client()
+    if client is None:
+        return None
+    with _lock:
+        if _scheduler is None:
+            _scheduler = RequestScheduler(
+                client,
+                max_concurrency=int(os.environ.get("LLM_MAX_CONCURRENCY", "16")),
+                requests_per_minute=float(os.environ.get("LLM_REQUESTS_PER_MINUTE", "500")),
+            )
+    return _scheduler
+
+
+def _parse_reset(value: str) -> float:
+    # OpenAI reset headers look like "1s", "6m0s" or "250ms"
+    seconds = 0.0
+    number = ""
+    i = 0
+    while i < len(value):
+        ch = value[i]
+        if ch.isdigit() or ch == ".":
+            number += ch
+        elif value.startswith("ms", i):
+            seconds += float(number or 0) / 1000
+            number = ""
+            i += 1
+        elif ch in "hms":
+            seconds += float(number or 0) * {"h": 3600, "m": 60, "s": 1}[ch]
+            number = ""
+        i += 1
+    if number:
+        seconds += float(number)
+    return seconds
+
+
+class _Broadcast:
+    # Tokens from one upstream stream, replayed to every coalesced caller
+    def __init__(self):
+        self.tokens: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Condition()
+        self.subscribers = 0
+        self.task: Optional[asyncio.Future] = None
+
+    async def publish(self, token=None, done=False, error=None):
+        async with self.changed:
+            if token is not None:
+                self.tokens.append(token)
+            self.done = self.done or done
+            self.error = error or self.error
+            self.changed.notify_all()
+
+    async def subscribe(self) -> AsyncIterator[str]:
+        position = 0
+        while True:
+            async with self.changed:
+                await self.changed.wait_for(
+                    lambda: position < len(self.tokens) or self.done or self.error
+                )
+                pending = self.tokens[position:]
+                finished = self.done
+                error = self.error
+            for token in pending:
+                yield token
+            position += len(pending)
+            if error is not None:
+                raise error
+            if finished and position >= len(self.tokens):
+                return
+
+
+class RequestScheduler:
+    """Bounded-concurrency, rate-limited front door for chat completions.
+
+    * at most ``max_concurrency`` upstream requests are open at once;
+    * a token bucket spaces requests to ``requests_per_minute`` and is paused
+      when the API reports the limit is exhausted (rate-limit headers or 429);
+    * identical requests that are already in flight share one upstream call.
+    Must be used from the shared event loop (see ``get_event_loop``).
+    """
+
+    def __init__(self, client, max_concurrency: int = 16,
+                 requests_per_minute: float = 500.0, max_retries: int = 3,
+                 request_timeout: float = 60.0):
+        self.client = client
+        self.request_timeout = request_timeout
+        self.max_concurrency = max_concurrency
+        self.rate = requests_per_minute / 60.0
+        self.capacity = max(1.0, min(requests_per_minute, max_concurrency * 2.0))
+        self.max_retries = max_retries
+        self._tokens = self.capacity
+        self._refilled_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._in_flight: Dict[str, _Broadcast] = {}
+        self.waiting = 0
+        self.active = 0
+        self.completed = 0
+        self.coalesced = 0
+        self.rate_limited = 0
+        self.failed = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.waiting,
+            "in_flight": self.active,
+            "completed": self.completed,
+            "coalesced": self.coalesced,
+            "rate_limited": self.rate_limited,
+            "failed": self.failed,
+        }
+
+    async def _acquire_token(self):
+        while True:
+            now = time.monotonic()
+            if now < self._blocked_until:
+                await asyncio.sleep(self._blocked_until - now)
+                continue
+            self._tokens = min(self.capacity, self._tokens + (now - self._refilled_at) * self.rate)
+            self._refilled_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def _observe_headers(self, headers):
+        if not headers:
+            return
+        remaining = headers.get("x-ratelimit-remaining-requests")
+        reset = headers.get("x-ratelimit-reset-requests")
+        if remaining is not None and reset and int(float(remaining)) <= 0:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + _parse_reset(reset))
+
+    def _backoff(self, error: BaseException, attempt: int) -> float:
+        headers = getattr(getattr(error, "response", None), "headers", None) or {}
+        retry_after = headers.get("retry-after")
+        try:
+            delay = float(retry_after) if retry_after else 0.0
+        except ValueError:
+            delay = 0.0
+        return delay or min(30.0, 0.5 * 2 ** attempt)
+
+    async def _open_stream(self, kwargs: Dict[str, Any]):
+        completions = self.client.chat.completions
+        for attempt in range(self.max_retries + 1):
+            await self._acquire_token()
+            try:
+                raw_api = getattr(completions, "with_raw_response", None)
+                if raw_api is not None:
+                    raw = await raw_api.create(**kwargs)
+                    self._observe_headers(raw.headers)
+                    # parse() is a coroutine on some client versions
+                    stream = raw.parse()
+                    return await stream if inspect.isawaitable(stream) else stream
+                return await completions.create(**kwargs)
+            except Exception as e:
+                if getattr(e, "status_code", None) != 429 or attempt == self.max_retries:
+                    raise
+                self.rate_limited += 1
+                metrics.inc("llm_rate_limited_total")
+                delay = self._backoff(e, attempt)
+                self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+
+    async def _pump(self, kwargs: Dict[str, Any], broadcast: _Broadcast):
+        started = time.perf_counter()
+        stream = await self._open_stream(kwargs)
+        metrics.observe("llm_upstream_open_seconds", time.perf_counter() - started, model=kwargs["model"])
+        async for chunk in stream:
+            usage = getattr(chunk, "usage", None)
+            if usage is not None:
+                metrics.inc("llm_tokens_total", usage.prompt_tokens or 0, kind="prompt")
+                metrics.inc("llm_tokens_total", usage.completion_tokens or 0, kind="completion")
+            if not chunk.choices:
+                continue
+            content = chunk.choices[0].delta.content
+            if content:
+                await broadcast.publish(content)
+
+    async def _run(self, key: str, kwargs: Dict[str, Any], broadcast: _Broadcast):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.waiting += 1
+        queued = True
+        try:
+            async with self._semaphore:
+                self.waiting -= 1
+                queued = False
+                self.active += 1
+                try:
+                    # Bounded so an upstream that hangs cannot hold a slot forever
+                    await asyncio.wait_for(self._pump(kwargs, broadcast), self.request_timeout)
+                finally:
+                    self.active -= 1
+            self.completed += 1
+            metrics.inc("llm_requests_total", outcome="ok")
+            await broadcast.publish(done=True)
+        except asyncio.CancelledError:
+            metrics.inc("llm_requests_total", outcome="cancelled")
+            raise
+        except Exception as e:
+            self.failed += 1
+            metrics.inc("llm_requests_total", outcome=type(e).__name__)
+            await broadcast.publish(error=e)
+        finally:
+            if queued:
+                self.waiting -= 1
+            if self._in_flight.get(key) is broadcast:
+                del self._in_flight[key]
+
+    async def stream_chat(self, messages: List[Dict[str, str]], model: str,
+                          temperature: float = 0.3) -> AsyncIterator[str]:
+        kwargs = {"model": model, "messages": messages, "temperature": temperature, "stream": True,
+                  "stream_options": {"include_usage": True}}
+        key = hashlib.sha256(json.dumps(kwargs, sort_keys=True).encode("utf-8")).hexdigest()
+        broadcast = self._in_flight.get(key)
+        if broadcast is None:
+            broadcast = _Broadcast()
+            self._in_flight[key] = broadcast
+            # The upstream call is owned by its own task so one caller going
+            # away does not cancel it for the callers coalesced onto it
+            broadcast.task = asyncio.ensure_future(self._run(key, kwargs, broadcast))
+        else:
+            self.coalesced += 1
+            metrics.inc("llm_coalesced_total")
+        broadcast.subscribers += 1
+        try:
+            async for token in broadcast.subscribe():
+                yield token
+        finally:
+            broadcast.subscribers -= 1
+            # The last caller went away (e.g. a speculative evaluation whose
+            # answer was edited): stop paying for tokens nobody will read
+            if not broadcast.subscribers and not (broadcast.done or broadcast.error):
+                if self._in_flight.get(key) is broadcast:
+                    del self._in_flight[key]
+                broadcast.task.cancel()
+
+    async def submit_batch(self, requests: List[Dict[str, Any]], model: str,
+                           completion_window: str = "24h"):
+        """Send non-interactive requests (e.g. cohort regrading) through the
+        Batch API. ``requests`` items need ``custom_id`` and ``messages``."""
+        lines = []
+        for request in requests:
+            lines.append(json.dumps({
+                "custom_id": str(request["custom_id"]),
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": model,
+                    "messages": request["messages"],
+                    "temperature": request.get("temperature", 0.3),
+                },
+            }))
+        batch_file = await self.client.files.create(
+            file=("requests.jsonl", "\n".join(lines).encode("utf-8")), purpose="batch"
+        )
+        return await self.client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window=completion_window,
+        )
+
+    async def batch_results(self, batch_id: str) -> Optional[Dict[str, Optional[str]]]:
+        """Completion text by ``custom_id`` for a batch from ``submit_batch``,
+        or None while it is still running. Requests that failed (or were not
+        run before the batch expired) map to None."""
+        batch = await self.client.batches.retrieve(batch_id)
+        if batch.status in BATCH_RUNNING:
+            return None
+        if batch.status == "failed":
+            raise RuntimeError(f"batch {batch_id} failed")
+        results: Dict[str, Optional[str]] = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            content = await self.client.files.content(file_id)
+            for line in content.text.splitlines():
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                response = record.get("response") or {}
+                choices = (response.get("body") or {}).get("choices") or []
+                ok = response.get("status_code") == 200 and choices
+                results[record["custom_id"]] = choices[0]["message"]["content"] if ok else None
+        return results
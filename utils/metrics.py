@@ -0,0 +1,207 @@
+import bisect
+import os
+import threading
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+# Opt-in: with METRICS_ENABLED unset every helper below returns immediately
+ENABLED = os.environ.get("METRICS_ENABLED", "").lower() in ("1", "true", "yes")
+
+# Latency buckets in seconds (Prometheus client defaults plus sub-millisecond
+# buckets for the scoring hot path)
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count", "_lock")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile by interpolating inside the matching bucket."""
+        with self._lock:
+            counts = list(self.counts)
+            total = self.count
+        if not total:
+            return 0.0
+        rank = q * total
+        seen = 0
+        for index, count in enumerate(counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else lower
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+_histograms: Dict[LabelKey, Histogram] = {}
+_counters: Dict[LabelKey, float] = {}
+_registry_lock = threading.Lock()
+
+
+def _key(name: str, labels: Dict[str, Any]) -> LabelKey:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def observe(name: str, value: float, **labels):
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    histogram = _histograms.get(key)
+    if histogram is None:
+        with _registry_lock:
+            histogram = _histograms.setdefault(key, Histogram())
+    histogram.observe(value)
+
+
+def inc(name: str, amount: float = 1, **labels):
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _registry_lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+class _Span:
+    __slots__ = ("name", "labels", "started")
+
+    def __init__(self, name: str, labels: Dict[str, Any]):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.name, time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name: str, **labels):
+    """Time a block into the ``name`` histogram (seconds)::
+
+        with metrics.span("stage_seconds", stage="score"):
+            ...
+    """
+    if not ENABLED:
+        return _NULL_SPAN
+    return _Span(name, labels)
+
+
+def _format_labels(labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (
+        f'{k}="' + v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for k, v in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def render_prometheus() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    with _registry_lock:
+        histograms = sorted(_histograms.items())
+        counters = sorted(_counters.items())
+    lines = []
+    typed = set()
+    for (name, labels), value in counters:
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name}{_format_labels(labels)} {value:g}")
+    for (name, labels), histogram in histograms:
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} histogram")
+        cumulative = 0
+        for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else f"{bound:g}"
+            lines.append(f"{name}_bucket{_format_labels(labels, ('le', le))} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum:.6f}")
+        lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+    return "\n".join(lines) + "\n"
+
+
+def snapshot() -> List[Dict[str, Any]]:
+    """One row per histogram series, for the sidebar debug panel."""
+    with _registry_lock:
+        histograms = sorted(_histograms.items())
+    rows = []
+    for (name, labels), histogram in histograms:
+        rows.append({
+            "metric": name + _format_labels(labels),
+            "count": histogram.count,
+            "mean_ms": round(1000 * histogram.sum / histogram.count, 3) if histogram.count else 0.0,
+            "p50_ms": round(1000 * histogram.quantile(0.5), 3),
+            "p95_ms": round(1000 * histogram.quantile(0.95), 3),
+        })
+    return rows
+
+
+def counters() -> Dict[str, float]:
+    with _registry_lock:
+        return {name + _format_labels(labels): value for (name, labels), value in sorted(_counters.items())}
+
+
+def reset():
+    with _registry_lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+def start_http_server(port: int, host: str = "0.0.0.0"):
+    """Serve /metrics for Prometheus scraping from a daemon thread."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
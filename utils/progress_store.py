@@ -0,0 +1,284 @@
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, List, Optional, Sequence
+
+DEFAULT_PROGRESS_DB_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "progress.db"
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS attempts (
+    id INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    question_id INTEGER NOT NULL,
+    score INTEGER NOT NULL,
+    word_count INTEGER NOT NULL,
+    source TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    missing TEXT NOT NULL DEFAULT '',
+    key_points INTEGER NOT NULL DEFAULT 0,
+    answer_seconds REAL
+);
+CREATE INDEX IF NOT EXISTS attempts_user_question ON attempts (user_id, question_id);
+"""
+
+# Progress is per tenant: a tenant question may share its id with a shared
+# bank question (tenant "")
+PROGRESS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_progress (
+    user_id TEXT NOT NULL,
+    tenant TEXT NOT NULL DEFAULT '',
+    question_id INTEGER NOT NULL,
+    attempts INTEGER NOT NULL,
+    best_score INTEGER NOT NULL,
+    last_score INTEGER NOT NULL,
+    last_at REAL NOT NULL,
+    PRIMARY KEY (user_id, tenant, question_id)
+);
+"""
+
+# Progress tables from before tenants are rebuilt from the attempt history
+MIGRATE_PROGRESS = f"""
+BEGIN;
+ALTER TABLE user_progress RENAME TO user_progress_before_tenants;
+{PROGRESS_SCHEMA}
+INSERT INTO user_progress (user_id, tenant, question_id, attempts, best_score, last_score, last_at)
+SELECT user_id, tenant, question_id, COUNT(*), MAX(score),
+       (SELECT score FROM attempts AS latest
+        WHERE latest.user_id = attempts.user_id AND latest.tenant = attempts.tenant
+          AND latest.question_id = attempts.question_id
+        ORDER BY created_at DESC, id DESC LIMIT 1),
+       MAX(created_at)
+FROM attempts GROUP BY user_id, tenant, question_id;
+DROP TABLE user_progress_before_tenants;
+COMMIT;
+"""
+
+UPSERT_PROGRESS = """
+INSERT INTO user_progress (user_id, tenant, question_id, attempts, best_score, last_score, last_at)
+VALUES (?, ?, ?, 1, ?, ?, ?)
+ON CONFLICT (user_id, tenant, question_id) DO UPDATE SET
+    attempts = attempts + 1,
+    best_score = MAX(best_score, excluded.best_score),
+    last_score = excluded.last_score,
+    last_at = excluded.last_at
+"""
+
+# Columns added since the first release, for databases created before them
+ATTEMPT_COLUMNS = {
+    "missing": "TEXT NOT NULL DEFAULT ''",
+    "key_points": "INTEGER NOT NULL DEFAULT 0",
+    "answer_seconds": "REAL",
+    "tenant": "TEXT NOT NULL DEFAULT ''",
+}
+
+_STOP = object()
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class ProgressStore:
+    """Attempt history and per-user progress in SQLite (WAL mode).
+
+    Writes are queued and committed in batches by a single writer thread, so
+    a submit never waits on disk and sessions never contend for the write
+    lock. Reads use a small pool of connections; WAL lets them run while the
+    writer commits. Attempts still waiting in the queue are merged into
+    ``summary()`` so a user always sees their latest attempt, and the queue
+    is drained when the process exits.
+    """
+
+    def __init__(self, path: str = DEFAULT_PROGRESS_DB_PATH, pool_size: int = 4,
+                 batch_size: int = 256, flush_interval: float = 0.25):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        writer = _connect(path)
+        writer.executescript(SCHEMA)
+        existing = {row[1] for row in writer.execute("PRAGMA table_info(attempts)")}
+        for column, definition in ATTEMPT_COLUMNS.items():
+            if column not in existing:
+                writer.execute(f"ALTER TABLE attempts ADD COLUMN {column} {definition}")
+        writer.commit()
+        progress_columns = {row[1] for row in writer.execute("PRAGMA table_info(user_progress)")}
+        writer.executescript(PROGRESS_SCHEMA if not progress_columns or "tenant" in progress_columns
+                             else MIGRATE_PROGRESS)
+
+        self._pool: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        for _ in range(pool_size):
+            self._pool.put(_connect(path))
+        self._writes: "queue.Queue" = queue.Queue()
+        self._pending: Dict[str, List[tuple]] = {}
+        self._pending_lock = threading.Lock()
+        self._flushed = threading.Condition()
+        self._sequence = 0
+        self._committed = 0
+        self._writer = threading.Thread(target=self._write_loop, args=(writer,),
+                                        name="progress-writer", daemon=True)
+        self._writer.start()
+        self._closed = False
+        atexit.register(self.close)
+
+    @contextmanager
+    def connection(self):
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def record_attempt(self, user_id: str, question_id, score: int,
+                       word_count: int = 0, source: str = "heuristic", missing: Sequence[str] = (),
+                       key_points: int = 0, answer_seconds: Optional[float] = None, tenant: str = "") -> None:
+        row = (user_id, question_id, int(score), int(word_count), source, time.time(),
+               "\n".join(missing), int(key_points), answer_seconds, tenant)
+        with self._pending_lock:
+            # Checked under the lock close() takes, so nothing can be queued
+            # behind the writer's stop marker and silently dropped
+            if self._closed:
+                raise RuntimeError(f"progress store {self.path} is closed")
+            self._sequence += 1
+            self._pending.setdefault(user_id, []).append(row)
+            self._writes.put(row)
+
+    def _write_loop(self, conn: sqlite3.Connection):
+        while True:
+            item = self._writes.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._writes.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    self._commit(conn, batch)
+                    return
+                batch.append(item)
+            self._commit(conn, batch)
+
+    def _commit(self, conn: sqlite3.Connection, batch: List[tuple]):
+        with conn:
+            conn.executemany(
+                "INSERT INTO attempts (user_id, question_id, score, word_count, source, created_at, "
+                "missing, key_points, answer_seconds, tenant) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                batch,
+            )
+            conn.executemany(
+                UPSERT_PROGRESS,
+                [(user_id, tenant, question_id, score, score, created_at)
+                 for user_id, question_id, score, _, _, created_at, _, _, _, tenant in batch],
+            )
+        with self._pending_lock:
+            for row in batch:
+                rows = self._pending.get(row[0])
+                if rows:
+                    rows.remove(row)
+                    if not rows:
+                        del self._pending[row[0]]
+        with self._flushed:
+            self._committed += len(batch)
+            self._flushed.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until everything recorded so far is committed."""
+        with self._pending_lock:
+            target = self._sequence
+        with self._flushed:
+            return self._flushed.wait_for(lambda: self._committed >= target, timeout)
+
+    def ping(self):
+        """Raise if the writer thread has died or the database is unreadable."""
+        if not self._writer.is_alive():
+            raise RuntimeError("progress writer thread is not running")
+        with self.connection() as conn:
+            conn.execute("SELECT 1").fetchone()
+
+    def close(self):
+        """Commit everything queued and stop the writer; idempotent. Later
+        attempts raise RuntimeError."""
+        with self._pending_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._writes.put(_STOP)
+        atexit.unregister(self.close)
+        self._writer.join()
+
+    def question_progress(self, user_id: str, tenant: str = "") -> Dict[Any, Dict[str, Any]]:
+        with self.connection() as conn:
+            rows = conn.execute(
+                "SELECT question_id, attempts, best_score, last_score, last_at "
+                "FROM user_progress WHERE user_id = ? AND tenant = ?", (user_id, tenant)
+            ).fetchall()
+        progress = {
+            question_id: {"attempts": attempts, "best_score": best, "last_score": last, "last_at": last_at}
+            for question_id, attempts, best, last, last_at in rows
+        }
+        with self._pending_lock:
+            pending = [row for row in self._pending.get(user_id, []) if row[-1] == tenant]
+        for _, question_id, score, _, _, created_at, *_ in pending:
+            entry = progress.setdefault(
+                question_id, {"attempts": 0, "best_score": score, "last_score": score, "last_at": created_at}
+            )
+            entry["attempts"] += 1
+            entry["best_score"] = max(entry["best_score"], score)
+            entry["last_score"] = score
+            entry["last_at"] = created_at
+        return progress
+
+    def attempt_history(self, user_id: str, tenant: str = "") -> List[tuple]:
+        """(question_id, score, created_at) for every attempt at ``tenant``'s
+        questions, oldest first."""
+        with self.connection() as conn:
+            rows = conn.execute(
+                "SELECT question_id, score, created_at FROM attempts "
+                "WHERE user_id = ? AND tenant = ? ORDER BY created_at", (user_id, tenant)
+            ).fetchall()
+        with self._pending_lock:
+            pending = [row for row in self._pending.get(user_id, []) if row[-1] == tenant]
+        committed = set(rows)
+        rows.extend(
+            (question_id, score, created_at)
+            for _, question_id, score, _, _, created_at, *_ in pending
+            if (question_id, score, created_at) not in committed
+        )
+        return rows
+
+    def graded_attempts(self) -> Iterator[tuple]:
+        """(question_id, score, missing key points, key point count, answer
+        seconds, tenant) for every user's attempts, after pending writes are
+        committed."""
+        self.flush()
+        with self.connection() as conn:
+            for question_id, score, missing, key_points, answer_seconds, tenant in conn.execute(
+                "SELECT question_id, score, missing, key_points, answer_seconds, tenant FROM attempts ORDER BY id"
+            ):
+                yield question_id, score, missing.split("\n") if missing else [], key_points, answer_seconds, tenant
+
+    def summary(self, user_id: str, tenant: str = "") -> Dict[str, Any]:
+        progress = self.question_progress(user_id, tenant)
+        attempts = sum(p["attempts"] for p in progress.values())
+        return {
+            "completed": len(progress),
+            "attempts": attempts,
+            "average_score": (
+                sum(p["last_score"] for p in progress.values()) / len(progress) if progress else 0.0
+            ),
+            "best_total": sum(p["best_score"] for p in progress.values()),
+        }
@@ -0,0 +1,370 @@
+import bisect
+import hashlib
+import itertools
+import json
+import mmap
+import os
+import pickle
+import sys
+import threading
+from array import array
+from collections.abc import Mapping, Sequence
+from typing import IO, Dict, Any, Iterable, Iterator, List, Optional, Tuple
+
+DEFAULT_QUESTIONS_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "questions.jsonl"
+)
+
+DIFFICULTY_ORDER = {"easy": 0, "medium": 1, "hard": 2}
+
+
+def _difficulty_key(difficulty: str):
+    return DIFFICULTY_ORDER.get(difficulty, len(DIFFICULTY_ORDER)), difficulty
+
+# Fields kept in memory for every question; anything else (rubric,
+# follow_up, ...) is parsed from the memory-mapped bank file when accessed
+RESIDENT_FIELDS = ("id", "category", "difficulty", "question", "key_points")
+
+# Read from the file on demand (get_model_answer) and never part of a record
+UNLISTED_FIELDS = ("model_answer",)
+
+# Fields indexed for filtering; list-valued fields (tags) index each element
+FACET_FIELDS = ("category", "difficulty", "tags")
+
+_HASH_BYTES = 6
+
+
+def _bitmap(positions: Iterable[int], size: int) -> int:
+    # Python ints as bitsets: bit i is set when question i matches
+    bits = bytearray((size + 7) // 8)
+    for position in positions:
+        bits[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(bits, "little")
+
+
+def bit_positions(bits: int) -> Iterator[int]:
+    """Positions of the set bits, lowest first."""
+    digits = bin(bits)[:1:-1]
+    index = digits.find("1")
+    while index != -1:
+        yield index
+        index = digits.find("1", index + 1)
+
+
+class Question(Mapping):
+    """Read-only dict-like view of one question in a QuestionStore."""
+
+    __slots__ = ("_store", "_position", "_extra")
+
+    def __init__(self, store: "QuestionStore", position: int):
+        self._store = store
+        self._position = position
+        self._extra = None
+
+    def __getitem__(self, field: str):
+        store = self._store
+        position = self._position
+        if field == "id":
+            return store._ids[position]
+        if field == "category":
+            return store.categories_by_code[store._category_codes[position]]
+        if field == "difficulty":
+            return store.difficulties_by_code[store._difficulty_codes[position]]
+        if field == "question":
+            return store._text(position)
+        if field == "key_points":
+            key_points = store._key_points[position]
+            if key_points is None:
+                raise KeyError(field)
+            return list(key_points)
+        if field not in store._extra_fields[position]:
+            raise KeyError(field)
+        if self._extra is None:
+            self._extra = store._record(position)
+        return self._extra[field]
+
+    def __iter__(self) -> Iterator[str]:
+        yield from ("id", "category", "difficulty", "question")
+        if self._store._key_points[self._position] is not None:
+            yield "key_points"
+        yield from self._store._extra_fields[self._position]
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f"Question({dict(self)!r})"
+
+
+class _Questions(Sequence):
+    # Bank-order sequence of Question views over the store's columns
+    def __init__(self, store: "QuestionStore"):
+        self._store = store
+
+    def __len__(self) -> int:
+        return len(self._store._ids)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError("question position out of range")
+        return Question(self._store, position)
+
+    def __iter__(self) -> Iterator[Question]:
+        store = self._store
+        return (Question(store, position) for position in range(len(store._ids)))
+
+
+class QuestionStore:
+    """Question bank loaded from a JSONL file, one question per line.
+
+    Questions are held column by column: categories and difficulties as
+    one-byte codes, key points as interned (and shared) tuples, question
+    texts and content hashes packed into one string and one bytearray. Everything else,
+    the large ``model_answer`` included, stays in the bank file, which is
+    memory-mapped and parsed on access; the mapping is shared through the
+    page cache by every process that opens the same bank.
+    ``store.questions`` and ``store.get()`` return dict-like Question views.
+    """
+
+    def __init__(self, path: str = DEFAULT_QUESTIONS_PATH):
+        self.path = path
+        self.questions = _Questions(self)
+        self._ids: Sequence = ()
+        self._positions: Optional[Dict[Any, int]] = None
+        self._sorted_ids = array("q")
+        self._sorted_positions = array("I")
+        self._category_codes = bytearray()
+        self._difficulty_codes = bytearray()
+        self._texts = ""
+        self._text_starts = array("q")
+        self._key_points: List[Optional[Tuple[str, ...]]] = []
+        self._extra_fields: List[Tuple[str, ...]] = []
+        self._offsets = array("q")
+        self._hashes = bytearray()
+        self._category_index: Dict[str, int] = {}
+        self._difficulty_index: Dict[str, int] = {}
+        self._facets: Dict[str, Dict[str, int]] = {}
+        self._all = 0
+        self._map: Optional[mmap.mmap] = None
+        self._search_index = None
+        self._search_lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        shared_key_points: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+        shared_fields: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+        ids: List[Any] = []
+        positions: Dict[Any, int] = {}
+        texts: List[str] = []
+        text_length = 0
+        facet_positions: Dict[str, Dict[str, array]] = {facet: {} for facet in FACET_FIELDS}
+        with open(self.path, "rb") as f:
+            offset = 0
+            for line in f:
+                line_offset = offset
+                offset += len(line)
+                if not line.strip():
+                    continue
+                question = json.loads(line)
+                question_id = question["id"]
+                if question_id in positions:
+                    raise ValueError(f"Duplicate question id {question_id} in {self.path}")
+                position = len(ids)
+                ids.append(question_id)
+                positions[question_id] = position
+                category = self._code(self._category_index, question["category"])
+                difficulty = self._code(self._difficulty_index, question["difficulty"])
+                self._category_codes.append(category)
+                self._difficulty_codes.append(difficulty)
+                for facet, values in facet_positions.items():
+                    value = question.get(facet)
+                    if value is None:
+                        continue
+                    for item in value if isinstance(value, list) else (value,):
+                        values.setdefault(item, array("I")).append(position)
+                text = question["question"]
+                self._text_starts.append(text_length)
+                texts.append(text)
+                text_length += len(text)
+                key_points = question.get("key_points")
+                if key_points is not None:
+                    key_points = tuple(sys.intern(k) for k in key_points)
+                    key_points = shared_key_points.setdefault(key_points, key_points)
+                self._key_points.append(key_points)
+                extra = tuple(sys.intern(k) for k in question
+                              if k not in RESIDENT_FIELDS and k not in UNLISTED_FIELDS)
+                self._extra_fields.append(shared_fields.setdefault(extra, extra))
+                self._offsets.append(line_offset)
+                self._hashes += hashlib.sha1(line.strip()).digest()[:_HASH_BYTES]
+
+        self._map = self._open_map()
+        self._text_starts.append(text_length)
+        self._texts = "".join(texts)
+        if all(type(question_id) is int for question_id in ids):
+            # Integer ids (the usual case) are kept in arrays and looked up
+            # by binary search instead of one int object and dict slot each
+            order = sorted(range(len(ids)), key=ids.__getitem__)
+            self._ids = array("q", ids)
+            self._sorted_ids = array("q", (ids[p] for p in order))
+            self._sorted_positions = array("I", order)
+        else:
+            self._ids = ids
+            self._positions = positions
+        self.categories_by_code = list(self._category_index)
+        self.difficulties_by_code = list(self._difficulty_index)
+        self._all = (1 << len(ids)) - 1
+        for facet, values in facet_positions.items():
+            ordered = sorted(values, key=_difficulty_key if facet == "difficulty" else None)
+            self._facets[facet] = {value: _bitmap(values[value], len(ids)) for value in ordered}
+        self.categories = self.facet_values("category")
+        self.difficulties = self.facet_values("difficulty")
+
+    @classmethod
+    def from_index(cls, index_path: str, path: str) -> "QuestionStore":
+        """Restore a store pickled by ``save_index()``, without parsing the
+        bank; ``path`` must be the same bank file the index was built from."""
+        with open(index_path, "rb") as f:
+            store = pickle.load(f)
+        store.path = path
+        store._map = store._open_map()
+        return store
+
+    def save_index(self, f: IO[bytes]):
+        pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = dict(self.__dict__)
+        del state["questions"], state["_map"], state["_search_index"], state["_search_lock"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]):
+        self.__dict__.update(state)
+        self.questions = _Questions(self)
+        self._map = None
+        self._search_index = None
+        self._search_lock = threading.Lock()
+
+    def _open_map(self) -> Optional[mmap.mmap]:
+        with open(self.path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @staticmethod
+    def _code(codes: Dict[str, int], value: str) -> int:
+        code = codes.get(value)
+        if code is None:
+            if len(codes) == 256:
+                raise ValueError(f"more than 256 distinct values (at {value!r})")
+            code = codes[value] = len(codes)
+        return code
+
+    def _text(self, position: int) -> str:
+        return self._texts[self._text_starts[position]:self._text_starts[position + 1]]
+
+    def _record(self, position: int) -> Dict[str, Any]:
+        # Full source record of the question, straight from the mapped file
+        start = self._offsets[position]
+        end = self._map.find(b"\n", start)
+        return json.loads(self._map[start:end if end != -1 else len(self._map)])
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @property
+    def ids(self) -> List[Any]:
+        """Question ids in bank order."""
+        return list(self._ids)
+
+    def __contains__(self, question_id) -> bool:
+        try:
+            self.position(question_id)
+        except KeyError:
+            return False
+        return True
+
+    def position(self, question_id) -> int:
+        if self._positions is not None:
+            return self._positions[question_id]
+        if type(question_id) is int:
+            index = bisect.bisect_left(self._sorted_ids, question_id)
+            if index < len(self._sorted_ids) and self._sorted_ids[index] == question_id:
+                return self._sorted_positions[index]
+        raise KeyError(question_id)
+
+    def get(self, question_id) -> Question:
+        return Question(self, self.position(question_id))
+
+    def content_hash(self, question_id) -> str:
+        """Hash of the question's full source line, model answer included."""
+        start = self.position(question_id) * _HASH_BYTES
+        return self._hashes[start:start + _HASH_BYTES].hex()
+
+    def facet_values(self, facet: str) -> List[str]:
+        """Values of ``facet`` in display order (difficulties easiest first)."""
+        return list(self._facets.get(facet, ()))
+
+    @property
+    def search_index(self):
+        """Full-text index of the bank (utils.search), built on first use
+        unless one was set from a bank build."""
+        if self._search_index is None:
+            with self._search_lock:
+                if self._search_index is None:
+                    from utils.search import SearchIndex
+                    self._search_index = SearchIndex.from_store(self)
+        return self._search_index
+
+    @search_index.setter
+    def search_index(self, index):
+        self._search_index = index
+
+    def bitmap(self, text: str = "", **selected: Optional[str]) -> int:
+        """Bitset of the questions matching every selected facet value (and
+        every word of ``text``, if given); empty selections are ignored."""
+        bits = self._all
+        for facet, value in selected.items():
+            if value:
+                bits &= self._facets.get(facet, {}).get(value, 0)
+        if text.strip() and bits:
+            text_bits = self.search_index.bitmap(text)
+            if text_bits is not None:
+                bits &= text_bits
+        return bits
+
+    def facet_counts(self, facet: str, text: str = "", **selected: Optional[str]) -> Dict[str, int]:
+        """Matches per value of ``facet`` under the other selections."""
+        selected.pop(facet, None)
+        bits = self.bitmap(text, **selected)
+        return {value: (bits & value_bits).bit_count() for value, value_bits in self._facets.get(facet, {}).items()}
+
+    def filter(self, category: Optional[str] = None,
+               difficulty: Optional[str] = None, **facets: Optional[str]) -> List[Question]:
+        bits = self.bitmap(category=category, difficulty=difficulty, **facets)
+        return [Question(self, p) for p in bit_positions(bits)]
+
+    def search(self, category: Optional[str] = None, difficulty: Optional[str] = None,
+               text: str = "", offset: int = 0, limit: int = 10,
+               **facets: Optional[str]) -> Tuple[int, List[Question]]:
+        """Return (total matches, one page of matching questions): in bank
+        order, or best first by BM25 relevance when ``text`` is given."""
+        bits = self.bitmap(category=category, difficulty=difficulty, **facets)
+        scores = self.search_index.scores(text) if text.strip() else None
+        if scores is None:
+            page = itertools.islice(bit_positions(bits), offset, offset + limit)
+            return bits.bit_count(), [Question(self, p) for p in page]
+        from utils.search import ranked
+        total, positions, _ = ranked(scores, bits, offset + limit)
+        return total, [Question(self, p) for p in positions[offset:]]
+
+    def iter_model_answers(self) -> Iterator[Tuple[Any, str]]:
+        """Yield (question id, model answer) in bank order."""
+        for position, question_id in enumerate(self._ids):
+            yield question_id, self._record(position).get("model_answer", "")
+
+    def get_model_answer(self, question_id) -> str:
+        return self._record(self.position(question_id)).get("model_answer", "")
@@ -0,0 +1,143 @@
+import argparse
+import json
+import os
+import sys
+import time
+from typing import IO, Any, Dict, Iterable, List, Optional, Tuple
+
+from utils.grading import Grader, _check_answer
+from utils.question_store import DEFAULT_QUESTIONS_PATH
+
+# Seconds between status checks with `collect --wait`
+POLL_INTERVAL = 60.0
+
+
+def _read(lines: Iterable[str], grader: Grader) -> List[Tuple[str, Optional[Dict[str, Any]], Optional[str]]]:
+    # (line, record, error) for each input line; custom ids are line numbers
+    rows = []
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            record["question_id"] = grader.resolve(record["question_id"])
+            _check_answer(record["answer"])
+            rows.append((line, record, None))
+        except (ValueError, KeyError, TypeError) as e:
+            rows.append((line, None, f"{type(e).__name__}: {e}"))
+    return rows
+
+
+def _graded(rows, grader: Grader) -> Dict[str, Dict[str, Any]]:
+    # Rubric feedback by custom id: the fallback for each LLM review
+    valid = [(str(number), record) for number, (_, record, _) in enumerate(rows) if record is not None]
+    results = grader.grade_many([(record["question_id"], record["answer"]) for _, record in valid])
+    return {custom_id: result for (custom_id, _), result in zip(valid, results)}
+
+
+def submit(lines: Iterable[str], grader: Grader, evaluator) -> Tuple[Any, int]:
+    """Queue LLM feedback for JSONL answer records as one batch; returns the
+    batch and the number of records skipped as invalid."""
+    rows = _read(lines, grader)
+    prompts = {}
+    for number, (_, record, _) in enumerate(rows):
+        if record is None:
+            continue
+        question = grader.questions.get(record["question_id"])
+        prompts[str(number)] = evaluator.build_prompt(
+            question["question"], grader.questions.get_model_answer(question["id"]), record["answer"],
+            question["category"], question["difficulty"],
+        )
+    if not prompts:
+        raise ValueError("no valid answer records to submit")
+    return evaluator.submit_batch(prompts), len(rows) - len(prompts)
+
+
+def collect(lines: Iterable[str], out: IO[str], results: Dict[str, Optional[str]], grader: Grader,
+            evaluator) -> Dict[str, int]:
+    """Write the answers submitted by ``submit`` as JSONL results, in input
+    order: rubric feedback overlaid with the batch's LLM review where it has
+    one (as in the app), ``{"error": ...}`` for invalid records."""
+    rows = _read(lines, grader)
+    graded = _graded(rows, grader)
+    stats = {"graded": 0, "llm": 0, "errors": 0}
+    for number, (line, record, error) in enumerate(rows):
+        if record is None:
+            stats["errors"] += 1
+            out.write(json.dumps({"error": error, "input": line.rstrip("\n")}) + "\n")
+            continue
+        fallback = graded[str(number)]
+        text = results.get(str(number))
+        if text is None:
+            result = evaluator.fallback_result(fallback, "AI feedback is missing from the batch")
+        else:
+            result = evaluator.parse_response(text, fallback)
+        stats["graded"] += 1
+        stats["llm"] += result["source"] == "llm"
+        passthrough = {key: value for key, value in record.items() if key != "answer"}
+        out.write(json.dumps(dict(passthrough, **result), ensure_ascii=False) + "\n")
+    out.flush()
+    return stats
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m utils.regrade",
+        description="Regrade a JSONL file of {question_id, answer} records with LLM feedback "
+                    "through the OpenAI Batch API (half price, results within 24h).",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    submit_parser = commands.add_parser("submit", help="queue the answers and print the batch id")
+    submit_parser.add_argument("input", help="answers JSONL file")
+    collect_parser = commands.add_parser("collect", help="write the results of a finished batch")
+    collect_parser.add_argument("batch_id")
+    collect_parser.add_argument("input", help="the answers JSONL file that was submitted")
+    collect_parser.add_argument("-o", "--output", default="-", help="results JSONL file (default: stdout)")
+    collect_parser.add_argument("--wait", action="store_true", help="poll until the batch has finished")
+    for command in (submit_parser, collect_parser):
+        command.add_argument("--questions", default=os.environ.get("QUESTIONS_PATH", DEFAULT_QUESTIONS_PATH),
+                             help="question bank JSONL")
+        command.add_argument("--tenant", default=None, help="grade against this tenant's overlay bank")
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    from utils.evaluator import AnswerEvaluator
+    load_dotenv()
+    evaluator = AnswerEvaluator()
+    if not evaluator.enabled:
+        print("OPENAI_API_KEY is not set", file=sys.stderr)
+        return 2
+    grader = Grader.from_path(args.questions, semantic=True, tenant=args.tenant)
+
+    if args.command == "submit":
+        with open(args.input, encoding="utf-8") as source:
+            try:
+                batch, skipped = submit(source, grader, evaluator)
+            except ValueError as e:
+                print(e, file=sys.stderr)
+                return 1
+        print(batch.id)
+        print(f"submitted batch {batch.id} ({skipped} invalid records skipped)", file=sys.stderr)
+        return 0
+
+    results = evaluator.batch_results(args.batch_id)
+    while results is None and args.wait:
+        time.sleep(POLL_INTERVAL)
+        results = evaluator.batch_results(args.batch_id)
+    if results is None:
+        print(f"batch {args.batch_id} is still running", file=sys.stderr)
+        return 3
+    target = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        with open(args.input, encoding="utf-8") as source:
+            stats = collect(source, target, results, grader, evaluator)
+    finally:
+        if target is not sys.stdout:
+            target.close()
+    print(f"regraded {stats['graded']} answers ({stats['llm']} with LLM feedback, "
+          f"{stats['errors']} errors)", file=sys.stderr)
+    return 1 if stats["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,316 @@
+import json
+import os
+import sys
+import threading
+import time
+from typing import Callable, Dict, Any, List, Optional, Sequence
+
+from utils import metrics
+
+
+class _Spec:
+    __slots__ = ("name", "factory", "depends", "health", "lock")
+
+    def __init__(self, name: str, factory: Callable, depends: Sequence[str], health: Optional[Callable]):
+        self.name = name
+        self.factory = factory
+        self.depends = tuple(depends)
+        self.health = health
+        self.lock = threading.Lock()
+
+
+class ResourceRegistry:
+    """Process-wide heavy objects, built once and shared by every session.
+
+    A resource is built the first time it is requested (or by ``warmup()``),
+    after its dependencies, which are passed to the factory as arguments.
+    Failed builds are not cached, so the next request retries. Each resource
+    may have a health check that raises, or returns a short status note.
+    """
+
+    def __init__(self):
+        self._specs: Dict[str, _Spec] = {}
+        self._values: Dict[str, Any] = {}
+        self._errors: Dict[str, str] = {}
+        self._init_seconds: Dict[str, float] = {}
+        self._warmup_thread: Optional[threading.Thread] = None
+        self._warmup_lock = threading.Lock()
+        self._register_lock = threading.Lock()
+
+    def register(self, name: str, factory: Callable, depends: Sequence[str] = (),
+                 health: Optional[Callable[[Any], Optional[str]]] = None):
+        for dependency in depends:
+            if dependency not in self._specs:
+                raise KeyError(f"resource {name!r} depends on unregistered {dependency!r}")
+        self._specs[name] = _Spec(name, factory, depends, health)
+
+    def register_once(self, name: str, factory: Callable, depends: Sequence[str] = (),
+                      health: Optional[Callable[[Any], Optional[str]]] = None):
+        """Register ``name`` unless it already is; safe for concurrent callers."""
+        with self._register_lock:
+            if name not in self._specs:
+                self.register(name, factory, depends, health)
+
+    def resource(self, name: str, depends: Sequence[str] = (), health=None):
+        def decorator(factory):
+            self.register(name, factory, depends, health)
+            return factory
+        return decorator
+
+    @property
+    def names(self) -> List[str]:
+        return list(self._specs)
+
+    def loaded(self, name: str) -> bool:
+        return name in self._values
+
+    def get(self, name: str):
+        try:
+            return self._values[name]
+        except KeyError:
+            pass
+        spec = self._specs[name]
+        dependencies = [self.get(dependency) for dependency in spec.depends]
+        with spec.lock:
+            if name in self._values:
+                return self._values[name]
+            started = time.perf_counter()
+            try:
+                value = spec.factory(*dependencies)
+            except Exception as e:
+                self._errors[name] = f"{type(e).__name__}: {e}"
+                raise
+            elapsed = time.perf_counter() - started
+            metrics.observe("resource_init_seconds", elapsed, resource=name)
+            self._init_seconds[name] = elapsed
+            self._errors.pop(name, None)
+            self._values[name] = value
+            return value
+
+    def warmup(self, names: Optional[Sequence[str]] = None, background: bool = False):
+        """Build resources ahead of the first request.
+
+        With ``background=True`` the build runs once per process on a daemon
+        thread; callers that need a resource first simply wait for its lock.
+        """
+        names = list(names or self._specs)
+        if not background:
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception:
+                    pass
+            return None
+        with self._warmup_lock:
+            if self._warmup_thread is None:
+                self._warmup_thread = threading.Thread(
+                    target=self.warmup, args=(names,), name="resource-warmup", daemon=True
+                )
+                self._warmup_thread.start()
+        return self._warmup_thread
+
+    def health(self) -> Dict[str, Dict[str, Any]]:
+        report = {}
+        for name, spec in self._specs.items():
+            entry: Dict[str, Any] = {"status": "not_loaded"}
+            if name in self._values:
+                entry = {"status": "ok", "init_seconds": round(self._init_seconds[name], 4)}
+                if spec.health is not None:
+                    try:
+                        note = spec.health(self._values[name])
+                        if note:
+                            entry["detail"] = note
+                    except Exception as e:
+                        entry["status"] = "error"
+                        entry["detail"] = f"{type(e).__name__}: {e}"
+            elif name in self._errors:
+                entry = {"status": "error", "detail": self._errors[name]}
+            report[name] = entry
+        return report
+
+    def reset(self, name: Optional[str] = None):
+        """Drop a built resource (or all of them) so it is rebuilt on next use."""
+        for spec_name in ([name] if name else list(self._specs)):
+            with self._specs[spec_name].lock:
+                self._values.pop(spec_name, None)
+                self._errors.pop(spec_name, None)
+
+
+registry = ResourceRegistry()
+get = registry.get
+warmup = registry.warmup
+health = registry.health
+
+
+# Factories import their modules lazily so the app (and any CLI that only
+# needs one resource) does not pay for numpy, asyncio or openai up front
+
+def _questions_path() -> str:
+    from utils.question_store import DEFAULT_QUESTIONS_PATH
+    return os.environ.get("QUESTIONS_PATH", DEFAULT_QUESTIONS_PATH)
+
+
+# Output of `python -m utils.build_bank` for the current bank; None (so
+# everything is derived at startup) when there is no up-to-date build
+@registry.resource("bank_artifacts",
+                   health=lambda artifacts: f"build {artifacts.version}" if artifacts else "no build, derived at runtime")
+def _bank_artifacts():
+    from utils.build_bank import load
+    return load(_questions_path())
+
+
+@registry.resource("question_store", depends=["bank_artifacts"], health=lambda store: f"{len(store)} questions")
+def _question_store(artifacts):
+    from utils.question_store import QuestionStore
+    path = _questions_path()
+    store = artifacts.store(path) if artifacts else QuestionStore(path)
+    if not len(store):
+        raise ValueError(f"question bank {store.path} is empty")
+    return store
+
+
+# Compiled (or loaded from the build) on first use; only the
+# RUBRIC_CACHE_SIZE most recent are kept
+@registry.resource("rubrics", depends=["question_store", "bank_artifacts"])
+def _rubrics(store, artifacts):
+    from utils.rubric import LazyRubrics
+    return LazyRubrics(store, int(os.environ.get("RUBRIC_CACHE_SIZE", "4096")),
+                       compiled=artifacts.rubric if artifacts else None)
+
+
+# Full-text index for the sidebar search (from the build, or built from the
+# bank here so the first search does not pay for it)
+@registry.resource("search_index", depends=["question_store", "bank_artifacts"],
+                   health=lambda index: f"{index.term_count} terms")
+def _search_index(store, artifacts):
+    if artifacts:
+        store.search_index = artifacts.search_index()
+    return store.search_index
+
+
+def _check_vector_store(index):
+    if len(index.vectors) < len(index.questions):
+        raise RuntimeError(f"{len(index.vectors)} vectors for {len(index.questions)} questions")
+    return f"{len(index.vectors)} vectors"
+
+
+# Embeddings are persisted at VECTOR_DB_PATH; only new or edited questions
+# are embedded when the process starts
+@registry.resource("vector_store", depends=["question_store"], health=_check_vector_store)
+def _vector_store(store):
+    from utils.vector_store import initialize_vector_store
+    return initialize_vector_store(store)
+
+
+@registry.resource("semantic_scorer", depends=["question_store", "rubrics", "bank_artifacts"])
+def _semantic_scorer(store, rubrics, artifacts):
+    from utils.semantic import SemanticScorer
+    scorer = artifacts.semantic_scorer(store) if artifacts else None
+    return scorer or SemanticScorer(store, rubrics)
+
+
+@registry.resource("grader", depends=["question_store", "rubrics", "semantic_scorer"])
+def _grader(store, rubrics, semantic_scorer):
+    from utils.grading import Grader
+    return Grader(store, rubrics, semantic_scorer)
+
+
+# Unseen-question order shared by every session's review scheduler
+@registry.resource("question_order", depends=["question_store"])
+def _question_order(store):
+    from utils.scheduler import QuestionOrder
+    return QuestionOrder(store.questions)
+
+
+# Attempt history shared by all sessions; writes are batched off the script thread
+@registry.resource("progress_store", health=lambda progress: progress.ping())
+def _progress_store():
+    from utils.progress_store import ProgressStore, DEFAULT_PROGRESS_DB_PATH
+    return ProgressStore(os.environ.get("PROGRESS_DB_PATH", DEFAULT_PROGRESS_DB_PATH))
+
+
+def _tenant_store(name: str):
+    tenant = get_tenant(name)
+    return tenant.store if tenant is not None else None
+
+
+# Score statistics across all users: read from the attempt history once per
+# process (tenant attempts through the tenant's view of the bank), then
+# updated as each attempt is graded
+@registry.resource("analytics", depends=["question_store", "progress_store"],
+                   health=lambda analytics: f"{analytics.attempts} attempts")
+def _analytics(store, progress):
+    from utils.analytics import Analytics
+    return Analytics.from_history(store, progress.graded_attempts(), tenants=_tenant_store)
+
+
+def _check_evaluator(evaluator):
+    if not evaluator.enabled:
+        return "LLM feedback disabled (no OPENAI_API_KEY)"
+    stats = evaluator.scheduler.stats()
+    return f"{stats['in_flight']} in flight, {stats['queue_depth']} queued, {stats['failed']} failed"
+
+
+# The evaluator owns the background event loop used for LLM calls
+@registry.resource("evaluator", health=_check_evaluator)
+def _evaluator():
+    from utils.evaluator import AnswerEvaluator
+    return AnswerEvaluator()
+
+
+# Grades answers (and starts their LLM feedback) as soon as they are
+# submitted, so "Get AI Feedback" usually finds the result ready
+@registry.resource("feedback_prefetcher", health=lambda prefetcher: f"{prefetcher.pending} pending")
+def _feedback_prefetcher():
+    from utils.speculation import FeedbackPrefetcher
+    return FeedbackPrefetcher(int(os.environ.get("SPECULATIVE_WORKERS", "4")))
+
+
+# Near-duplicate lookup over model answers and evaluated submissions, so a
+# copied or resubmitted answer skips the LLM
+@registry.resource("duplicate_index", health=lambda index: f"{index.submissions} answers")
+def _duplicate_index():
+    from utils.dedup import DuplicateIndex
+    return DuplicateIndex(max_entries=int(os.environ.get("DEDUP_MAX_ENTRIES", "50000")))
+
+
+# Prometheus scrape endpoint, started when METRICS_PORT is set
+@registry.resource("metrics_server")
+def _metrics_server():
+    port = os.environ.get("METRICS_PORT")
+    if metrics.ENABLED and port:
+        return metrics.start_http_server(int(port))
+    return None
+
+
+def get_tenant(name: str):
+    """Overlay store, rubrics and grader for a tenant (see utils.tenant_store),
+    built once per process; None if the tenant has no overlay file."""
+    from utils.tenant_store import tenant_path
+    path = tenant_path(name)
+    if path is None:
+        return None
+    def build(store, rubrics, semantic_scorer):
+        from utils.tenant_store import Tenant
+        return Tenant(name, store, rubrics, semantic_scorer, path)
+
+    registry.register_once(f"tenant:{name}", build, depends=["question_store", "rubrics", "semantic_scorer"],
+                           health=lambda tenant: f"{len(tenant.store.delta_ids)} tenant questions")
+    return registry.get(f"tenant:{name}")
+
+
+def main() -> int:
+    """Build every resource (filling the on-disk vector and embedding caches)
+    and print a health report; run before starting the server."""
+    from dotenv import load_dotenv
+    load_dotenv()
+    started = time.perf_counter()
+    warmup()
+    report = health()
+    print(json.dumps(report, indent=2))
+    print(f"warmed up in {time.perf_counter() - started:.2f}s", file=sys.stderr)
+    return 1 if any(entry["status"] == "error" for entry in report.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
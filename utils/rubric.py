@@ -0,0 +1,488 @@
+import bisect
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+# Words and sentence boundaries in a single regex pass. Phrases never span a
+# boundary token, which is also what the misconception checks key off.
+TOKEN_RE = re.compile(r"\w+|[.!?;\n]")
+BOUNDARIES = frozenset(".!?;\n")
+# Split after every boundary character; since no term spans a boundary, the
+# pieces can be scanned independently with the same hits as a full scan
+SEGMENT_RE = re.compile(r"(?<=[.!?;\n])")
+
+BASE_SCORE = 5
+MAX_CONCEPT_POINTS = 5
+MISCONCEPTION_SCORE = 2
+
+
+def _parse_term(term: str) -> Tuple[Tuple[str, bool], ...]:
+    # "timing diagram*" -> (("timing", False), ("diagram", True)); a trailing
+    # "*" makes that word a prefix match.
+    words = []
+    for word in TOKEN_RE.findall(term.lower()):
+        if word in BOUNDARIES:
+            continue
+        words.append((word, False))
+    if term.rstrip().endswith("*") and words:
+        words[-1] = (words[-1][0], True)
+    return tuple(words)
+
+
+def feedback_title(score: int) -> str:
+    if score >= 9:
+        return "🎉 Excellent Answer!"
+    if score >= 7:
+        return "✅ Good Answer"
+    if score >= 5:
+        return "📚 Average Answer"
+    return "⚠️ Needs Improvement"
+
+
+class CompiledRubric:
+    """Rubric for one question, compiled once into token lookup tables.
+
+    Scoring tokenizes the answer once and does constant-time dictionary
+    lookups per token, so the cost grows with the answer length only.
+    """
+
+    def __init__(self, question: Dict[str, Any]):
+        spec = question.get("rubric", {})
+        self.question_id = question.get("id")
+        self.key_points: List[str] = list(question.get("key_points", []))
+        self.version = hashlib.sha1(
+            json.dumps([self.key_points, spec], sort_keys=True).encode("utf-8")
+        ).hexdigest()[:12]
+
+        self.concepts: List[Dict[str, Any]] = []
+        self.terms: List[str] = []
+        self._term_ids: Dict[Tuple[Tuple[str, bool], ...], int] = {}
+        self._term_concepts: List[List[int]] = []
+        self._exact: Dict[str, List[Tuple[int, Tuple[Tuple[str, bool], ...]]]] = {}
+        self._prefix: Dict[str, List[Tuple[int, Tuple[Tuple[str, bool], ...]]]] = {}
+        self._prefix_lengths: List[int] = []
+
+        concept_specs = spec.get("key_points", {})
+        for name in self.key_points:
+            entry = concept_specs.get(name, [])
+            if isinstance(entry, list):
+                entry = {"terms": entry}
+            # Fall back to the key point's own wording when no synonyms exist
+            terms = entry.get("terms") or [name]
+            concept_id = len(self.concepts)
+            self.concepts.append({
+                "name": name,
+                "weight": entry.get("weight", 1),
+                "hint": entry.get("hint", f"Address the key point: {name}"),
+            })
+            for term in terms:
+                term_id = self._add_term(term)
+                if term_id is not None:
+                    self._term_concepts[term_id].append(concept_id)
+
+        self.misconceptions: List[Dict[str, Any]] = []
+        for entry in spec.get("misconceptions", []):
+            subjects = {}
+            relations = {}
+            for subject, correct in entry["bind"].items():
+                subject_id = self._add_term(subject)
+                subjects[subject_id] = {self._add_term(term) for term in correct}
+                for term in correct:
+                    relations[self._add_term(term)] = term
+            self.misconceptions.append({
+                "subjects": subjects,
+                "relations": set(relations),
+                "message": entry["message"],
+                "corrections": entry.get("corrections", []),
+            })
+
+        self._prefix_lengths = sorted({len(p) for p in self._prefix}, reverse=True)
+        self._total_weight = sum(c["weight"] for c in self.concepts) or 1
+
+    def _add_term(self, term: str):
+        words = _parse_term(term)
+        if not words:
+            return None
+        if words in self._term_ids:
+            return self._term_ids[words]
+        term_id = len(self.terms)
+        self._term_ids[words] = term_id
+        self.terms.append(term.rstrip("*").strip().lower())
+        self._term_concepts.append([])
+        (first, is_prefix), tail = words[0], words[1:]
+        table = self._prefix if is_prefix else self._exact
+        table.setdefault(first, []).append((term_id, tail))
+        return term_id
+
+    def concept_terms(self, concept_id: int) -> List[str]:
+        return [term for term, concepts in zip(self.terms, self._term_concepts) if concept_id in concepts]
+
+    def covered_concepts(self, text: str) -> List[bool]:
+        covered = [False] * len(self.concepts)
+        for term_id, _ in self.scan(text):
+            for concept_id in self._term_concepts[term_id]:
+                covered[concept_id] = True
+        return covered
+
+    def scan(self, text: str) -> List[Tuple[int, int]]:
+        """Return (term id, sentence number) for every term hit, in order."""
+        tokens = TOKEN_RE.findall(text.lower())
+        hits = []
+        sentence = 0
+        exact = self._exact
+        prefix = self._prefix
+        for i, token in enumerate(tokens):
+            if token in BOUNDARIES:
+                sentence += 1
+                continue
+            candidates = exact.get(token, [])
+            for length in self._prefix_lengths:
+                if length <= len(token):
+                    more = prefix.get(token[:length])
+                    if more:
+                        candidates = candidates + more
+            for term_id, tail in candidates:
+                if tail and not self._match_tail(tokens, i + 1, tail):
+                    continue
+                hits.append((term_id, sentence))
+        return hits
+
+    @staticmethod
+    def _match_tail(tokens: List[str], start: int, tail) -> bool:
+        if start + len(tail) > len(tokens):
+            return False
+        for offset, (word, is_prefix) in enumerate(tail):
+            token = tokens[start + offset]
+            if is_prefix:
+                if not token.startswith(word):
+                    return False
+            elif token != word:
+                return False
+        return True
+
+    def _bindings(self, hits: List[Tuple[int, int]]) -> List[Tuple[set, set]]:
+        # Per misconception: the subjects bound to a correct and to a wrong
+        # relation within a sentence
+        bindings = []
+        for misconception in self.misconceptions:
+            subjects = misconception["subjects"]
+            relations = misconception["relations"]
+            right = set()
+            wrong = set()
+            current = None
+            last_sentence = -1
+            for term_id, sentence in hits:
+                if sentence != last_sentence:
+                    current = None
+                    last_sentence = sentence
+                if term_id in subjects:
+                    current = term_id
+                elif term_id in relations and current is not None:
+                    if term_id in subjects[current]:
+                        right.add(current)
+                    else:
+                        wrong.add(current)
+                    current = None
+            bindings.append((right, wrong))
+        return bindings
+
+    def _misconception_hits(self, hits: List[Tuple[int, int]]) -> List[Dict[str, Any]]:
+        found = []
+        for misconception, (right, wrong) in zip(self.misconceptions, self._bindings(hits)):
+            # Only flag a full reversal: every subject bound the wrong way
+            if wrong and wrong == set(misconception["subjects"]) and not right:
+                found.append(misconception)
+        return found
+
+    def score(self, answer: str, semantic: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Score an answer; ``semantic`` is the optional output of
+        SemanticScorer.similarity() for the same answer."""
+        hits = self.scan(answer)
+        strengths = []
+        improvements = []
+        score = BASE_SCORE
+
+        # 1. LENGTH SCORING
+        word_count = len(answer.split())
+        if word_count > 100:
+            score += 3
+            strengths.append("Comprehensive answer with good detail")
+        elif word_count > 60:
+            score += 2
+            strengths.append("Good answer length")
+        elif word_count > 30:
+            score += 1
+            strengths.append("Adequate answer length")
+        else:
+            score -= 2
+            improvements.append("Answer is too brief - aim for at least 50 words")
+
+        # 2. KEY POINT COVERAGE
+        covered = [False] * len(self.concepts)
+        keywords_found = []
+        seen_terms = set()
+        for term_id, _ in hits:
+            for concept_id in self._term_concepts[term_id]:
+                covered[concept_id] = True
+            if self._term_concepts[term_id] and term_id not in seen_terms:
+                seen_terms.add(term_id)
+                keywords_found.append(self.terms[term_id])
+        # Paraphrased key points count even without their rubric keyword, but
+        # only in an answer that uses at least one of the question's keywords
+        on_topic = semantic is not None and bool(keywords_found)
+        if on_topic:
+            covered = [hit or close for hit, close in zip(covered, semantic["covered"])]
+
+        covered_weight = sum(c["weight"] for c, hit in zip(self.concepts, covered) if hit)
+        if covered_weight:
+            score += round(MAX_CONCEPT_POINTS * covered_weight / self._total_weight)
+        elif self.concepts:
+            score -= 2
+        for concept, hit in zip(self.concepts, covered):
+            if hit:
+                strengths.append(f"Covered key point: {concept['name']}")
+            else:
+                improvements.append(concept["hint"])
+        if on_topic and semantic["matches_model"]:
+            score += 1
+            strengths.append("Content closely matches the model answer")
+
+        # 3. MISCONCEPTIONS override the score entirely
+        misconceptions = self._misconception_hits(hits)
+        if misconceptions:
+            score = MISCONCEPTION_SCORE
+            flagged = []
+            for misconception in misconceptions:
+                flagged.append(f"❌ **MAJOR CONCEPT ERROR:** {misconception['message']}")
+                flagged.extend(f"✓ {c}" for c in misconception["corrections"])
+            improvements = flagged + improvements
+
+        score = max(1, min(10, score))
+
+        if score >= 9:
+            strengths.append("Comprehensive and technically accurate")
+        elif score >= 7:
+            if not improvements:
+                improvements.append("Add more examples for even better answer")
+        elif score >= 5:
+            if not improvements:
+                improvements.append("Review key concepts and add more detail")
+        else:
+            if not strengths:
+                strengths.append("You attempted the question - good starting point")
+
+        return {
+            "score": score,
+            "title": feedback_title(score),
+            "strengths": strengths,
+            "improvements": improvements,
+            "word_count": word_count,
+            "covered": [c["name"] for c, hit in zip(self.concepts, covered) if hit],
+            "missing": [c["name"] for c, hit in zip(self.concepts, covered) if not hit],
+            "keywords_found": keywords_found,
+            "misconception": bool(misconceptions),
+            "semantic_similarity": semantic["model_similarity"] if semantic is not None else None,
+            "rubric_version": self.version,
+        }
+
+
+class LiveHints:
+    """Key-point coverage for an answer that is being edited.
+
+    The answer is kept as a list of sentence segments, each with its term
+    hits, word count and misconception bindings, plus running totals. An
+    update finds the changed character range, re-splits and rescans only the
+    segments it touches and adjusts the totals, so a small edit costs tens of
+    microseconds however long the answer is. For callers that send every
+    keystroke, updates closer together than ``min_interval`` seconds are
+    deferred (``pending``) and folded into the next update or ``flush()``.
+    """
+
+    def __init__(self, rubric: CompiledRubric, min_interval: float = 0.0):
+        self.rubric = rubric
+        self.min_interval = min_interval
+        self.text = ""
+        self.pending: Optional[str] = None
+        self._segments: List[str] = []
+        self._starts: List[int] = []
+        self._words: List[int] = []
+        self._hits: List[Tuple[List[int], List[Tuple[set, set]]]] = []
+        self._word_count = 0
+        self._term_counts = [0] * len(rubric.terms)
+        self._concept_counts = [0] * len(rubric.concepts)
+        # Per misconception and subject: sentences binding it right / wrong
+        self._right = [dict.fromkeys(m["subjects"], 0) for m in rubric.misconceptions]
+        self._wrong = [dict.fromkeys(m["subjects"], 0) for m in rubric.misconceptions]
+        self._updated_at = float("-inf")
+        self._result = self._summary()
+
+    def _apply(self, entry, delta: int):
+        term_ids, bindings = entry
+        term_concepts = self.rubric._term_concepts
+        for term_id in term_ids:
+            self._term_counts[term_id] += delta
+            for concept_id in term_concepts[term_id]:
+                self._concept_counts[concept_id] += delta
+        for index, (right, wrong) in enumerate(bindings):
+            for subject in right:
+                self._right[index][subject] += delta
+            for subject in wrong:
+                self._wrong[index][subject] += delta
+
+    def _scan_segment(self, segment: str):
+        hits = self.rubric.scan(segment)
+        bindings = self.rubric._bindings(hits) if hits and self.rubric.misconceptions else []
+        return [term_id for term_id, _ in hits], bindings
+
+    @staticmethod
+    def _common_prefix(a: str, b: str) -> int:
+        # Binary search with slice comparisons: O(n) memcmp, O(log n) steps
+        low, high = 0, min(len(a), len(b))
+        while low < high:
+            mid = (low + high + 1) // 2
+            if a[low:mid] == b[low:mid]:
+                low = mid
+            else:
+                high = mid - 1
+        return low
+
+    def _segment_words(self, index: int) -> int:
+        # A word split by a boundary character ("e.g") is counted once
+        segment = self._segments[index]
+        words = len(segment.split())
+        if index and segment[:1] and not segment[0].isspace() and not self._segments[index - 1][-1].isspace():
+            words -= 1
+        return words
+
+    def _rescan(self, text: str):
+        old = self.text
+        if not self._segments:
+            first, last = 0, -1
+            window_start, old_window_end = 0, len(old)
+        else:
+            prefix = self._common_prefix(old, text)
+            limit = min(len(old), len(text)) - prefix
+            suffix = self._common_prefix(old[::-1][:limit], text[::-1][:limit])
+            first = max(0, bisect.bisect_right(self._starts, prefix) - 1)
+            last = max(first, bisect.bisect_right(self._starts, len(old) - suffix) - 1)
+            window_start = self._starts[first]
+            old_window_end = self._starts[last + 1] if last + 1 < len(self._starts) else len(old)
+        delta = len(text) - len(old)
+        window = text[window_start:old_window_end + delta]
+        segments = [segment for segment in SEGMENT_RE.split(window) if segment]
+        starts = []
+        offset = window_start
+        for segment in segments:
+            starts.append(offset)
+            offset += len(segment)
+
+        for entry in self._hits[first:last + 1]:
+            self._apply(entry, -1)
+        entries = [self._scan_segment(segment) for segment in segments]
+        for entry in entries:
+            self._apply(entry, 1)
+
+        self._segments[first:last + 1] = segments
+        self._hits[first:last + 1] = entries
+        self._starts[first:] = starts + [start + delta for start in self._starts[last + 1:]]
+        self.text = text
+        # Word counts of the new segments and of the one after them, whose
+        # neighbour changed
+        end = min(first + len(segments) + 1, len(self._segments))
+        self._word_count -= sum(self._words[first:min(last + 2, len(self._words))])
+        self._words[first:min(last + 2, len(self._words))] = [self._segment_words(i) for i in range(first, end)]
+        self._word_count += sum(self._words[first:end])
+
+    def _summary(self) -> Dict[str, Any]:
+        rubric = self.rubric
+        covered = [count > 0 for count in self._concept_counts]
+        misconception = None
+        for m, right, wrong in zip(rubric.misconceptions, self._right, self._wrong):
+            # Same rule as scoring: every subject bound the wrong way, none right
+            if all(wrong.values()) and not any(right.values()):
+                misconception = m["message"]
+                break
+        return {
+            "covered": [c["name"] for c, hit in zip(rubric.concepts, covered) if hit],
+            "missing": [c["name"] for c, hit in zip(rubric.concepts, covered) if not hit],
+            "coverage": sum(c["weight"] for c, hit in zip(rubric.concepts, covered) if hit)
+            / rubric._total_weight,
+            "keywords_found": [term for term, count, concepts in
+                               zip(rubric.terms, self._term_counts, rubric._term_concepts)
+                               if count and concepts],
+            "misconception": misconception,
+            "word_count": self._word_count,
+            "pending": self.pending is not None,
+        }
+
+    def update(self, text: str, now: Optional[float] = None) -> Dict[str, Any]:
+        now = time.monotonic() if now is None else now
+        if text == self.text and self.pending is None:
+            return self._result
+        if now - self._updated_at < self.min_interval:
+            self.pending = text
+            self._result["pending"] = True
+            return self._result
+        self.pending = None
+        self._rescan(text)
+        self._updated_at = now
+        self._result = self._summary()
+        return self._result
+
+    def flush(self) -> Dict[str, Any]:
+        """Apply a deferred update now."""
+        if self.pending is not None:
+            return self.update(self.pending, now=self._updated_at + self.min_interval)
+        return self._result
+
+
+def compile_rubrics(questions: List[Dict[str, Any]]) -> Dict[Any, CompiledRubric]:
+    return {q["id"]: CompiledRubric(q) for q in questions}
+
+
+class LazyRubrics(Mapping):
+    """Compiled rubrics for a QuestionStore, compiled on first use.
+
+    A compiled rubric is far larger than its question, so only the
+    ``maxsize`` most recently used ones are kept; an evicted rubric is
+    simply compiled again. Behaves like the dict ``compile_rubrics`` returns.
+    """
+
+    def __init__(self, store, maxsize: int = 4096,
+                 compiled: Optional[Callable[[int], CompiledRubric]] = None):
+        self.store = store
+        self.maxsize = maxsize
+        # Loads a prebuilt rubric by bank position (see utils.build_bank)
+        self.compiled = compiled
+        self._cache: "OrderedDict[Any, CompiledRubric]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getitem__(self, question_id) -> CompiledRubric:
+        with self._lock:
+            rubric = self._cache.get(question_id)
+            if rubric is not None:
+                self._cache.move_to_end(question_id)
+                return rubric
+        if self.compiled is not None:
+            rubric = self.compiled(self.store.position(question_id))
+        else:
+            rubric = CompiledRubric(self.store.get(question_id))
+        with self._lock:
+            self._cache[question_id] = rubric
+            if len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        return rubric
+
+    def __contains__(self, question_id) -> bool:
+        return question_id in self.store
+
+    def __iter__(self):
+        return (question["id"] for question in self.store.questions)
+
+    def __len__(self) -> int:
+        return len(self.store)
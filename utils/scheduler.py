@@ -0,0 +1,195 @@
+import heapq
+import time
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+from utils.question_store import DIFFICULTY_ORDER
+
+DAY = 86400.0
+
+# A failed answer comes back within the same practice session
+RELEARN_DELAY = 600.0
+
+
+def quality_from_score(score: int) -> int:
+    """Map a 1-10 grade onto SM-2's 0-5 recall quality."""
+    return max(0, min(5, round(score / 2)))
+
+
+class Card:
+    __slots__ = ("question_id", "easiness", "interval", "repetitions", "due", "last_score", "skips")
+
+    def __init__(self, question_id):
+        self.question_id = question_id
+        self.easiness = 2.5
+        self.interval = 0.0
+        self.repetitions = 0
+        self.due = 0.0
+        self.last_score: Optional[int] = None
+        self.skips = 0
+
+    def review(self, score: int, now: float):
+        # SM-2: successful recalls grow the interval by the easiness factor,
+        # failures restart the sequence
+        quality = quality_from_score(score)
+        if quality < 3:
+            self.repetitions = 0
+            self.interval = 0.0
+            self.due = now + RELEARN_DELAY
+        else:
+            self.repetitions += 1
+            if self.repetitions == 1:
+                self.interval = 1.0
+            elif self.repetitions == 2:
+                self.interval = 6.0
+            else:
+                self.interval = round(self.interval * self.easiness, 2)
+            self.due = now + self.interval * DAY
+        self.easiness = max(1.3, self.easiness + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+        self.last_score = score
+
+
+class QuestionOrder:
+    """The order unseen questions are offered in, shared by every user's
+    scheduler: the ids of each (category, difficulty) pair in bank order,
+    and each question's pair and position. Built once per bank."""
+
+    def __init__(self, questions: Iterable[Dict[str, Any]]):
+        self.meta: Dict[Any, Tuple[str, str, int]] = {}
+        self.queues: Dict[Tuple[str, str], List[Any]] = {}
+        for position, question in enumerate(questions):
+            pair = (question["category"], question["difficulty"])
+            self.meta[question["id"]] = pair + (position,)
+            self.queues.setdefault(pair, []).append(question["id"])
+
+    def __contains__(self, question_id) -> bool:
+        return question_id in self.meta
+
+
+class SpacedRepetitionScheduler:
+    """Picks the next question for one user.
+
+    Only questions the user has answered or skipped get a Card. Each
+    (category, difficulty) pair has an indexed priority queue of reviews
+    ordered by due time and weakness (low last score, low easiness), a small
+    queue of skipped unseen questions, and a cursor into the shared
+    QuestionOrder for the untouched ones, easiest first. Picking under the
+    sidebar filters compares only the heads of the matching queues: a due
+    review wins, then an unseen question, then the review due soonest. A
+    review pushes a new entry and the superseded one is skipped lazily, so
+    picking and reviewing are both O(log n), and a session costs memory in
+    proportion to its history rather than to the bank.
+    """
+
+    def __init__(self, order: QuestionOrder, history: Iterable[Tuple[Any, int, float]] = ()):
+        self.order = order
+        self.cards: Dict[Any, Card] = {}
+        self._versions: Dict[Any, int] = {}
+        self._new: Dict[Tuple[str, str], List[list]] = {}
+        self._reviews: Dict[Tuple[str, str], List[list]] = {}
+        # Position in each shared queue before which every id has a Card
+        self._cursors: Dict[Tuple[str, str], int] = dict.fromkeys(order.queues, 0)
+        for question_id, score, reviewed_at in history:
+            if question_id in order:
+                self._card(question_id).review(score, reviewed_at)
+        for question_id in self.cards:
+            self._reviews.setdefault(self.order.meta[question_id][:2], []).append(self._entry(question_id))
+        for heap in self._reviews.values():
+            heapq.heapify(heap)
+
+    def _card(self, question_id) -> Card:
+        card = self.cards.get(question_id)
+        if card is None:
+            card = self.cards[question_id] = Card(question_id)
+            self._versions[question_id] = 0
+        return card
+
+    def _entry(self, question_id) -> list:
+        card = self.cards.get(question_id)
+        _, difficulty, position = self.order.meta[question_id]
+        if card is None or card.last_score is None:
+            skips = card.skips if card is not None else 0
+            key = (skips, DIFFICULTY_ORDER.get(difficulty, len(DIFFICULTY_ORDER)), position)
+        else:
+            key = (card.due, card.last_score, card.easiness, position)
+        return [key, question_id, self._versions.get(question_id, 0)]
+
+    def review(self, question_id, score: int, now: Optional[float] = None):
+        if question_id not in self.order:
+            return
+        self._card(question_id).review(score, time.time() if now is None else now)
+        self._versions[question_id] += 1
+        heapq.heappush(self._reviews.setdefault(self.order.meta[question_id][:2], []), self._entry(question_id))
+
+    def skip(self, question_id, now: Optional[float] = None):
+        """Move a question the user passed over without answering behind the
+        others in its queue, leaving its review schedule untouched."""
+        if question_id not in self.order:
+            return
+        card = self._card(question_id)
+        card.skips += 1
+        if card.last_score is not None:
+            card.due = max(card.due, (time.time() if now is None else now) + RELEARN_DELAY)
+        self._versions[question_id] += 1
+        heaps = self._reviews if card.last_score is not None else self._new
+        heapq.heappush(heaps.setdefault(self.order.meta[question_id][:2], []), self._entry(question_id))
+
+    def _head(self, heap: List[list], exclude) -> Optional[list]:
+        # Drop stale entries; step over the excluded question without losing it
+        skipped = None
+        while heap:
+            entry = heap[0]
+            if entry[2] != self._versions[entry[1]]:
+                heapq.heappop(heap)
+                continue
+            if entry[1] == exclude and skipped is None:
+                skipped = heapq.heappop(heap)
+                continue
+            break
+        head = heap[0] if heap else None
+        if skipped is not None:
+            heapq.heappush(heap, skipped)
+        return head
+
+    def _unseen(self, pair: Tuple[str, str], exclude) -> Optional[list]:
+        # Head of the shared queue past the questions this user has a Card for
+        queue = self.order.queues[pair]
+        cursor = self._cursors[pair]
+        while cursor < len(queue) and queue[cursor] in self.cards:
+            cursor += 1
+        self._cursors[pair] = cursor
+        while cursor < len(queue):
+            question_id = queue[cursor]
+            if question_id not in self.cards and question_id != exclude:
+                return self._entry(question_id)
+            cursor += 1
+        return None
+
+    def _best(self, heaps: Dict[Tuple[str, str], List[list]], category, difficulty, exclude, unseen=False):
+        best = None
+        for pair in self.order.queues:
+            if category and pair[0] != category:
+                continue
+            if difficulty and pair[1] != difficulty:
+                continue
+            heads = [self._head(heaps[pair], exclude) if pair in heaps else None]
+            if unseen:
+                heads.append(self._unseen(pair, exclude))
+            for head in heads:
+                if head is not None and (best is None or head[0] < best[0]):
+                    best = head
+        return best
+
+    def next_question(self, category: Optional[str] = None, difficulty: Optional[str] = None,
+                      exclude=None, now: Optional[float] = None):
+        """Return the id of the question to practise next (``exclude`` if
+        nothing else matches the filters)."""
+        now = time.time() if now is None else now
+        review = self._best(self._reviews, category, difficulty, exclude)
+        if review is not None and review[0][0] <= now:
+            return review[1]
+        new = self._best(self._new, category, difficulty, exclude, unseen=True)
+        if new is not None:
+            return new[1]
+        if review is not None:
+            return review[1]
+        return exclude
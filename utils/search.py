@@ -0,0 +1,246 @@
+import itertools
+import math
+import re
+from array import array
+from collections import Counter
+from typing import IO, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Field boosts (BM25F): a word in the question counts three times as much as
+# the same word in the model answer
+FIELD_WEIGHTS = {"question": 3.0, "key_points": 2.0, "model_answer": 1.0}
+FIELDS = tuple(FIELD_WEIGHTS)
+K1 = 1.2
+B = 0.75
+
+# Query words this long also match longer words ("metast" finds
+# "metastability"), which score PREFIX_WEIGHT of an exact match
+MIN_PREFIX = 3
+PREFIX_WEIGHT = 0.5
+
+# Longer words are indexed (and looked up) by their first bytes only
+MAX_TERM_BYTES = 24
+
+_WORD_RE = re.compile(r"[^\W_]+")
+
+# Per-field term frequencies of one document, and its field lengths
+Analysis = Tuple[Dict[bytes, Tuple[int, ...]], Tuple[int, ...]]
+
+
+def tokenize(text: str) -> List[bytes]:
+    return [word.encode("utf-8")[:MAX_TERM_BYTES] for word in _WORD_RE.findall(text.lower())]
+
+
+def analyze(document: Dict[str, str]) -> Analysis:
+    terms: Dict[bytes, List[int]] = {}
+    lengths = []
+    for field_number, field in enumerate(FIELDS):
+        tokens = tokenize(document.get(field) or "")
+        lengths.append(len(tokens))
+        for term, count in Counter(tokens).items():
+            terms.setdefault(term, [0] * len(FIELDS))[field_number] = count
+    return {term: tuple(counts) for term, counts in terms.items()}, tuple(lengths)
+
+
+def question_document(question, model_answer: str) -> Dict[str, str]:
+    """The searchable fields of a question."""
+    return {
+        "question": question["question"],
+        "key_points": "\n".join(question.get("key_points") or ()),
+        "model_answer": model_answer,
+    }
+
+
+def _successor(prefix: bytes) -> bytes:
+    # Smallest byte string greater than every string starting with
+    # ``prefix``; UTF-8 never contains 0xff, so the last byte can be bumped
+    return prefix[:-1] + bytes([prefix[-1] + 1])
+
+
+def bits_to_mask(bits: int, size: int) -> np.ndarray:
+    data = np.frombuffer(bits.to_bytes((size + 7) // 8, "little"), dtype=np.uint8)
+    return np.unpackbits(data, bitorder="little", count=size).astype(bool)
+
+
+def mask_to_bits(mask: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(mask, bitorder="little").tobytes(), "little")
+
+
+def top(positions: np.ndarray, scores: np.ndarray, k: int) -> np.ndarray:
+    """The ``k`` best of ``positions`` by score (ties in bank order)."""
+    if len(positions) > k:
+        kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+        better = scores > kth
+        ties = np.flatnonzero(scores == kth)[:k - int(better.sum())]
+        keep = np.concatenate([np.flatnonzero(better), ties])
+        positions, scores = positions[keep], scores[keep]
+    return positions[np.lexsort((positions, -scores))]
+
+
+def ranked(scores: np.ndarray, bits: int, k: int) -> Tuple[int, List[int], List[float]]:
+    """Among the documents in ``bits`` that match (score above 0): how many
+    there are, and the positions and scores of the best ``k``."""
+    positions = np.flatnonzero(bits_to_mask(bits, len(scores)) & (scores > 0))
+    best = top(positions, scores[positions], k)
+    return len(positions), best.tolist(), scores[best].tolist()
+
+
+class _Vocabulary(dict):
+    # word -> term id; words that share their first MAX_TERM_BYTES bytes
+    # share a term
+    def __init__(self, terms: Dict[bytes, int]):
+        super().__init__()
+        self.terms = terms
+
+    def __missing__(self, word: str) -> int:
+        term_id = self[word] = self.terms.setdefault(word.encode("utf-8")[:MAX_TERM_BYTES], len(self.terms))
+        return term_id
+
+
+class SearchIndex:
+    """BM25F inverted index over question text, key points and model answers.
+
+    Held in a handful of numpy arrays: the sorted vocabulary, and for each
+    term a contiguous run of (document, impact) postings, where the impact is
+    the term's whole BM25F contribution to that document. A query word is one
+    binary search (a prefix is a range of adjacent terms, so one slice of
+    postings) and a bincount over it.
+    """
+
+    def __init__(self, terms: np.ndarray, offsets: np.ndarray, documents: np.ndarray,
+                 impacts: np.ndarray, size: int, average_lengths: np.ndarray):
+        self.terms = terms
+        self.offsets = offsets
+        self.documents = documents
+        self.impacts = impacts
+        self.size = size
+        self.average_lengths = average_lengths
+
+    @classmethod
+    def build(cls, documents: Iterable[Dict[str, str]]) -> "SearchIndex":
+        # One posting per (term, document, field) while reading; fields are
+        # merged into one impact per (term, document) with numpy at the end
+        terms: Dict[bytes, int] = {}
+        vocabulary = _Vocabulary(terms)
+        term_ids = array("I")
+        document_ids = array("I")
+        field_ids = array("B")
+        frequencies = array("I")
+        lengths = array("I")
+        size = 0
+        for document_id, document in enumerate(documents):
+            size += 1
+            for field_number, field in enumerate(FIELDS):
+                words = _WORD_RE.findall((document.get(field) or "").lower())
+                lengths.append(len(words))
+                counts = Counter(words)
+                term_ids.extend(map(vocabulary.__getitem__, counts))
+                frequencies.extend(counts.values())
+                document_ids.extend(itertools.repeat(document_id, len(counts)))
+                field_ids.extend(itertools.repeat(field_number, len(counts)))
+        lengths = np.frombuffer(lengths, dtype=np.uint32).reshape(size, len(FIELDS)).astype(np.float64)
+        average_lengths = np.maximum(lengths.mean(axis=0) if size else np.zeros(len(FIELDS)), 1.0)
+
+        # Postings grouped by term in vocabulary order, documents ascending
+        vocabulary_order = sorted(terms)
+        rank = np.empty(len(terms), dtype=np.int64)
+        rank[[terms[term] for term in vocabulary_order]] = np.arange(len(terms))
+        term_ranks = rank[np.frombuffer(term_ids, dtype=np.uint32)]
+        document_ids = np.frombuffer(document_ids, dtype=np.uint32)
+        order = np.lexsort((document_ids, term_ranks))
+        term_ranks, document_ids = term_ranks[order], document_ids[order]
+        field_ids = np.frombuffer(field_ids, dtype=np.uint8)[order]
+        norms = 1 - B + B * lengths[document_ids, field_ids] / average_lengths[field_ids]
+        weighted = (np.array(list(FIELD_WEIGHTS.values()))[field_ids]
+                    * np.frombuffer(frequencies, dtype=np.uint32)[order] / norms)
+        first = np.flatnonzero(np.r_[True, (term_ranks[1:] != term_ranks[:-1])
+                                     | (document_ids[1:] != document_ids[:-1])]) if len(order) else order
+        weighted = np.add.reduceat(weighted, first) if len(first) else weighted
+        term_ranks, document_ids = term_ranks[first], document_ids[first]
+
+        counts = np.bincount(term_ranks, minlength=len(terms))
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        idf = np.log1p((size - counts + 0.5) / (counts + 0.5))
+        impacts = idf[term_ranks] * weighted * (K1 + 1) / (K1 + weighted)
+        return cls(np.array(vocabulary_order, dtype=f"S{MAX_TERM_BYTES}"), offsets, document_ids.copy(),
+                   impacts.astype(np.float32), size, average_lengths)
+
+    @classmethod
+    def from_store(cls, store) -> "SearchIndex":
+        return cls.build(
+            question_document(question, model_answer)
+            for question, (_, model_answer) in zip(store.questions, store.iter_model_answers())
+        )
+
+    def save(self, f: IO[bytes]):
+        np.savez(f, terms=self.terms, offsets=self.offsets, documents=self.documents, impacts=self.impacts,
+                 size=np.int64(self.size), average_lengths=self.average_lengths)
+
+    @classmethod
+    def load(cls, path: str) -> "SearchIndex":
+        with np.load(path) as arrays:
+            return cls(arrays["terms"], arrays["offsets"], arrays["documents"], arrays["impacts"],
+                       int(arrays["size"]), arrays["average_lengths"])
+
+    @property
+    def term_count(self) -> int:
+        return len(self.terms)
+
+    def _range(self, word: bytes) -> Tuple[int, int, int]:
+        # Terms [start, end) match ``word``; [start, exact_end) exactly
+        start = int(np.searchsorted(self.terms, word))
+        exact_end = start + int(start < len(self.terms) and self.terms[start] == word)
+        end = int(np.searchsorted(self.terms, _successor(word))) if len(word) >= MIN_PREFIX else exact_end
+        return start, exact_end, end
+
+    def scores(self, text: str) -> Optional[np.ndarray]:
+        """BM25F score of every document for ``text``; documents that miss
+        any query word score 0. None if ``text`` has no words."""
+        words = list(dict.fromkeys(tokenize(text)))
+        if not words:
+            return None
+        total = np.zeros(self.size)
+        for word in words:
+            start, exact_end, end = self._range(word)
+            first, last = self.offsets[start], self.offsets[end]
+            impacts = self.impacts[first:last]
+            if exact_end < end:
+                impacts = impacts.astype(np.float64)
+                impacts[self.offsets[exact_end] - first:] *= PREFIX_WEIGHT
+            word_scores = np.bincount(self.documents[first:last], weights=impacts, minlength=self.size)
+            total[word_scores == 0] = -np.inf
+            total += word_scores
+        total[np.isneginf(total)] = 0
+        return total
+
+    def bitmap(self, text: str) -> Optional[int]:
+        """Bitset of the documents matching ``text``, or None if it has no words."""
+        scores = self.scores(text)
+        return None if scores is None else mask_to_bits(scores > 0)
+
+    def score(self, analysis: Analysis, text: str) -> float:
+        """Score of a document outside the index (e.g. a cohort's own
+        question), using the index's term and length statistics."""
+        terms, lengths = analysis
+        norms = [1 - B + B * length / average for length, average in zip(lengths, self.average_lengths)]
+        total = 0.0
+        for word in dict.fromkeys(tokenize(text)):
+            word_score = 0.0
+            for term, counts in terms.items():
+                if term == word:
+                    weight = 1.0
+                elif len(word) >= MIN_PREFIX and term.startswith(word):
+                    weight = PREFIX_WEIGHT
+                else:
+                    continue
+                start, exact_end, _ = self._range(term)
+                frequency = int(self.offsets[exact_end] - self.offsets[start])
+                idf = math.log1p((self.size - frequency + 0.5) / (frequency + 0.5))
+                weighted = sum(w * c / n for w, c, n in zip(FIELD_WEIGHTS.values(), counts, norms))
+                word_score += weight * idf * weighted * (K1 + 1) / (K1 + weighted)
+            if not word_score:
+                return 0.0
+            total += word_score
+        return total
@@ -0,0 +1,129 @@
+from typing import Dict, Any, List, Optional, Sequence
+
+import numpy as np
+
+from utils.embeddings import EmbeddingCache, EmbeddingProvider, get_embedder
+from utils.rubric import CompiledRubric
+
+# Cosine thresholds for the offline hashing embedder; paraphrases of the
+# model answer score well over these
+KEY_POINT_THRESHOLD = 0.2
+MODEL_ANSWER_THRESHOLD = 0.25
+
+# Character n-grams make any English text somewhat similar to any other, so
+# a match must also beat the answer's best similarity to the same kind of
+# row in other questions (its null baseline) by this margin. Off-topic or
+# generic text is about as close to every question and gains nothing
+NULL_MARGIN = 0.1
+# Questions sampled for the null baseline
+NULL_SAMPLE_QUESTIONS = 64
+
+
+def key_point_texts(rubric: CompiledRubric, model_answer: str) -> List[str]:
+    # Describe each key point by its name, its rubric synonyms and the model
+    # answer lines that mention it
+    lines = [line.strip() for line in model_answer.split("\n") if line.strip()]
+    line_concepts = [rubric.covered_concepts(line) for line in lines]
+    texts = []
+    for concept_id, concept in enumerate(rubric.concepts):
+        related = [line for line, covered in zip(lines, line_concepts) if covered[concept_id]]
+        texts.append(". ".join([concept["name"], " ".join(rubric.concept_terms(concept_id))] + related))
+    return texts
+
+
+def question_block(rubric: CompiledRubric, model_answer: str) -> List[str]:
+    """Texts embedded for one question: the model answer, then each key point."""
+    return [model_answer] + key_point_texts(rubric, model_answer)
+
+
+class SemanticScorer:
+    """Precomputed model-answer and key-point vectors for a question bank.
+
+    Vectors live in one matrix (or, for a prebuilt bank, one per shard); a
+    question owns a contiguous block of rows (model answer first, then its
+    key points), so scoring an answer is one encode plus one small
+    matrix-vector product.
+    """
+
+    def __init__(self, questions, rubrics: Dict[Any, CompiledRubric],
+                 embedder: Optional[EmbeddingProvider] = None,
+                 cache: Optional[EmbeddingCache] = None):
+        self.embedder = embedder or get_embedder()
+        cache = cache or EmbeddingCache(self.embedder)
+        self._blocks: Dict[Any, tuple] = {}
+        keys = []
+        texts = []
+        for question_id, model_answer in questions.iter_model_answers():
+            rubric = rubrics[question_id]
+            block = question_block(rubric, model_answer)
+            version = f"{questions.content_hash(question_id)}:{rubric.version}"
+            self._blocks[question_id] = (0, len(texts), len(texts) + len(block))
+            keys.extend(f"{version}:{i}" for i in range(len(block)))
+            texts.extend(block)
+        self._matrices = [cache.encode(keys, texts) if texts else np.zeros((0, self.embedder.dim), np.float32)]
+        self._sample_null()
+
+    @classmethod
+    def from_matrices(cls, matrices: Sequence[np.ndarray], blocks: Dict[Any, tuple],
+                    embedder: Optional[EmbeddingProvider] = None) -> "SemanticScorer":
+        """A scorer over vectors computed ahead of time (see utils.build_bank);
+        ``blocks`` maps each question id to its (matrix, start, end) rows."""
+        scorer = cls.__new__(cls)
+        scorer.embedder = embedder or get_embedder()
+        scorer._blocks = blocks
+        scorer._matrices = list(matrices)
+        scorer._sample_null()
+        return scorer
+
+    def _sample_null(self):
+        # Model-answer and key-point rows of a fixed sample of questions,
+        # with the sample position of the question each row belongs to
+        question_ids = list(self._blocks)
+        chosen = np.random.default_rng(0).choice(
+            len(question_ids), size=min(NULL_SAMPLE_QUESTIONS, len(question_ids)), replace=False)
+        models, points, point_owners = [], [], []
+        self._null_positions: Dict[Any, int] = {}
+        for position, index in enumerate(sorted(chosen)):
+            question_id = question_ids[index]
+            shard, start, end = self._blocks[question_id]
+            rows = np.asarray(self._matrices[shard][start:end])
+            self._null_positions[question_id] = position
+            models.append(rows[0])
+            points.extend(rows[1:])
+            point_owners.extend([position] * (len(rows) - 1))
+        dim = self.embedder.dim
+        self._null_models = np.array(models, dtype=np.float32).reshape(-1, dim)
+        self._null_points = np.array(points, dtype=np.float32).reshape(-1, dim)
+        self._null_point_owners = np.array(point_owners, dtype=np.int64)
+
+    def _baselines(self, question_id, vector: np.ndarray) -> tuple:
+        """The answer's best similarity to another question's model answer
+        and to another question's key point."""
+        position = self._null_positions.get(question_id, -1)
+        models = self._null_models @ vector
+        points = self._null_points @ vector
+        if position >= 0:
+            models = np.delete(models, position)
+            points = points[self._null_point_owners != position]
+        return (float(models.max()) if len(models) else -1.0,
+                float(points.max()) if len(points) else -1.0)
+
+    def similarity(self, question_id, answer: str) -> Dict[str, Any]:
+        return self._result(question_id, self.embedder.encode([answer])[0])
+
+    def similarity_many(self, question_ids: Sequence[Any], answers: Sequence[str]) -> List[Dict[str, Any]]:
+        """Score many answers with a single batched encode."""
+        vectors = self.embedder.encode(list(answers))
+        return [self._result(question_id, vector) for question_id, vector in zip(question_ids, vectors)]
+
+    def _result(self, question_id, vector: np.ndarray) -> Dict[str, Any]:
+        shard, start, end = self._blocks[question_id]
+        scores = self._matrices[shard][start:end] @ vector
+        key_point_scores = scores[1:]
+        model_baseline, point_baseline = self._baselines(question_id, vector)
+        return {
+            "model_similarity": float(scores[0]),
+            "matches_model": bool(scores[0] >= max(MODEL_ANSWER_THRESHOLD, model_baseline + NULL_MARGIN)),
+            "key_point_scores": [float(s) for s in key_point_scores],
+            "covered": (key_point_scores >= max(KEY_POINT_THRESHOLD, point_baseline + NULL_MARGIN)).tolist(),
+        }
@@ -0,0 +1,112 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Any, Optional, Tuple
+
+from utils import metrics
+
+
+class Speculation:
+    """Feedback for one submitted answer, computed before it is asked for.
+
+    ``result()`` returns (rubric feedback, FeedbackStream or None); the
+    stream's LLM call is already running, so iterating it replays what has
+    arrived so far and then continues live.
+    """
+
+    def __init__(self, question_id, answer: str, future: "Future"):
+        self.question_id = question_id
+        self.answer = answer
+        self.future = future
+
+    def matches(self, question_id, answer: str) -> bool:
+        return question_id == self.question_id and answer == self.answer
+
+    def result(self, timeout: Optional[float] = None) -> Tuple[Dict[str, Any], Any]:
+        return self.future.result(timeout)
+
+    def cancel(self):
+        """Drop the work: not started yet, it never runs; already running or
+        done, its LLM call is cancelled."""
+        if not self.future.cancel():
+            self.future.add_done_callback(_cancel_stream)
+
+
+def _cancel_stream(future: "Future"):
+    if future.cancelled() or future.exception() is not None:
+        return
+    stream = future.result()[1]
+    if stream is not None:
+        stream.cancel()
+
+
+COPIED_NOTICE = ("This answer is nearly identical to the model answer, so it was not sent for AI "
+                 "feedback and does not count towards your progress. Try answering in your own words.")
+REUSED_NOTICE = "Nearly identical to an earlier answer, so its evaluation is reused."
+
+
+def _duplicate_feedback(feedback: Dict[str, Any], match) -> Dict[str, Any]:
+    kind = match.payload["kind"]
+    metrics.inc("duplicate_answers_total", kind=kind)
+    if kind == "model_answer":
+        return dict(feedback, duplicate_of=kind, similarity=match.similarity, source="copied",
+                    title="Copied from the Model Answer", notice=COPIED_NOTICE)
+    return dict(match.payload["feedback"], word_count=feedback["word_count"], duplicate_of=kind,
+                similarity=match.similarity, notice=REUSED_NOTICE)
+
+
+def prepare_feedback(grader, evaluator, store, rubrics, question: Dict[str, Any], answer: str,
+                     duplicates=None, scope=None) -> Tuple[Dict[str, Any], Any]:
+    """Grade ``answer`` and start its LLM feedback: (rubric feedback, started
+    FeedbackStream, or None when the LLM is disabled).
+
+    With a DuplicateIndex, an answer that is a near-copy of the model answer
+    or of an earlier submission in ``scope`` gets no LLM call: the former is
+    flagged as copied (``duplicate_of``), the latter reuses that evaluation.
+    """
+    feedback = grader.grade(question["id"], answer)
+    if duplicates is not None:
+        duplicates.seed(scope, lambda: store.get_model_answer(question["id"]))
+        match = duplicates.find(scope, answer)
+        if match is not None:
+            return _duplicate_feedback(feedback, match), None
+    if not evaluator.enabled:
+        return feedback, None
+    stream = evaluator.stream_feedback(
+        question=question["question"],
+        model_answer=store.get_model_answer(question["id"]),
+        user_answer=answer,
+        category=question["category"],
+        difficulty=question["difficulty"],
+        fallback=feedback,
+        question_id=question["id"],
+        version=f"{store.content_hash(question['id'])}:{rubrics[question['id']].version}",
+    )
+    return feedback, stream.start()
+
+
+class FeedbackPrefetcher:
+    """Shared worker pool that grades submitted answers and starts their LLM
+    feedback while the candidate is still looking at the page."""
+
+    def __init__(self, max_workers: int = 4):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="speculate")
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def submit(self, grader, evaluator, store, rubrics, question: Dict[str, Any], answer: str,
+               duplicates=None, scope=None) -> Speculation:
+        with self._lock:
+            self._pending += 1
+        future = self._executor.submit(prepare_feedback, grader, evaluator, store, rubrics, question, answer,
+                                       duplicates, scope)
+        future.add_done_callback(self._done)
+        metrics.inc("speculative_feedback_total", outcome="started")
+        return Speculation(question["id"], answer, future)
+
+    def _done(self, future: "Future"):
+        with self._lock:
+            self._pending -= 1
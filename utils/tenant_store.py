@@ -0,0 +1,331 @@
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import re
+from collections import ChainMap
+from typing import Dict, Any, Iterator, List, Optional, Sequence, Tuple
+
+from utils.question_store import (QuestionStore, DEFAULT_QUESTIONS_PATH, DIFFICULTY_ORDER, FACET_FIELDS,
+                                  bit_positions)
+from utils.search import Analysis, analyze, question_document, ranked
+
+DEFAULT_TENANTS_DIR = os.path.join(os.path.dirname(DEFAULT_QUESTIONS_PATH), "tenants")
+
+# Tenant names come from the URL, so they are restricted to safe file names
+TENANT_NAME_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
+
+REQUIRED_FIELDS = ("id", "category", "difficulty", "question")
+
+
+def tenant_path(tenant: str, tenants_dir: Optional[str] = None) -> Optional[str]:
+    """Overlay file for ``tenant``, or None if the name is invalid or unknown."""
+    if not tenant or not TENANT_NAME_RE.match(tenant):
+        return None
+    path = os.path.join(tenants_dir or os.environ.get("TENANTS_DIR", DEFAULT_TENANTS_DIR), f"{tenant}.jsonl")
+    return path if os.path.exists(path) else None
+
+
+def _facet_values(question: Dict[str, Any], facet: str) -> List[Any]:
+    value = question.get(facet)
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _matches(question: Dict[str, Any], selected: Dict[str, Optional[str]]) -> bool:
+    return all(not value or value in _facet_values(question, facet) for facet, value in selected.items())
+
+
+class _OverlayQuestions(Sequence):
+    # Bank-order view: base questions (overridden ones replaced in place)
+    # followed by the tenant's additions, without copying the base list
+    def __init__(self, store: "TenantStore"):
+        self._store = store
+
+    def __len__(self) -> int:
+        return len(self._store.base) + len(self._store._additions)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+        if position < 0:
+            position += len(self)
+        base = self._store.base
+        if position < len(base):
+            question = base.questions[position]
+            return self._store._records.get(question["id"], question)
+        return self._store._records[self._store._additions[position - len(base)]]
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        records = self._store._records
+        for question in self._store.base.questions:
+            yield records.get(question["id"], question)
+        for question_id in self._store._additions:
+            yield records[question_id]
+
+
+class TenantStore:
+    """Copy-on-write view of a shared, read-only QuestionStore for one tenant.
+
+    The tenant's JSONL file holds additions (new ids) and overrides (ids of
+    base questions; only the fields that change need to be given). Only
+    those records are held per tenant; everything else is read through to
+    the shared base, so memory grows with the tenant's delta and every
+    lookup stays a dictionary hit. Exposes the QuestionStore interface.
+    """
+
+    def __init__(self, base: QuestionStore, path: str, tenant: str = ""):
+        self.base = base
+        self.path = path
+        self.tenant = tenant
+        self._records: Dict[Any, Dict[str, Any]] = {}
+        self._offsets: Dict[Any, int] = {}
+        self._hashes: Dict[Any, str] = {}
+        self._additions: List[Any] = []
+        self._added_positions: Dict[Any, int] = {}
+        self._analyses: Dict[Any, Analysis] = {}
+        self._load()
+        self.questions = _OverlayQuestions(self)
+
+    def _load(self):
+        with open(self.path, "rb") as f:
+            offset = 0
+            for line_number, line in enumerate(f, 1):
+                line_offset = offset
+                offset += len(line)
+                if not line.strip():
+                    continue
+                delta = json.loads(line)
+                question_id = delta.get("id")
+                if question_id in self._records:
+                    raise ValueError(f"Duplicate question id {question_id} in {self.path}:{line_number}")
+                has_answer = "model_answer" in delta
+                delta.pop("model_answer", None)
+                digest = hashlib.sha1(line.strip())
+                try:
+                    base_question = self.base.get(question_id)
+                except KeyError:
+                    base_question = None
+                if base_question is not None:
+                    question = dict(base_question, **delta)
+                    digest.update(self.base.content_hash(question_id).encode("ascii"))
+                else:
+                    missing = [field for field in REQUIRED_FIELDS if field not in delta]
+                    if missing:
+                        raise ValueError(f"New question {question_id} in {self.path}:{line_number} "
+                                         f"is missing {', '.join(missing)}")
+                    question = delta
+                    self._added_positions[question_id] = len(self.base) + len(self._additions)
+                    self._additions.append(question_id)
+                self._records[question_id] = question
+                self._hashes[question_id] = digest.hexdigest()[:12]
+                if has_answer:
+                    self._offsets[question_id] = line_offset
+
+        self._values = {}
+        for facet in FACET_FIELDS:
+            values = set(self.base.facet_values(facet))
+            for question in self._records.values():
+                values.update(_facet_values(question, facet))
+            self._values[facet] = sorted(
+                values, key=(lambda d: (DIFFICULTY_ORDER.get(d, len(DIFFICULTY_ORDER)), d))
+                if facet == "difficulty" else None
+            )
+        self.categories = self.facet_values("category")
+        self.difficulties = self.facet_values("difficulty")
+
+    @property
+    def delta_ids(self) -> List[Any]:
+        """Ids of the questions this tenant adds or overrides."""
+        return list(self._records)
+
+    def __len__(self) -> int:
+        return len(self.base) + len(self._additions)
+
+    def __contains__(self, question_id) -> bool:
+        return question_id in self._records or question_id in self.base
+
+    def position(self, question_id) -> int:
+        position = self._added_positions.get(question_id)
+        return position if position is not None else self.base.position(question_id)
+
+    def get(self, question_id) -> Dict[str, Any]:
+        question = self._records.get(question_id)
+        return question if question is not None else self.base.get(question_id)
+
+    def content_hash(self, question_id) -> str:
+        digest = self._hashes.get(question_id)
+        return digest if digest is not None else self.base.content_hash(question_id)
+
+    def facet_values(self, facet: str) -> List[str]:
+        return list(self._values.get(facet, ()))
+
+    @property
+    def search_index(self):
+        return self.base.search_index
+
+    def _text_scores(self, text: str):
+        # BM25 scores of the shared bank, or None when there is no text query
+        return self.base.search_index.scores(text) if text.strip() else None
+
+    def _score(self, question_id, text: str) -> float:
+        # One of the tenant's own questions, scored with the shared bank's
+        # term statistics so it ranks alongside the bank's questions
+        analysis = self._analyses.get(question_id)
+        if analysis is None:
+            document = question_document(self._records[question_id], self.get_model_answer(question_id))
+            analysis = self._analyses[question_id] = analyze(document)
+        return self.base.search_index.score(analysis, text)
+
+    def facet_counts(self, facet: str, text: str = "", **selected: Optional[str]) -> Dict[str, int]:
+        """Matches per value of ``facet`` under the other selections: the
+        shared bank's counts, corrected for this tenant's records."""
+        selected.pop(facet, None)
+        base_counts = self.base.facet_counts(facet, text, **selected)
+        counts = {value: base_counts.get(value, 0) for value in self.facet_values(facet)}
+        scores = self._text_scores(text)
+        for question_id, question in self._records.items():
+            if question_id not in self._added_positions:
+                base_question = self.base.get(question_id)
+                if _matches(base_question, selected) and (
+                        scores is None or scores[self.base.position(question_id)] > 0):
+                    for value in _facet_values(base_question, facet):
+                        counts[value] -= 1
+            if _matches(question, selected) and (scores is None or self._score(question_id, text) > 0):
+                for value in _facet_values(question, facet):
+                    counts[value] += 1
+        return counts
+
+    def filter(self, category: Optional[str] = None,
+               difficulty: Optional[str] = None, **facets: Optional[str]) -> List[Dict[str, Any]]:
+        return self.search(category, difficulty, limit=len(self), **facets)[1]
+
+    def search(self, category: Optional[str] = None, difficulty: Optional[str] = None,
+               text: str = "", offset: int = 0, limit: int = 10,
+               **facets: Optional[str]) -> Tuple[int, List[Dict[str, Any]]]:
+        """Return (total matches, one page of matching questions): in bank
+        order, or best first by BM25 relevance when ``text`` is given."""
+        selected = dict(facets, category=category, difficulty=difficulty)
+        if not self._records:
+            return self.base.search(text=text, offset=offset, limit=limit, **selected)
+        base_bits = self.base.bitmap(**selected)
+        records = self._records
+        # Overridden questions leave the shared bitset; the ones that match
+        # after the override come back in, scored like the tenant's additions
+        for question_id in records:
+            if question_id not in self._added_positions:
+                base_bits &= ~(1 << self.base.position(question_id))
+        scores = self._text_scores(text)
+        if scores is not None:
+            own = sorted(
+                (-score, self.position(question_id)) for question_id, score in (
+                    (question_id, self._score(question_id, text))
+                    for question_id, question in records.items() if _matches(question, selected)
+                ) if score > 0
+            )
+            total, positions, base_scores = ranked(scores, base_bits, offset + limit)
+            merged = heapq.merge(zip((-score for score in base_scores), positions), own)
+            page = [self.questions[p] for _, p in itertools.islice(merged, offset, offset + limit)]
+            return total + len(own), page
+
+        matched_overrides = sorted(self.base.position(question_id) for question_id, question in records.items()
+                                   if question_id not in self._added_positions and _matches(question, selected))
+        additions = [question_id for question_id in self._additions if _matches(records[question_id], selected)]
+        total = base_bits.bit_count() + len(matched_overrides) + len(additions)
+        positions = heapq.merge(bit_positions(base_bits), matched_overrides)
+        page = [self.questions[p] for p in itertools.islice(positions, offset, offset + limit)]
+        if len(page) < limit:
+            skipped = max(0, offset - (total - len(additions)))
+            page.extend(records[question_id]
+                        for question_id in additions[skipped:skipped + limit - len(page)])
+        return total, page
+
+    def iter_model_answers(self, delta_only: bool = False) -> Iterator[Tuple[Any, str]]:
+        """Yield (question id, model answer) in bank order; with
+        ``delta_only`` just the tenant's added and overridden questions."""
+        if not delta_only:
+            for question_id, model_answer in self.base.iter_model_answers():
+                if question_id in self._records:
+                    model_answer = self.get_model_answer(question_id)
+                yield question_id, model_answer
+            for question_id in self._additions:
+                yield question_id, self.get_model_answer(question_id)
+            return
+        for question_id in self._records:
+            yield question_id, self.get_model_answer(question_id)
+
+    def get_model_answer(self, question_id) -> str:
+        offset = self._offsets.get(question_id)
+        if offset is None:
+            if question_id in self._added_positions:
+                return ""
+            return self.base.get_model_answer(question_id)
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return json.loads(f.readline()).get("model_answer", "")
+
+
+class _DeltaQuestions:
+    # Just the tenant's own questions, in the shape SemanticScorer expects
+    def __init__(self, store: TenantStore):
+        self._store = store
+
+    def iter_model_answers(self):
+        return self._store.iter_model_answers(delta_only=True)
+
+    def content_hash(self, question_id) -> str:
+        return self._store.content_hash(question_id)
+
+
+class OverlayScorer:
+    """Semantic scorer that answers for the tenant's questions from its own
+    (small) vector block and for everything else from the shared one."""
+
+    def __init__(self, tenant_scorer, base_scorer, tenant_ids):
+        self.tenant_scorer = tenant_scorer
+        self.base_scorer = base_scorer
+        self.tenant_ids = frozenset(tenant_ids)
+        self.embedder = base_scorer.embedder
+
+    def similarity(self, question_id, answer: str) -> Dict[str, Any]:
+        scorer = self.tenant_scorer if question_id in self.tenant_ids else self.base_scorer
+        return scorer.similarity(question_id, answer)
+
+    def similarity_many(self, question_ids, answers) -> List[Dict[str, Any]]:
+        results: List[Optional[Dict[str, Any]]] = [None] * len(question_ids)
+        for scorer, own in ((self.tenant_scorer, True), (self.base_scorer, False)):
+            indexes = [i for i, question_id in enumerate(question_ids) if (question_id in self.tenant_ids) == own]
+            if indexes:
+                scored = scorer.similarity_many([question_ids[i] for i in indexes], [answers[i] for i in indexes])
+                for i, result in zip(indexes, scored):
+                    results[i] = result
+        return results
+
+
+class Tenant:
+    """Everything the app needs for one tenant: the overlay store, rubrics
+    (tenant rubrics chained over the shared ones), a grader and the order
+    the scheduler offers unseen questions in."""
+
+    def __init__(self, name: str, base: QuestionStore, base_rubrics, base_scorer, path: str):
+        from utils.grading import Grader
+        from utils.rubric import compile_rubrics
+        from utils.scheduler import QuestionOrder
+        from utils.semantic import SemanticScorer
+
+        self.name = name
+        self.store = TenantStore(base, path, name)
+        own = [self.store.get(question_id) for question_id in self.store.delta_ids]
+        tenant_rubrics = compile_rubrics(own)
+        self.rubrics = ChainMap(tenant_rubrics, base_rubrics)
+        self.order = QuestionOrder(self.store.questions)
+        if base_scorer is None:
+            self.grader = Grader(self.store, self.rubrics, semantic=False)
+            return
+        scorer = OverlayScorer(
+            SemanticScorer(_DeltaQuestions(self.store), tenant_rubrics, embedder=base_scorer.embedder),
+            base_scorer, tenant_rubrics,
+        )
+        self.grader = Grader(self.store, self.rubrics, scorer)
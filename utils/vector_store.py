@@ -1,5 +1,357 @@
-def initialize_vector_store(): 
-    class VectorStore: 
-        def find_similar_questions(self, question, category=None): 
-            return {'documents': []} 
-    return VectorStore() 
+import json
+import os
+from typing import Dict, Any, List, Optional, Sequence
+
+import numpy as np
+
+from utils.embeddings import EmbeddingProvider, get_embedder
+
+DEFAULT_VECTOR_DB_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "vector_store"
+)
+
+# Below this many live vectors an exact scan is as fast as the index
+BRUTE_FORCE_THRESHOLD = 20000
+
+# Centroids are retrained once rows added or deleted since the last training
+# reach this share of the rows they were trained on
+REBUILD_DRIFT = 0.25
+
+def _kmeans(data: np.ndarray, k: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    # Spherical k-means on unit vectors; returns unit-norm centroids
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(data @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, data)
+        counts = np.bincount(assign, minlength=k)
+        empty = counts == 0
+        sums[empty] = data[rng.choice(len(data), size=int(empty.sum()))]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+    return centroids
+
+
+class VectorStore:
+    """Unit-normalised vectors in a memory-mapped float32 matrix on disk,
+    searched with an IVF (inverted file) index.
+
+    Rows are append-only: adds are assigned to their nearest existing
+    centroid and deletes are tombstones, so neither needs a rebuild.
+    ``rebuild_index()`` retrains the centroids; ``needs_rebuild()`` says
+    when the data has drifted far enough from them for that to pay off.
+    """
+
+    def __init__(self, path: str = DEFAULT_VECTOR_DB_PATH, dim: int = 256,
+                 nprobe: int = 8):
+        self.path = path
+        self.dim = dim
+        self.nprobe = nprobe
+        self.count = 0
+        self.keys: List[str] = []
+        self.versions: Dict[str, str] = {}
+        self.category_names: List[str] = []
+        self._key_rows: Dict[str, int] = {}
+        self._live = 0
+        self._capacity = 0
+        self._vectors = np.zeros((0, dim), dtype=np.float32)
+        self._categories = np.zeros(0, dtype=np.int16)
+        self._alive = np.zeros(0, dtype=bool)
+        self._assign = np.zeros(0, dtype=np.int32)
+        # Live rows when the centroids were trained, and rows added or
+        # deleted since
+        self._trained = 0
+        self._drift = 0
+        self._centroids: Optional[np.ndarray] = None
+        self._lists: List[np.ndarray] = []
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    # ------------------------------------------------------------------
+    # persistence
+    # ------------------------------------------------------------------
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.path, "vectors.f32")
+
+    def _load(self):
+        meta_path = os.path.join(self.path, "meta.json")
+        if not os.path.exists(meta_path):
+            return
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta["dim"] != self.dim:
+            raise ValueError(f"{self.path} holds {meta['dim']}-d vectors, expected {self.dim}")
+        self.count = meta["count"]
+        self.keys = meta["keys"]
+        self.versions = meta["versions"]
+        self.category_names = meta["category_names"]
+        self._key_rows = {key: row for row, key in enumerate(self.keys) if key is not None}
+        self._live = len(self._key_rows)
+        self._map(max(self.count, os.path.getsize(self._vectors_path) // (self.dim * 4), 1))
+        state = np.load(os.path.join(self.path, "state.npz"))
+        self._categories = state["categories"]
+        self._alive = state["alive"]
+        self._assign = state["assign"]
+        if state["centroids"].size:
+            self._centroids = state["centroids"]
+            self._build_lists()
+            self._trained = meta.get("trained", self._live)
+            self._drift = meta.get("drift", 0)
+
+    def _map(self, capacity: int):
+        size = capacity * self.dim * 4
+        mode = "r+" if os.path.exists(self._vectors_path) else "w+"
+        if mode == "r+" and os.path.getsize(self._vectors_path) < size:
+            with open(self._vectors_path, "ab") as f:
+                f.truncate(size)
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode=mode,
+                                  shape=(capacity, self.dim))
+        self._capacity = capacity
+
+    def flush(self):
+        if isinstance(self._vectors, np.memmap):
+            self._vectors.flush()
+        np.savez(
+            os.path.join(self.path, "state.npz"),
+            categories=self._categories[:self.count],
+            alive=self._alive[:self.count],
+            assign=self._assign[:self.count],
+            centroids=self._centroids if self._centroids is not None else np.zeros((0, self.dim), np.float32),
+        )
+        meta = {
+            "dim": self.dim,
+            "count": self.count,
+            "keys": self.keys,
+            "versions": self.versions,
+            "category_names": self.category_names,
+            "trained": self._trained,
+            "drift": self._drift,
+        }
+        tmp_path = os.path.join(self.path, "meta.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(self.path, "meta.json"))
+
+    # ------------------------------------------------------------------
+    # mutation
+    # ------------------------------------------------------------------
+    def __len__(self) -> int:
+        return self._live
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._key_rows
+
+    def _category_code(self, category: Optional[str]) -> int:
+        if category is None:
+            return -1
+        if category not in self.category_names:
+            self.category_names.append(category)
+        return self.category_names.index(category)
+
+    def add(self, keys: Sequence[str], vectors: np.ndarray,
+            categories: Optional[Sequence[Optional[str]]] = None,
+            versions: Optional[Sequence[str]] = None):
+        """Append vectors (replacing any existing rows with the same keys)."""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(keys), self.dim)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vectors = vectors / norms
+        self.delete([key for key in keys if key in self._key_rows])
+
+        start = self.count
+        end = start + len(keys)
+        if end > self._capacity:
+            self._map(max(end, self._capacity * 2, 1024))
+        if end > len(self._alive):
+            self._grow(max(end, len(self._alive) * 2, 1024))
+        self._vectors[start:end] = vectors
+        codes = [self._category_code(c) for c in (categories or [None] * len(keys))]
+        assign = np.full(len(keys), -1, dtype=np.int32)
+        if self._centroids is not None:
+            assign = np.argmax(vectors @ self._centroids.T, axis=1).astype(np.int32)
+            for list_id in np.unique(assign):
+                rows = np.arange(start, end, dtype=np.int64)[assign == list_id]
+                self._lists[list_id] = np.concatenate([self._lists[list_id], rows])
+        self._categories[start:end] = codes
+        self._alive[start:end] = True
+        self._assign[start:end] = assign
+        self._drift += len(keys)
+        for offset, key in enumerate(keys):
+            self.keys.append(key)
+            self._key_rows[key] = start + offset
+            self._live += 1
+            if versions is not None:
+                self.versions[key] = versions[offset]
+        self.count = end
+
+    def _grow(self, capacity: int):
+        # Row metadata grows by doubling, like the vector file, so appends
+        # copy it O(log n) times in all
+        for name, fill in (("_categories", -1), ("_alive", False), ("_assign", -1)):
+            old = getattr(self, name)
+            new = np.full(capacity, fill, dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def delete(self, keys: Sequence[str]):
+        for key in keys:
+            row = self._key_rows.pop(key, None)
+            if row is not None:
+                self._live -= 1
+                self._drift += 1
+                self._alive[row] = False
+                self.keys[row] = None
+                self.versions.pop(key, None)
+
+    def needs_rebuild(self) -> bool:
+        """True when there are enough rows for an index but none has been
+        trained, or the rows have drifted REBUILD_DRIFT from the training set."""
+        if self._centroids is None:
+            return self._live >= BRUTE_FORCE_THRESHOLD
+        return self._drift >= REBUILD_DRIFT * max(self._trained, 1)
+
+    def rebuild_index(self, nlist: Optional[int] = None):
+        """Retrain IVF centroids over the live rows."""
+        live = np.flatnonzero(self._alive[:self.count])
+        self._trained = len(live)
+        self._drift = 0
+        if len(live) < BRUTE_FORCE_THRESHOLD and nlist is None:
+            self._centroids = None
+            self._lists = []
+            self._assign[:] = -1
+            return
+        nlist = nlist or max(1, int(np.sqrt(len(live))))
+        sample = live
+        if len(sample) > nlist * 64:
+            sample = np.random.default_rng(0).choice(live, size=nlist * 64, replace=False)
+        self._centroids = _kmeans(np.asarray(self._vectors[np.sort(sample)]), nlist)
+        assign = np.full(len(self._assign), -1, dtype=np.int32)
+        for start in range(0, len(live), 65536):
+            rows = live[start:start + 65536]
+            assign[rows] = np.argmax(np.asarray(self._vectors[rows]) @ self._centroids.T, axis=1)
+        self._assign = assign
+        self._build_lists()
+
+    def _build_lists(self):
+        nlist = len(self._centroids)
+        rows = np.flatnonzero(self._assign[:self.count] >= 0)
+        order = rows[np.argsort(self._assign[rows], kind="stable")]
+        bounds = np.concatenate([[0], np.cumsum(np.bincount(self._assign[rows], minlength=nlist))])
+        self._lists = [order[bounds[i]:bounds[i + 1]].astype(np.int64) for i in range(nlist)]
+
+    # ------------------------------------------------------------------
+    # search
+    # ------------------------------------------------------------------
+    def search(self, query: np.ndarray, k: int = 5,
+               category: Optional[str] = None) -> List[Dict[str, Any]]:
+        query = np.asarray(query, dtype=np.float32).reshape(self.dim)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        code = None
+        if category is not None:
+            if category not in self.category_names:
+                return []
+            code = self.category_names.index(category)
+
+        if self._centroids is None or len(self) < BRUTE_FORCE_THRESHOLD:
+            candidates = np.flatnonzero(self._alive[:self.count])
+            if code is not None:
+                candidates = candidates[self._categories[candidates] == code]
+            return self._top_k(query, candidates, k)
+
+        centroid_order = np.argsort(-(self._centroids @ query))
+        nprobe = self.nprobe
+        while True:
+            probed = centroid_order[:nprobe]
+            candidates = np.concatenate([self._lists[i] for i in probed])
+            candidates = candidates[self._alive[candidates]]
+            if code is not None:
+                candidates = candidates[self._categories[candidates] == code]
+            # Widen the probe when a narrow category filter leaves too few
+            if len(candidates) >= k or nprobe >= len(centroid_order):
+                return self._top_k(query, candidates, k)
+            nprobe *= 2
+
+    def _top_k(self, query: np.ndarray, candidates: np.ndarray, k: int) -> List[Dict[str, Any]]:
+        if len(candidates) == 0:
+            return []
+        scores = np.asarray(self._vectors[candidates]) @ query
+        if len(candidates) > k:
+            top = np.argpartition(-scores, k)[:k]
+        else:
+            top = np.arange(len(candidates))
+        top = top[np.argsort(-scores[top])]
+        return [
+            {"key": self.keys[candidates[i]], "score": float(scores[i])}
+            for i in top
+        ]
+
+
+class QuestionIndex:
+    """Similar-question lookup over a question bank."""
+
+    def __init__(self, vectors: VectorStore, questions=None,
+                 embedder: Optional[EmbeddingProvider] = None):
+        self.vectors = vectors
+        self.questions = questions
+        self.embedder = embedder or get_embedder()
+
+    def _version(self, question_id) -> str:
+        # Switching embedding provider re-embeds everything
+        return f"{self.embedder.name}:{self.questions.content_hash(question_id)}"
+
+    def sync(self):
+        # Only (re-)embed questions that are new or whose content changed;
+        # they are added to the existing index, which is retrained only when
+        # the vector store says it has drifted
+        store = self.questions
+        wanted = {}
+        for question in store.questions:
+            wanted[str(question["id"])] = self._version(question["id"])
+        stale = [key for key in list(self.vectors.versions) if key not in wanted]
+        self.vectors.delete(stale)
+        changed = [key for key, version in wanted.items()
+                   if self.vectors.versions.get(key) != version]
+        if changed:
+            changed_ids = set(changed)
+            keys = []
+            texts = []
+            categories = []
+            for question_id, model_answer in store.iter_model_answers():
+                if str(question_id) in changed_ids:
+                    question = store.get(question_id)
+                    keys.append(str(question_id))
+                    texts.append(f"{question['question']}\n{model_answer}")
+                    categories.append(question["category"])
+            self.vectors.add(keys, self.embedder.encode(texts), categories,
+                             [wanted[key] for key in keys])
+        rebuild = self.vectors.needs_rebuild()
+        if rebuild:
+            self.vectors.rebuild_index()
+        if stale or changed or rebuild:
+            self.vectors.flush()
+
+    def find_similar_questions(self, question: str, category: Optional[str] = None,
+                               k: int = 5, exclude_id=None) -> Dict[str, Any]:
+        query = self.embedder.encode([question])[0]
+        hits = self.vectors.search(query, k + (exclude_id is not None), category)
+        hits = [hit for hit in hits if hit["key"] != str(exclude_id)][:k]
+        ids = [int(hit["key"]) if hit["key"].isdigit() else hit["key"] for hit in hits]
+        return {
+            "ids": ids,
+            "documents": [self.questions.get(i)["question"] for i in ids],
+            "scores": [hit["score"] for hit in hits],
+        }
+
+
+def initialize_vector_store(questions=None, path: Optional[str] = None):
+    path = path or os.environ.get("VECTOR_DB_PATH", DEFAULT_VECTOR_DB_PATH)
+    embedder = get_embedder()
+    index = QuestionIndex(VectorStore(path, dim=embedder.dim), questions, embedder)
+    if questions is not None:
+        index.sync()
+    return index